@@ -0,0 +1,102 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# CKAN-Toolbox -- Various modules that handle CKAN API and data
+# By: Emmanuel Raviart <emmanuel@raviart.com>
+#
+# Copyright (C) 2013 Etalab
+# http://github.com/etalab/ckan-toolbox
+#
+# This file is part of CKAN-Toolbox.
+#
+# CKAN-Toolbox is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# CKAN-Toolbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Toolbox to convert batches of CKAN packages using a pool of processes"""
+
+
+import itertools
+import multiprocessing
+
+from . import ckanconv, compiledconv
+
+
+worker_converter = None  # Converter of the current worker process, built once by init_worker
+worker_output = False
+
+
+def convert_indexed_package(indexed_package):
+    """Convert a package in a worker process and return it with its index and its ID.
+
+    When the conversion raises an exception, the package is returned as None with an error message.
+    """
+    index, package = indexed_package
+    package_id = package.get('id') if isinstance(package, dict) else None
+    try:
+        package, errors = worker_converter(package)
+        if worker_output and errors is None:
+            package, errors = ckanconv.ckan_input_package_to_output_package(package)
+    except Exception as error:
+        return index, package_id, None, u'Conversion of package {} failed: {}'.format(package_id, error)
+    return index, package_id, package, errors
+
+
+def convert_packages(packages, chunk_size = 100, compiled = False, drop_none_values = False,
+        keep_value_order = False, ordered = True, output = False, processes = None, skip_missing_items = False):
+    """Convert packages with make_ckan_json_to_package, spreading them on a pool of processes.
+
+    Packages are sent to workers by chunks of ``chunk_size`` items. When ``output`` is true, every valid package is then
+    converted by ``ckan_input_package_to_output_package``.
+
+    Yields ``(index, package_id, package, errors)`` tuples, where ``index`` is the position of the package in the input
+    iterable. When ``ordered`` is false, results are yielded as soon as they are ready, in any order.
+
+    Packages are read from the input iterable by windows of ``4 * processes`` chunks, so that a streamed dump is never
+    held in memory.
+    """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(processes = processes, initializer = init_worker, initargs = (
+        compiled,
+        dict(
+            drop_none_values = drop_none_values,
+            keep_value_order = keep_value_order,
+            skip_missing_items = skip_missing_items,
+            ),
+        output,
+        ))
+    try:
+        imap = pool.imap if ordered else pool.imap_unordered
+        indexed_packages = enumerate(packages)
+        window_size = 4 * processes * chunk_size
+        while True:
+            # The pool reads its whole input at once: Give it a window of packages at a time.
+            window = list(itertools.islice(indexed_packages, window_size))
+            if not window:
+                break
+            for result in imap(convert_indexed_package, window, chunksize = chunk_size):
+                yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def init_worker(compiled, options, output):
+    """Build the converter of a worker process."""
+    global worker_converter, worker_output
+    make_converter = compiledconv.make_compiled_ckan_json_to_package if compiled \
+        else ckanconv.make_ckan_json_to_package
+    worker_converter = make_converter(**options)
+    worker_output = output
@@ -0,0 +1,498 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# CKAN-Toolbox -- Various modules that handle CKAN API and data
+# By: Emmanuel Raviart <emmanuel@raviart.com>
+#
+# Copyright (C) 2013 Etalab
+# http://github.com/etalab/ckan-toolbox
+#
+# This file is part of CKAN-Toolbox.
+#
+# CKAN-Toolbox is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# CKAN-Toolbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Benchmarks of CKAN-Toolbox converters & helpers
+
+Usage: python -m ckantoolbox.benchmarks [--save results.json] [--baseline results.json]
+       python -m ckantoolbox.benchmarks --memory
+"""
+
+
+import argparse
+import datetime
+import gc
+import json
+import random
+import sys
+import time
+import uuid
+
+from biryani1.baseconv import pipe, test_isinstance
+from biryani1.datetimeconv import datetime_to_iso8601_str, iso8601_input_to_datetime
+
+from . import ckanconv, compiledconv, records, texthelpers
+
+
+formats = [u'CSV', u'JSON', u'PDF', u'XLS', u'XML', u'ZIP', u'csv', u'html', u'shp']
+license_ids = [u'cc-by', u'fr-lo', u'lool', u'notspecified', u'odc-odbl', u'other-at']
+sizes = dict(
+    # size: (number of extras, groups, resources, tags)
+    small = (0, 0, 1, 2),
+    medium = (4, 2, 5, 8),
+    large = (20, 5, 40, 30),
+    )
+words = (u'données publiques transport énergie population commune département région budget éducation santé '
+    u'environnement qualité air eau élections emploi logement culture tourisme recensement').split()
+
+
+def generate_datetime_str(generator):
+    value = datetime.datetime(2013, 1, 1) + datetime.timedelta(seconds = generator.randint(0, 365 * 24 * 3600),
+        microseconds = generator.randint(0, 999999))
+    return unicode(value.isoformat())
+
+
+def generate_group(generator, size = 'medium', is_organization = False):
+    extras_count, groups_count, resources_count, tags_count = sizes[size]
+    title = generate_title(generator)
+    group = dict(
+        approval_status = u'approved',
+        created = generate_datetime_str(generator),
+        description = generate_text(generator),
+        display_name = title,
+        extras = [
+            dict(
+                group_id = generate_id(generator),
+                id = generate_id(generator),
+                key = u'key-{}'.format(index),
+                revision_id = generate_id(generator),
+                state = u'active',
+                value = generate_title(generator),
+                )
+            for index in range(extras_count)
+            ],
+        id = generate_id(generator),
+        image_url = u'http://www.example.com/images/{}.png'.format(generator.randint(0, 100)),
+        is_organization = is_organization,
+        name = texthelpers.namify(title),
+        num_followers = generator.randint(0, 100),
+        package_count = 0,
+        packages = [],
+        revision_id = generate_id(generator),
+        state = u'active',
+        tags = [],
+        title = title,
+        type = u'organization' if is_organization else u'group',
+        users = [
+            generate_user(generator, embedded = True)
+            for index in range(groups_count + 1)
+            ],
+        )
+    if is_organization:
+        group['revision_timestamp'] = generate_datetime_str(generator)
+    return group
+
+
+def generate_id(generator):
+    return unicode(uuid.UUID(int = generator.getrandbits(128)))
+
+
+def generate_organization(generator, size = 'medium'):
+    return generate_group(generator, size = size, is_organization = True)
+
+
+def generate_package(generator, size = 'medium'):
+    """Generate a synthetic package, looking like a package_show result of data.gouv.fr."""
+    extras_count, groups_count, resources_count, tags_count = sizes[size]
+    metadata_created = generate_datetime_str(generator)
+    organization = generate_package_organization(generator)
+    title = generate_title(generator)
+    package = dict(
+        author = u'Auteur {}'.format(generator.randint(0, 50)),
+        author_email = u'auteur{}@example.com'.format(generator.randint(0, 50)),
+        extras = [
+            dict(
+                key = u'key-{}'.format(index),
+                value = generate_title(generator),
+                )
+            for index in range(extras_count)
+            ],
+        frequency = generator.choice([None, u'annuelle', u'mensuelle', u'ponctuelle']),
+        groups = [
+            dict(
+                capacity = u'public',
+                description = generate_text(generator),
+                id = generate_id(generator),
+                image_url = u'',
+                name = u'groupe-{}'.format(index),
+                revision_id = generate_id(generator),
+                state = u'active',
+                title = u'Groupe {}'.format(index),
+                type = u'group',
+                )
+            for index in range(groups_count)
+            ],
+        id = generate_id(generator),
+        isopen = True,
+        license_id = generator.choice(license_ids),
+        license_title = u'Licence Ouverte',
+        license_url = u'http://www.data.gouv.fr/Licence-Ouverte-Open-Licence',
+        maintainer = None,
+        maintainer_email = None,
+        metadata_created = metadata_created,
+        metadata_modified = generate_datetime_str(generator),
+        name = texthelpers.namify(title),
+        notes = generate_text(generator),
+        num_resources = resources_count,
+        num_tags = tags_count,
+        organization = organization,
+        owner_org = organization['id'],
+        private = False,
+        relationships_as_object = [],
+        relationships_as_subject = [],
+        resources = [
+            generate_resource(generator, created = metadata_created, position = position)
+            for position in range(resources_count)
+            ],
+        revision_id = generate_id(generator),
+        revision_timestamp = generate_datetime_str(generator),
+        state = u'active',
+        tags = [
+            generate_tag(generator)
+            for index in range(tags_count)
+            ],
+        territorial_coverage = u'Country/FR',
+        territorial_coverage_granularity = u'commune',
+        title = title,
+        tracking_summary = dict(recent = generator.randint(0, 10), total = generator.randint(10, 1000)),
+        type = u'dataset',
+        url = u'http://www.example.com/datasets/{}'.format(generator.randint(0, 10000)),
+        version = None,
+        )
+    for extra in package['extras']:
+        # CKAN duplicates extras in package.
+        package[extra['key']] = extra['value']
+    return package
+
+
+def generate_package_organization(generator):
+    title = u'Organisation {}'.format(generator.randint(0, 20))
+    return dict(
+        approval_status = u'approved',
+        created = generate_datetime_str(generator),
+        description = generate_text(generator),
+        id = generate_id(generator),
+        image_url = u'http://www.example.com/logo.png',
+        is_organization = True,
+        name = texthelpers.namify(title),
+        revision_id = generate_id(generator),
+        revision_timestamp = generate_datetime_str(generator),
+        state = u'active',
+        title = title,
+        type = u'organization',
+        )
+
+
+def generate_resource(generator, created = None, position = 0):
+    format_ = generator.choice(formats)
+    return dict(
+        cache_last_updated = None,
+        cache_url = None,
+        created = created or generate_datetime_str(generator),
+        description = generate_text(generator),
+        format = format_,
+        hash = u'',
+        id = generate_id(generator),
+        last_modified = generator.choice([None, generate_datetime_str(generator)]),
+        mimetype = None,
+        mimetype_inner = None,
+        name = generate_title(generator),
+        position = position,
+        resource_group_id = generate_id(generator),
+        resource_type = generator.choice([None, u'file', u'api']),
+        revision_id = generate_id(generator),
+        revision_timestamp = generate_datetime_str(generator),
+        size = generator.choice([None, unicode(generator.randint(0, 10 ** 8))]),
+        state = u'active',
+        tracking_summary = dict(recent = 0, total = generator.randint(0, 100)),
+        url = u'http://static.example.com/{}/{}.{}'.format(generator.randint(0, 1000), position, format_.lower()),
+        webstore_last_updated = None,
+        webstore_url = None,
+        )
+
+
+def generate_tag(generator):
+    name = generator.choice(words)
+    return dict(
+        display_name = name,
+        id = generate_id(generator),
+        name = name,
+        revision_timestamp = generate_datetime_str(generator),
+        state = u'active',
+        vocabulary_id = None,
+        )
+
+
+def generate_text(generator):
+    return u'\n'.join(
+        u' '.join(generator.choice(words) for word_index in range(generator.randint(5, 30))).capitalize() + u'.'
+        for line_index in range(generator.randint(1, 5))
+        )
+
+
+def generate_title(generator):
+    return u' '.join(generator.choice(words) for index in range(generator.randint(2, 8))).capitalize()
+
+
+def generate_user(generator, embedded = False):
+    name = u'user-{}'.format(generator.randint(0, 10000))
+    user = dict(
+        about = None,
+        activity_streams_email_notifications = False,
+        capacity = generator.choice([u'admin', u'editor', u'member']),
+        created = generate_datetime_str(generator),
+        display_name = name,
+        email_hash = u'{:032x}'.format(generator.getrandbits(128)),
+        fullname = name.capitalize(),
+        id = generate_id(generator),
+        name = name,
+        number_administered_packages = generator.randint(0, 10),
+        number_of_edits = generator.randint(0, 100),
+        openid = None,
+        sysadmin = False,
+        )
+    if not embedded:
+        user['num_followers'] = generator.randint(0, 10)
+        del user['capacity']
+    return user
+
+
+def get_deep_size(value, seen = None):
+    """Return the memory used by a value & every object it references (except classes), in bytes."""
+    if seen is None:
+        seen = set()
+    if id(value) in seen or isinstance(value, type):
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(
+            get_deep_size(item_key, seen) + get_deep_size(item_value, seen)
+            for item_key, item_value in value.iteritems()
+            )
+    elif isinstance(value, (list, set, tuple)):
+        size += sum(
+            get_deep_size(item, seen)
+            for item in value
+            )
+    elif isinstance(value, records.Record):
+        for attribute in value.__slots__:
+            item = getattr(value, attribute, None)
+            size += get_deep_size(item, seen)
+    return size
+
+
+def iter_benchmarks(size = 'medium', seed = 0, count = 100):
+    """Iterate over ``(name, function, fixtures)`` triples: function is applied to each fixture in turn."""
+    generator = random.Random(seed)
+    packages = [generate_package(generator, size = size) for index in range(count)]
+    resources = [resource for package in packages for resource in package['resources']] or [
+        generate_resource(generator)]
+    tags = [tag for package in packages for tag in package['tags']] or [generate_tag(generator)]
+    groups = [generate_group(generator, size = size) for index in range(count)]
+    organizations = [generate_organization(generator, size = size) for index in range(count)]
+    users = [generate_user(generator) for index in range(count)]
+    titles = [package['title'] for package in packages] + [
+        resource['name'] for resource in resources]
+    tag_names = [tag['display_name'].upper() for tag in tags]
+    datetime_strs = [
+        package[key]
+        for package in packages
+        for key in ('metadata_created', 'metadata_modified', 'revision_timestamp')
+        ] + [
+        resource[key]
+        for resource in resources
+        for key in ('created', 'last_modified', 'revision_timestamp')
+        if resource.get(key) is not None
+        ]
+
+    yield 'make_ckan_json_to_package', ckanconv.make_ckan_json_to_package(), packages
+    yield 'make_ckan_json_to_package(drop_none_values)', ckanconv.make_ckan_json_to_package(
+        drop_none_values = True), packages
+    yield 'make_compiled_ckan_json_to_package', compiledconv.make_compiled_ckan_json_to_package(), packages
+    yield 'make_ckan_json_to_resource', ckanconv.make_ckan_json_to_resource(), resources
+    yield 'make_ckan_json_to_tag', ckanconv.make_ckan_json_to_tag(), tags
+    yield 'make_ckan_json_to_group', ckanconv.make_ckan_json_to_group(), groups
+    yield 'make_ckan_json_to_organization', ckanconv.make_ckan_json_to_organization(), organizations
+    yield 'make_ckan_json_to_user', ckanconv.make_ckan_json_to_user(), users
+    yield 'ckan_input_package_to_output_package', ckanconv.ckan_input_package_to_output_package, packages
+    yield 'ckan_input_resource_to_output_resource', ckanconv.ckan_input_resource_to_output_resource, resources
+    yield 'ckan_input_group_to_output_group', ckanconv.ckan_input_group_to_output_group, groups
+    yield 'ckan_input_organization_to_output_organization', \
+        ckanconv.ckan_input_organization_to_output_organization, organizations
+    yield 'remove_extras', ckanconv.remove_extras, packages
+    yield 'remove_extras_without_copy', ckanconv.remove_extras_without_copy, packages
+    yield 'namify', texthelpers.namify, titles
+    yield 'tag_namify', texthelpers.tag_namify, tag_names
+    yield 'biryani1 iso8601_input_to_datetime + datetime_to_iso8601_str', pipe(
+        test_isinstance(basestring),
+        iso8601_input_to_datetime,
+        datetime_to_iso8601_str,
+        ), datetime_strs
+    # Fixtures are converted again & again, so without clearing its cache, the memoized converter only measures hits.
+    yield 'ckan_json_to_iso8601_datetime_str (cold cache)', make_cold_cache_function(
+        ckanconv.ckan_json_to_iso8601_datetime_str, ckanconv.iso8601_datetime_str_by_input), datetime_strs
+    yield 'ckan_json_to_iso8601_datetime_str (warm cache)', ckanconv.ckan_json_to_iso8601_datetime_str, datetime_strs
+
+
+def iter_memory_benchmarks(size = 'medium', seed = 0, count = 100):
+    """Iterate over ``(name, values)`` couples, whose memory is compared."""
+    generator = random.Random(seed)
+    converter = ckanconv.make_ckan_json_to_package(drop_none_values = True)
+    packages = [
+        converter(generate_package(generator, size = size))[0]
+        for index in range(count)
+        ]
+    yield 'package dicts', packages
+    yield 'package records', [
+        records.Package.from_dict(package)
+        for package in packages
+        ]
+
+
+def make_cold_cache_function(function, cache):
+    """Return a function that clears cache before each call of function, to measure it without cache hits."""
+    def cold_cache_function(value):
+        cache.clear()
+        return function(value)
+    return cold_cache_function
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.split('\n')[0])
+    parser.add_argument('-b', '--baseline', help = 'JSON file of previous results to compare with')
+    parser.add_argument('-c', '--count', default = 100, help = 'number of generated fixtures of each kind',
+        type = int)
+    parser.add_argument('-d', '--duration', default = 1.0, help = 'minimal duration of each benchmark, in seconds',
+        type = float)
+    parser.add_argument('-f', '--filter', help = 'run only benchmarks whose name contains this string')
+    parser.add_argument('-m', '--memory', action = 'store_true',
+        help = 'compare the memory used by validated packages stored as dicts & as records')
+    parser.add_argument('-s', '--save', help = 'JSON file where results are saved (to be used as a baseline)')
+    parser.add_argument('--seed', default = 0, help = 'seed of the fixtures generator', type = int)
+    parser.add_argument('--size', choices = sorted(sizes), default = 'medium', help = 'size of generated fixtures')
+    parser.add_argument('-t', '--threshold', default = 0.1,
+        help = 'relative slowdown above which a benchmark is reported as a regression', type = float)
+    args = parser.parse_args()
+
+    if args.memory:
+        for name, values in iter_memory_benchmarks(size = args.size, seed = args.seed, count = args.count):
+            # Strings shared by all values (interned ones, dict keys...) are counted once.
+            seen = set()
+            total_size = sum(
+                get_deep_size(value, seen)
+                for value in values
+                )
+            print u'{:<50} {:>12.0f} B/entity'.format(name, float(total_size) / len(values)).encode('utf-8')
+        return 0
+
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+
+    results = {}
+    regressions = []
+    for name, function, fixtures in iter_benchmarks(size = args.size, seed = args.seed, count = args.count):
+        if args.filter is not None and args.filter not in name:
+            continue
+        result = results[name] = run_benchmark(function, fixtures, duration = args.duration)
+        line = u'{:<50} {:>12.1f} ops/s'.format(name, result['ops_per_second'])
+        line += u' {:>10.1f} objects/op'.format(result['retained_objects_per_op'])
+        if result['retained_bytes_per_op'] is None:
+            line += u' {:>10} B/op'.format(u'unmeasured')
+        else:
+            line += u' {:>10.0f} B/op'.format(result['retained_bytes_per_op'])
+        if baseline is not None and name in baseline:
+            ratio = result['ops_per_second'] / baseline[name]['ops_per_second']
+            line += u' {:>+7.1%}'.format(ratio - 1)
+            if ratio < 1 - args.threshold:
+                regressions.append(name)
+                line += u' REGRESSION'
+        print line.encode('utf-8')
+
+    if args.save is not None:
+        with open(args.save, 'w') as results_file:
+            json.dump(
+                dict(
+                    count = args.count,
+                    python = sys.version,
+                    results = results,
+                    seed = args.seed,
+                    size = args.size,
+                    ),
+                results_file,
+                indent = 2,
+                sort_keys = True,
+                )
+    return 1 if regressions else 0
+
+
+def run_benchmark(function, fixtures, duration = 1.0):
+    """Apply function to fixtures in a loop during at least ``duration`` seconds and return measures.
+
+    Memory is measured without ``tracemalloc`` (missing from Python 2), on the results of a last pass: the number of
+    new objects tracked by the garbage collector (containers only, not strings) and their deep size in bytes (None
+    when ``sys.getsizeof`` is not implemented).
+    """
+    operations = 0
+    start_time = time.time()
+    while True:
+        for fixture in fixtures:
+            function(fixture)
+        operations += len(fixtures)
+        elapsed_time = time.time() - start_time
+        if elapsed_time >= duration:
+            break
+
+    # Keep results, to measure the memory they use. Objects shared with fixtures (or cached) are not counted.
+    gc.collect()
+    gc.disable()
+    try:
+        objects_count = len(gc.get_objects())
+        results = [function(fixture) for fixture in fixtures]
+        retained_objects_per_op = float(len(gc.get_objects()) - objects_count - 1) / len(fixtures)
+    finally:
+        gc.enable()
+    try:
+        seen = set()
+        get_deep_size(fixtures, seen)
+        retained_bytes_per_op = float(get_deep_size(results, seen) - sys.getsizeof(results)) / len(fixtures)
+    except TypeError:
+        # sys.getsizeof is not implemented by this Python (for example PyPy).
+        retained_bytes_per_op = None
+    del results
+
+    return dict(
+        elapsed_time = elapsed_time,
+        operations = operations,
+        ops_per_second = operations / elapsed_time,
+        retained_bytes_per_op = retained_bytes_per_op,
+        retained_objects_per_op = retained_objects_per_op,
+        )
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,220 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# CKAN-Toolbox -- Various modules that handle CKAN API and data
+# By: Emmanuel Raviart <emmanuel@raviart.com>
+#
+# Copyright (C) 2013 Etalab
+# http://github.com/etalab/ckan-toolbox
+#
+# This file is part of CKAN-Toolbox.
+#
+# CKAN-Toolbox is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# CKAN-Toolbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Bounded caches"""
+
+
+import cPickle
+import hashlib
+import json
+import threading
+
+from biryani1 import states
+
+
+json_scalar_types = frozenset([bool, float, int, long, unicode])
+# Indexes of the items of a link of the circular doubly linked list used by LRUCache
+PREVIOUS, NEXT, KEY, VALUE, SIZE = 0, 1, 2, 3, 4
+
+
+class LRUCache(object):
+    """A thread-safe mapping that keeps only its most recently used entries.
+
+    The cache is bounded by its number of entries and, when ``max_size`` is given, by the sum of the sizes given to
+    ``set()``.
+    """
+    evictions = 0
+    hits = 0
+    misses = 0
+    size = 0
+
+    def __init__(self, max_entries = 1024, max_size = None):
+        assert max_entries > 0, max_entries
+        assert max_size is None or max_size > 0, max_size
+        self.link_by_key = {}
+        self.lock = threading.Lock()
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.root = root = []  # Sentinel link: root[NEXT] is the least recently used one.
+        root[:] = [root, root, None, None, 0]
+
+    def __contains__(self, key):
+        return key in self.link_by_key
+
+    def __len__(self):
+        return len(self.link_by_key)
+
+    def clear(self):
+        with self.lock:
+            self.link_by_key.clear()
+            root = self.root
+            root[:] = [root, root, None, None, 0]
+            self.evictions = self.hits = self.misses = self.size = 0
+
+    def get(self, key, default = None):
+        with self.lock:
+            link = self.link_by_key.get(key)
+            if link is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            # Move link to the most recently used position.
+            previous_link, next_link = link[PREVIOUS], link[NEXT]
+            previous_link[NEXT] = next_link
+            next_link[PREVIOUS] = previous_link
+            root = self.root
+            last = root[PREVIOUS]
+            last[NEXT] = root[PREVIOUS] = link
+            link[PREVIOUS] = last
+            link[NEXT] = root
+            return link[VALUE]
+
+    def info(self):
+        """Return the statistics of the cache."""
+        with self.lock:
+            return dict(
+                entries = len(self.link_by_key),
+                evictions = self.evictions,
+                hits = self.hits,
+                max_entries = self.max_entries,
+                max_size = self.max_size,
+                misses = self.misses,
+                size = self.size,
+                )
+
+    def pop_least_recently_used(self):
+        """Remove the least recently used entry. Lock must be held."""
+        root = self.root
+        link = root[NEXT]
+        next_link = link[NEXT]
+        root[NEXT] = next_link
+        next_link[PREVIOUS] = root
+        del self.link_by_key[link[KEY]]
+        self.evictions += 1
+        self.size -= link[SIZE]
+        return link
+
+    def resize(self, max_entries, max_size = None):
+        assert max_entries > 0, max_entries
+        assert max_size is None or max_size > 0, max_size
+        with self.lock:
+            self.max_entries = max_entries
+            self.max_size = max_size
+            while len(self.link_by_key) > max_entries or max_size is not None and self.size > max_size:
+                self.pop_least_recently_used()
+
+    def set(self, key, value, size = 0):
+        """Add or replace an entry. ``size`` is the (approximate) size of the value, used when max_size is set."""
+        with self.lock:
+            link = self.link_by_key.get(key)
+            if link is not None:
+                # Replace existing link.
+                previous_link, next_link = link[PREVIOUS], link[NEXT]
+                previous_link[NEXT] = next_link
+                next_link[PREVIOUS] = previous_link
+                del self.link_by_key[key]
+                self.size -= link[SIZE]
+            max_size = self.max_size
+            if max_size is not None and size > max_size:
+                # Value is too big to ever be cached.
+                return
+            while len(self.link_by_key) >= self.max_entries or max_size is not None and self.size + size > max_size:
+                self.pop_least_recently_used()
+            root = self.root
+            last = root[PREVIOUS]
+            link = [last, root, key, value, size]
+            last[NEXT] = root[PREVIOUS] = self.link_by_key[key] = link
+            self.size += size
+
+
+def hash_json(value):
+    """Return a stable hash of a JSON value, independent of the order of its dict keys.
+
+    Return None when value can't be converted to JSON.
+    """
+    try:
+        canonical_json = json.dumps(value, ensure_ascii = False, separators = (',', ':'), sort_keys = True)
+    except (TypeError, ValueError):
+        return None
+    if isinstance(canonical_json, unicode):
+        canonical_json = canonical_json.encode('utf-8')
+    return hashlib.sha1(canonical_json).hexdigest()
+
+
+def is_json_value(value):
+    """Return True when value is made only of the types given by ``json.loads`` (so without byte strings).
+
+    Tuples, byte strings, non-unicode dict keys... are rejected, because their canonical JSON is shared with values of
+    other types, that converters may handle differently.
+    """
+    value_type = type(value)
+    if value_type is dict:
+        for item_key, item_value in value.iteritems():
+            if type(item_key) is not unicode or not is_json_value(item_value):
+                return False
+        return True
+    if value_type is list:
+        for item in value:
+            if not is_json_value(item):
+                return False
+        return True
+    return value is None or value_type in json_scalar_types
+
+
+def make_content_cached_converter(factory, cache = None, **options):
+    """Return the converter built by ``factory(**options)``, preceded by a cache of its results.
+
+    The results are cached using a hash of the JSON content of the input value & of the converter options, so this
+    cache is meant for inputs that have no reliable revision ID. Each call returns a new copy of the cached
+    ``(value, errors)`` couple, so that cached values are never shared.
+
+    When no cache is given, the results are cached in an LRUCache of at most 4096 entries & 64 MB. The size of an entry
+    is the length of its pickled result.
+
+    Inputs that are not plain JSON values (see ``is_json_value``) and calls with a state other than the default one
+    (which may change the error messages) are not cached.
+    """
+    if cache is None:
+        cache = LRUCache(max_entries = 4096, max_size = 64 * 1024 * 1024)
+    converter = factory(**options)
+    options_prefix = u'{}:{}:'.format(factory.__name__, json.dumps(options, sort_keys = True))
+
+    def content_cached_converter(value, state = None):
+        if state is not None and state is not states.default_state or not is_json_value(value):
+            return converter(value, state = state)
+        value_hash = hash_json(value)
+        if value_hash is None:
+            return converter(value, state = state)
+        key = options_prefix + value_hash
+        pickled_result = cache.get(key)
+        if pickled_result is None:
+            result = converter(value, state = state)
+            pickled_result = cPickle.dumps(result, 2)
+            cache.set(key, pickled_result, size = len(pickled_result))
+        return cPickle.loads(pickled_result)
+
+    content_cached_converter.cache = cache
+    return content_cached_converter
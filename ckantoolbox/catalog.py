@@ -0,0 +1,219 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# CKAN-Toolbox -- Various modules that handle CKAN API and data
+# By: Emmanuel Raviart <emmanuel@raviart.com>
+#
+# Copyright (C) 2013 Etalab
+# http://github.com/etalab/ckan-toolbox
+#
+# This file is part of CKAN-Toolbox.
+#
+# CKAN-Toolbox is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# CKAN-Toolbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""In-memory store of validated packages, with secondary indexes"""
+
+
+import bisect
+import threading
+
+
+class Catalog(object):
+    """Thread-safe store of validated packages, keyed by ID, with incrementally updated indexes.
+
+    Hash indexes give the IDs of the packages by ``format`` (of their resources, case-insensitive), ``license_id``,
+    ``owner_org``, ``tag`` (name) & ``url`` (of their resources). A sorted index gives them by ``metadata_modified``.
+    """
+    index_names = ('format', 'license_id', 'owner_org', 'tag', 'url')
+
+    def __init__(self, packages = None):
+        self.ids_by_key_by_index_name = dict(
+            (index_name, {})
+            for index_name in self.index_names
+            )
+        # Indexed keys (and indexed "metadata_modified") of each package, to remove it without recomputing them, even
+        # when the package has been modified in place since.
+        self.keys_by_index_name_by_id = {}
+        self.lock = threading.RLock()
+        self.modified_index = []  # Sorted list of (metadata_modified, id) couples
+        self.package_by_id = {}
+        if packages is not None:
+            # Bulk load: The sorted index is sorted once, instead of an insertion for each package.
+            package_by_id = dict(
+                (package['id'], package)
+                for package in packages
+                )
+            for package_id, package in package_by_id.iteritems():
+                modified = self.index_package(package)
+                if modified is not None:
+                    self.modified_index.append((modified, package_id))
+            self.modified_index.sort()
+
+    def __contains__(self, package_id):
+        return package_id in self.package_by_id
+
+    def __iter__(self):
+        return iter(self.package_by_id.values())
+
+    def __len__(self):
+        return len(self.package_by_id)
+
+    def add(self, package):
+        """Add a package, or replace the package with the same ID."""
+        package_id = package['id']
+        with self.lock:
+            if package_id in self.package_by_id:
+                self.remove(package_id)
+            modified = self.index_package(package)
+            if modified is not None:
+                bisect.insort(self.modified_index, (modified, package_id))
+
+    def get(self, package_id, default = None):
+        return self.package_by_id.get(package_id, default)
+
+    def index_package(self, package):
+        """Store a package & add it to the hash indexes. Return its ``metadata_modified``, for the sorted index."""
+        package_id = package['id']
+        self.package_by_id[package_id] = package
+        keys_by_index_name = self.keys_by_index_name_by_id[package_id] = {}
+        for index_name in self.index_names:
+            keys = keys_by_index_name[index_name] = set(self.iter_package_keys(index_name, package))
+            ids_by_key = self.ids_by_key_by_index_name[index_name]
+            for key in keys:
+                ids_by_key.setdefault(key, set()).add(package_id)
+        modified = keys_by_index_name['metadata_modified'] = package.get('metadata_modified')
+        return modified
+
+    def info(self):
+        """Return the number of packages & the number of distinct keys of each index."""
+        with self.lock:
+            return dict(
+                keys = dict(
+                    (index_name, len(ids_by_key))
+                    for index_name, ids_by_key in self.ids_by_key_by_index_name.iteritems()
+                    ),
+                packages = len(self.package_by_id),
+                )
+
+    def iter_package_keys(self, index_name, package):
+        """Iterate the keys of a package in an index."""
+        if index_name in ('license_id', 'owner_org'):
+            key = package.get(index_name)
+            if key is not None:
+                yield key
+        elif index_name == 'tag':
+            for tag in (package.get('tags') or []):
+                name = tag.get('name')
+                if name is not None:
+                    yield name
+        else:
+            for resource in (package.get('resources') or []):
+                key = resource.get(index_name)
+                if key:
+                    yield key.lower() if index_name == 'format' else key
+
+    def query(self, modified_before = None, modified_since = None, **criteria):
+        """Return the packages matching every given criterion. See ``query_ids``."""
+        with self.lock:
+            return [
+                self.package_by_id[package_id]
+                for package_id in self.query_ids(modified_before = modified_before, modified_since = modified_since,
+                    **criteria)
+                ]
+
+    def query_ids(self, modified_before = None, modified_since = None, **criteria):
+        """Return the IDs of the packages matching every given criterion.
+
+        ``criteria`` are index names (``format``, ``license_id``, ``owner_org``, ``tag``, ``url``) & the keys to look
+        for. ``modified_since`` (inclusive) & ``modified_before`` (exclusive) restrict ``metadata_modified``. Hash
+        indexes are intersected, starting with the smallest set of IDs. When a modification range is given, IDs are
+        sorted by ``metadata_modified``.
+        """
+        with self.lock:
+            ids_sets = []
+            for index_name, key in criteria.iteritems():
+                ids_by_key = self.ids_by_key_by_index_name.get(index_name)
+                if ids_by_key is None:
+                    raise ValueError(u'Unknown index: {}'.format(index_name).encode('utf-8'))
+                if index_name == 'format' and key is not None:
+                    key = key.lower()
+                ids_sets.append(ids_by_key.get(key, frozenset()))
+            ids_sets.sort(key = len)
+
+            if modified_before is None and modified_since is None:
+                if not ids_sets:
+                    return list(self.package_by_id)
+                return list(ids_sets[0].intersection(*ids_sets[1:]))
+
+            modified_index = self.modified_index
+            start = bisect.bisect_left(modified_index, (modified_since,)) if modified_since is not None else 0
+            end = bisect.bisect_left(modified_index, (modified_before,)) if modified_before is not None \
+                else len(modified_index)
+            if not ids_sets:
+                return [
+                    package_id
+                    for modified, package_id in modified_index[start:end]
+                    ]
+            if len(ids_sets[0]) < end - start:
+                # Filter the smallest set of IDs by modification date, instead of scanning the date range.
+                keys_by_index_name_by_id = self.keys_by_index_name_by_id
+                matching_modified_ids = sorted(
+                    (keys_by_index_name_by_id[package_id]['metadata_modified'], package_id)
+                    for package_id in ids_sets[0].intersection(*ids_sets[1:])
+                    )
+                return [
+                    package_id
+                    for modified, package_id in matching_modified_ids
+                    if modified is not None and (modified_since is None or modified >= modified_since)
+                        and (modified_before is None or modified < modified_before)
+                    ]
+            return [
+                package_id
+                for modified, package_id in modified_index[start:end]
+                if all(package_id in ids for ids in ids_sets)
+                ]
+
+    def remove(self, package_id):
+        """Remove a package and its index entries. Raise a KeyError when the package is not in the catalog."""
+        with self.lock:
+            del self.package_by_id[package_id]
+            keys_by_index_name = self.keys_by_index_name_by_id.pop(package_id)
+            modified = keys_by_index_name.pop('metadata_modified')
+            for index_name, keys in keys_by_index_name.iteritems():
+                ids_by_key = self.ids_by_key_by_index_name[index_name]
+                for key in keys:
+                    ids = ids_by_key[key]
+                    ids.discard(package_id)
+                    if not ids:
+                        del ids_by_key[key]
+            if modified is not None:
+                modified_index = self.modified_index
+                position = bisect.bisect_left(modified_index, (modified, package_id))
+                if position < len(modified_index) and modified_index[position] == (modified, package_id):
+                    del modified_index[position]
+
+    def resources_by_url(self, url):
+        """Return the ``(package, resource)`` couples of the resources having the given URL."""
+        with self.lock:
+            return [
+                (package, resource)
+                for package in (
+                    self.package_by_id[package_id]
+                    for package_id in self.ids_by_key_by_index_name['url'].get(url, ())
+                    )
+                for resource in (package.get('resources') or [])
+                if resource.get('url') == url
+                ]
@@ -27,28 +27,26 @@
 """Validators and converters for CKAN data"""
 
 
+import collections
+import datetime
+import functools
+import inspect
+import re
+import threading
+
+from biryani1 import baseconv
 from biryani1.baseconv import (
     anything_to_bool,
     cleanup_line,
     cleanup_text,
-    condition,
-    default,
     empty_to_none,
-    first_match,
     function,
 #    input_to_email,
     input_to_int,
     make_input_to_url,
     not_none,
     noop,
-    pipe,
-    struct,
-    test_equals,
-    test_greater_or_equal,
-    test_in,
-    test_isinstance,
-    translate,
-    uniform_sequence,
+    test,
     )
 from biryani1.datetimeconv import (
     date_to_iso8601_str,
@@ -57,12 +55,365 @@ from biryani1.datetimeconv import (
     iso8601_input_to_datetime,
     )
 
-from . import texthelpers
+from . import caches, interning, profiling, texthelpers
 
 
+ckan_iso8601_re = re.compile(
+    ur'(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2})'
+    ur'(T(?P<hour>\d{2}):(?P<minute>\d{2}):(?P<second>\d{2})(\.\d{1,6})?)?$'
+    )
 #year_or_month_or_day_re = re.compile(ur'[0-2]\d{3}(-(0[1-9]|1[0-2])(-([0-2]\d|3[0-1]))?)?$')
 
 
+converters_build_stack = []  # Names of the entities whose converters are being built (under converters_cache_lock)
+converters_cache = {}
+converters_cache_lock = threading.RLock()  # Reentrant, because factories call each other while building.
+converters_cache_statistics = dict(
+    hits = 0,
+    misses = 0,
+    )
+converters_intern_pool = None  # An interning.InternPool when converters interning is enabled
+converters_profiler = None  # A profiling.FieldTimingAggregator when converters profiling is enabled
+# Calls of the shared converters built at import time (kept by clear_converters_cache, because they are never rebuilt)
+import_shared_converter_call_by_converter = {}
+shared_converter_call_by_converter = {}  # (biryani1 builder, args, kwargs) of each converter built by shared builders
+shared_converters = {}  # Converters built by shared builders, by builder name & arguments
+shared_converters_statistics = dict(
+    hits = 0,
+    misses = 0,
+    )
+output_package_excluded_keys = frozenset([
+    'capacity',
+    'isopen',
+    'license_title',
+    'license_url',
+    'num_resources',
+    'num_tags',
+    'private',
+    'relationships_as_object',
+    'relationships_as_subject',
+    'revision_id',
+    'state',
+    'tracking_summary',
+    ])
+output_resource_excluded_keys = frozenset([
+    'cache_last_updated',
+    'cache_url',
+    'cache_url_updated',
+    'hash',
+    'id',
+    'owner',
+    'position',
+    'resource_group_id',
+    'resource_type',
+    'revision_id',
+    'size',
+    'state',
+    'tracking_summary',
+    'URI',
+    'url_type',
+    ])
+iso8601_date_str_by_input = caches.LRUCache(max_entries = 65536)
+iso8601_datetime_str_by_input = caches.LRUCache(max_entries = 65536)
+subset_entity_by_field_by_entity = dict(  # Fields whose value is an entity (or a list of entities) with fields
+    package = dict(
+        groups = ('embedded_group', True),
+        organization = ('package_organization', False),
+        resources = ('resource', True),
+        supplier = ('package_organization', False),
+        tags = ('tag', True),
+        tracking_summary = ('tracking_summary', False),
+        ),
+    resource = dict(
+        tracking_summary = ('tracking_summary', False),
+        ),
+    )
+url_by_input = caches.LRUCache(max_entries = 16384)  # Shared by every converter built by make_cached_input_to_url
+
+
+def cached_converter_factory(factory):
+    """Decorate a converter factory, so that each variant of the converter it builds is built only once.
+
+    Variants are keyed by factory name and by options (``drop_none_values``, ``keep_value_order`` &
+    ``skip_missing_items``). Converters are stateless, so the same instance is shared by every caller (and every
+    thread).
+    """
+    @functools.wraps(factory)
+    def cached_factory(*args, **kwargs):
+        arguments = inspect.getcallargs(factory, *args, **kwargs)
+        key = (factory.__name__,) + tuple(sorted(arguments.iteritems()))
+        with converters_cache_lock:
+            converter = converters_cache.get(key)
+            if converter is None:
+                converters_cache_statistics['misses'] += 1
+                converters_build_stack.append(arguments.get('entity_name') or (
+                    factory.__name__[len('make_ckan_json_to_'):]
+                    if factory.__name__.startswith('make_ckan_json_to_')
+                    else None))
+                try:
+                    converter = factory(*args, **kwargs)
+                finally:
+                    converters_build_stack.pop()
+                if converters_profiler is not None and factory.__name__.startswith('make_ckan_json_to_'):
+                    converter = converters_profiler.instrument_root(factory.__name__[len('make_ckan_json_to_'):],
+                        converter)
+                converters_cache[key] = converter
+            else:
+                converters_cache_statistics['hits'] += 1
+        return converter
+    return cached_factory
+
+
+def ckan_iso8601_input_to_date(value, state = None):
+    """Convert a date or date-time string to a date, parsing directly the formats emitted by CKAN.
+
+    Other strings are given to biryani1 ``iso8601_input_to_date``.
+    """
+    if value is None:
+        return value, None
+    match = ckan_iso8601_re.match(value)
+    if match is not None:
+        try:
+            return datetime.date(int(match.group('year')), int(match.group('month')), int(match.group('day'))), None
+        except ValueError:
+            pass
+    return iso8601_input_to_date(value, state = state)
+
+
+def ckan_iso8601_input_to_datetime(value, state = None):
+    """Convert a date or date-time string to a date-time, parsing directly the formats emitted by CKAN.
+
+    Like biryani1 ``iso8601_input_to_datetime``, fractions of second are dropped. Other strings (for example those
+    with a time zone) are given to biryani1 ``iso8601_input_to_datetime``.
+    """
+    if value is None:
+        return value, None
+    match = ckan_iso8601_re.match(value)
+    if match is not None:
+        hour = match.group('hour')
+        try:
+            if hour is None:
+                return datetime.datetime(int(match.group('year')), int(match.group('month')),
+                    int(match.group('day'))), None
+            return datetime.datetime(int(match.group('year')), int(match.group('month')), int(match.group('day')),
+                int(hour), int(match.group('minute')), int(match.group('second'))), None
+        except ValueError:
+            pass
+    return iso8601_input_to_datetime(value, state = state)
+
+
+def make_cached_input_to_url(**options):
+    """Return biryani1 ``make_input_to_url(**options)`` converter, with its results cached in ``url_by_input``.
+
+    The cache is keyed by the options & the input string. Use ``get_url_cache_info()`` & ``resize_url_cache()`` to
+    size it.
+    """
+    return make_memoized_str_converter(make_input_to_url(**options), url_by_input,
+        cache_key_prefix = tuple(sorted(options.iteritems())))
+
+
+@cached_converter_factory
+def make_ckan_input_package_to_output_package(in_place = False):
+    """Return a converter of a package retrieved from CKAN to a package that can be sent to another CKAN.
+
+    The output package is built in a single pass, without the keys of ``output_package_excluded_keys``. When
+    ``in_place`` is true, the input package (and its resources) are modified instead, so the caller must give up
+    their ownership.
+    """
+    resources_to_output_resources = uniform_sequence(make_ckan_input_resource_to_output_resource(
+        in_place = in_place))
+
+    def ckan_input_package_to_output_package(package, state = None):
+        if package is None:
+            return package, None
+        errors = {}
+        if in_place:
+            for key in output_package_excluded_keys.intersection(package):
+                del package[key]
+        else:
+            package = dict(
+                (key, value)
+                for key, value in package.iteritems()
+                if key not in output_package_excluded_keys
+                )
+
+        # Remove useless items from extras.
+        extras = [
+            dict(
+                key = extra['key'],
+                value = extra['value'],
+                )
+            for extra in (package.get('extras') or [])
+            if extra.get('value') is not None
+            ]
+        if extras:
+            package['extras'] = extras
+        else:
+            package.pop('extras', None)
+
+        resources, resources_error = resources_to_output_resources(package.get('resources'), state = state)
+        if resources_error is not None:
+            errors['resources'] = resources_error
+        if resources:
+            package['resources'] = resources
+        else:
+            package.pop('resources', None)
+
+        # Remove useless items from tags.
+        tags = [
+            dict(name = tag['name'])
+            for tag in (package.get('tags') or [])
+            ]
+        if tags:
+            package['tags'] = tags
+        else:
+            package.pop('tags', None)
+
+        return package, errors or None
+
+    return ckan_input_package_to_output_package
+
+
+@cached_converter_factory
+def make_ckan_input_resource_to_output_resource(in_place = False):
+    """Return a converter of a resource retrieved from CKAN to a resource that can be sent to another CKAN.
+
+    The output resource is built in a single pass, without the keys of ``output_resource_excluded_keys``. When
+    ``in_place`` is true, the input resource is modified instead.
+    """
+    def ckan_input_resource_to_output_resource(resource, state = None):
+        if resource is None:
+            return resource, None
+        if in_place:
+            for key in output_resource_excluded_keys.intersection(resource):
+                del resource[key]
+        else:
+            resource = dict(
+                (key, value)
+                for key, value in resource.iteritems()
+                if key not in output_resource_excluded_keys
+                )
+
+        format_ = resource.get('format')
+        if format_ is not None:
+            resource['format'] = format_.upper()
+
+        return resource, None
+
+    return ckan_input_resource_to_output_resource
+
+
+def make_memoized_str_converter(converter, cache, cache_key_prefix = None):
+    """Return a converter of strings that caches in an LRUCache the successful results of converter.
+
+    When the cache is shared by several converters, each of them must use a different ``cache_key_prefix``.
+    """
+    def memoized_str_converter(value, state = None):
+        if not isinstance(value, basestring):
+            return converter(value, state = state)
+        key = value if cache_key_prefix is None else (cache_key_prefix, value)
+        converted = cache.get(key)
+        if converted is None:
+            converted, error = converter(value, state = state)
+            if error is not None or converted is None:
+                return converted, error
+            cache.set(key, converted)
+        return converted, None
+    return memoized_str_converter
+
+
+def make_shared_converter_builder(builder):
+    """Wrap a biryani1 converter builder (``pipe``, ``test_in``...), so that its calls are hash-consed.
+
+    Calls with the same arguments (compared by value, except for converters, which are compared by identity) return
+    the same converter. As every converter given to a shared builder is itself shared, structurally identical
+    sub-trees of the schemas are built & held only once. Converters are stateless, so sharing them is safe.
+
+    The call that built each shared converter is kept in ``shared_converter_call_by_converter``, so that schemas can be
+    introspected (see :mod:`ckantoolbox.compiledconv`).
+    """
+    @functools.wraps(builder)
+    def shared_converter_builder(*args, **kwargs):
+        try:
+            key = (builder.__name__, to_hashable(args), to_hashable(kwargs))
+            hash(key)
+        except TypeError:
+            return builder(*args, **kwargs)
+        with converters_cache_lock:
+            converter = shared_converters.get(key)
+            if converter is None:
+                shared_converters_statistics['misses'] += 1
+                converter = shared_converters[key] = builder(*args, **kwargs)
+                shared_converter_call_by_converter[converter] = (builder, args, kwargs)
+            else:
+                shared_converters_statistics['hits'] += 1
+        return converter
+    return shared_converter_builder
+
+
+def struct(converters, *args, **kwargs):
+    """Build a biryani1 struct converter.
+
+    When converters profiling is enabled, each item is timed. When converters interning is enabled, the string
+    results of low-cardinality items are interned.
+    """
+    if (converters_intern_pool is not None or converters_profiler is not None) and isinstance(converters, dict):
+        if converters_intern_pool is not None:
+            entity_name = converters_build_stack[-1] if converters_build_stack else None
+            converters = dict(
+                (name, converters_intern_pool.instrument_field(entity_name, name, converter))
+                for name, converter in converters.iteritems()
+                )
+        if converters_profiler is not None:
+            converters = dict(
+                (name, converters_profiler.instrument_field(name, converter))
+                for name, converter in converters.iteritems()
+                )
+        return baseconv.struct(converters, *args, **kwargs)
+    return shared_struct(converters, *args, **kwargs)
+
+
+def to_hashable(value):
+    """Convert the arguments of a converter builder to a hashable key, distinguishing values of different types."""
+    if callable(value):
+        # Converters (and types) are compared by identity.
+        return value
+    if isinstance(value, collections.OrderedDict):
+        return (type(value), tuple(
+            (to_hashable(item_key), to_hashable(item_value))
+            for item_key, item_value in value.iteritems()
+            ))
+    if isinstance(value, dict):
+        return (type(value), tuple(sorted(
+            (to_hashable(item_key), to_hashable(item_value))
+            for item_key, item_value in value.iteritems()
+            )))
+    if isinstance(value, (list, tuple)):
+        return (type(value), tuple(
+            to_hashable(item)
+            for item in value
+            ))
+    if isinstance(value, (frozenset, set)):
+        return (type(value), frozenset(
+            to_hashable(item)
+            for item in value
+            ))
+    return (type(value), value)
+
+
+condition = make_shared_converter_builder(baseconv.condition)
+default = make_shared_converter_builder(baseconv.default)
+first_match = make_shared_converter_builder(baseconv.first_match)
+pipe = make_shared_converter_builder(baseconv.pipe)
+shared_struct = make_shared_converter_builder(baseconv.struct)
+test_equals = make_shared_converter_builder(baseconv.test_equals)
+test_greater_or_equal = make_shared_converter_builder(baseconv.test_greater_or_equal)
+test_in = make_shared_converter_builder(baseconv.test_in)
+test_isinstance = make_shared_converter_builder(baseconv.test_isinstance)
+translate = make_shared_converter_builder(baseconv.translate)
+uniform_sequence = make_shared_converter_builder(baseconv.uniform_sequence)
+
+
 ckan_input_embedded_group_to_output_embedded_group = pipe(
     function(lambda group: None if group.get('state') == 'deleted' else group),
     struct(
@@ -168,94 +519,10 @@ ckan_input_organization_to_output_organization = struct(
     )
 
 
-def ckan_input_package_to_output_package(package, state = None):
-    if package is None:
-        return package, None
-    errors = {}
-    package = package.copy()
-
-    for key in (
-            'capacity',
-            'isopen',
-            'license_title',
-            'license_url',
-            'num_resources',
-            'num_tags',
-            'private',
-            'relationships_as_object',
-            'relationships_as_subject',
-            'revision_id',
-            'state',
-            'tracking_summary',
-            ):
-        package.pop(key, None)
-
-    # Remove useless items from extras.
-    extras = [
-        dict(
-            key = extra['key'],
-            value = extra['value'],
-            )
-        for extra in (package.get('extras') or [])
-        if extra.get('value') is not None
-        ]
-    if extras:
-        package['extras'] = extras
-    else:
-        package.pop('extras', None)
-
-    resources, resources_error = uniform_sequence(ckan_input_resource_to_output_resource)(
-        package.get('resources'), state = state)
-    if resources_error is not None:
-        errors['resources'] = resources_error
-    if resources:
-        package['resources'] = resources
-    else:
-        package.pop('resources', None)
-
-    # Remove useless items from tags.
-    tags = [
-        dict(name = tag['name'])
-        for tag in (package.get('tags') or [])
-        ]
-    if tags:
-        package['tags'] = tags
-    else:
-        package.pop('tags', None)
-
-    return package, errors or None
-
-
-def ckan_input_resource_to_output_resource(resource, state = None):
-    if resource is None:
-        return resource, None
-    errors = {}
-    resource = resource.copy()
-
-    for key in (
-            'cache_last_updated',
-            'cache_url',
-            'cache_url_updated',
-            'hash',
-            'id',
-            'owner',
-            'position',
-            'resource_group_id',
-            'resource_type',
-            'revision_id',
-            'size',
-            'state',
-            'tracking_summary',
-            'URI',
-            'url_type',
-            ):
-        resource.pop(key, None)
-
-    format_ = resource.get('format')
-    if format_ is not None:
-        resource['format'] = format_.upper()
-
-    return resource, errors or None
+ckan_input_package_to_output_package = make_ckan_input_package_to_output_package()
+
+
+ckan_input_resource_to_output_resource = make_ckan_input_resource_to_output_resource()
 
 
 ckan_json_to_approval_status = pipe(
@@ -275,22 +542,28 @@ ckan_json_to_id = test_isinstance(basestring)
 
 ckan_json_to_image_url = pipe(
     test_isinstance(basestring),
-    make_input_to_url(add_prefix = u'http://', full = True, schemes = (u'data', u'http', u'https')),
+    make_cached_input_to_url(add_prefix = u'http://', full = True, schemes = (u'data', u'http', u'https')),
     function(lambda url: None if url.startswith(u'data:') else url),
     )
 
 
-ckan_json_to_iso8601_date_str = pipe(
-    test_isinstance(basestring),
-    iso8601_input_to_date,
-    date_to_iso8601_str,
+ckan_json_to_iso8601_date_str = make_memoized_str_converter(
+    pipe(
+        test_isinstance(basestring),
+        ckan_iso8601_input_to_date,
+        date_to_iso8601_str,
+        ),
+    iso8601_date_str_by_input,
     )
 
 
-ckan_json_to_iso8601_datetime_str = pipe(
-    test_isinstance(basestring),
-    iso8601_input_to_datetime,
-    datetime_to_iso8601_str,
+ckan_json_to_iso8601_datetime_str = make_memoized_str_converter(
+    pipe(
+        test_isinstance(basestring),
+        ckan_iso8601_input_to_datetime,
+        datetime_to_iso8601_str,
+        ),
+    iso8601_datetime_str_by_input,
     )
 
 
@@ -320,6 +593,93 @@ ckan_json_to_state = pipe(
     )
 
 
+def clear_converters_cache():
+    """Forget every converter built by the cached factories & the shared builders, and reset cache statistics.
+
+    The calls of the module-level converters, built at import time, are kept.
+    """
+    with converters_cache_lock:
+        converters_cache.clear()
+        converters_cache_statistics['hits'] = 0
+        converters_cache_statistics['misses'] = 0
+        shared_converter_call_by_converter.clear()
+        shared_converter_call_by_converter.update(import_shared_converter_call_by_converter)
+        shared_converters.clear()
+        shared_converters_statistics['hits'] = 0
+        shared_converters_statistics['misses'] = 0
+
+
+def disable_converters_interning():
+    """Stop building interning converters. Converters built while interning was enabled are forgotten."""
+    global converters_intern_pool
+    with converters_cache_lock:
+        converters_intern_pool = None
+        clear_converters_cache()
+
+
+def disable_converters_profiling():
+    """Stop building timed converters. Converters built while profiling was enabled are forgotten."""
+    global converters_profiler
+    with converters_cache_lock:
+        converters_profiler = None
+        clear_converters_cache()
+
+
+def enable_converters_interning(pool = None):
+    """Make the cached factories build converters interning the strings of low-cardinality fields & return the pool.
+
+    Converters built before are forgotten, but converters already obtained by callers don't intern strings. When
+    interning is disabled (the default), converters are built without any interning code.
+    """
+    global converters_intern_pool
+    if pool is None:
+        pool = interning.InternPool()
+    with converters_cache_lock:
+        converters_intern_pool = pool
+        clear_converters_cache()
+    return pool
+
+
+def enable_converters_profiling(aggregator = None):
+    """Make the cached factories build converters recording the time spent in each field, and return the aggregator.
+
+    Converters built before are forgotten, but converters already obtained by callers are not timed. When profiling
+    is disabled (the default), converters are built without any timing code.
+    """
+    global converters_profiler
+    if aggregator is None:
+        aggregator = profiling.FieldTimingAggregator()
+    with converters_cache_lock:
+        converters_profiler = aggregator
+        clear_converters_cache()
+    return aggregator
+
+
+def get_converters_cache_info():
+    """Return the statistics of the cache of converters & the options of every converter it holds."""
+    with converters_cache_lock:
+        converters_options = {}
+        for key in converters_cache:
+            converters_options.setdefault(key[0], []).append(dict(key[1:]))
+        return dict(
+            converters = converters_options,
+            hits = converters_cache_statistics['hits'],
+            misses = converters_cache_statistics['misses'],
+            shared_converters = len(shared_converters),
+            shared_hits = shared_converters_statistics['hits'],
+            shared_misses = shared_converters_statistics['misses'],
+            size = len(converters_cache),
+            )
+
+
+def get_url_cache_info():
+    """Return the statistics of the cache shared by URL converters, including its hit rate."""
+    info = url_by_input.info()
+    requests_count = info['hits'] + info['misses']
+    info['hit_rate'] = float(info['hits']) / requests_count if requests_count else None
+    return info
+
+
 def input_to_ckan_name(value, state = None):
     return texthelpers.namify(value) or None, None
 
@@ -328,6 +688,7 @@ def input_to_ckan_tag_name(value, state = None):
     return texthelpers.tag_namify(value) or None, None
 
 
+@cached_converter_factory
 def make_ckan_json_to_datastore(drop_none_values = False, keep_value_order = False, skip_missing_items = False):
     return pipe(
         test_isinstance(dict),
@@ -358,13 +719,10 @@ def make_ckan_json_to_datastore(drop_none_values = False, keep_value_order = Fal
                     ),
                 method = pipe(
                     test_isinstance(basestring),
-                    test_equals(u'insert'),
-                    not_none,
-                    ),
-                primary_key = pipe(
-                    test_isinstance(basestring),
+                    test_in([u'insert', u'update', u'upsert']),
                     not_none,
                     ),
+                primary_key = test_isinstance(basestring),  # Required by update & upsert methods only
                 resource_id = pipe(
                     ckan_json_to_id,
                     not_none,
@@ -374,9 +732,12 @@ def make_ckan_json_to_datastore(drop_none_values = False, keep_value_order = Fal
             keep_value_order = keep_value_order,
             skip_missing_items = skip_missing_items,
             ),
+        test(lambda datastore: datastore.get('method') == u'insert' or datastore.get('primary_key') is not None,
+            error = u'A primary key is required by update & upsert methods'),
         )
 
 
+@cached_converter_factory
 def make_ckan_json_to_embedded_activity(drop_none_values = False, keep_value_order = False, skip_missing_items = False):
     return pipe(
         test_isinstance(dict),
@@ -434,41 +795,13 @@ def make_ckan_json_to_embedded_activity(drop_none_values = False, keep_value_ord
         )
 
 
+@cached_converter_factory
 def make_ckan_json_to_embedded_group(drop_none_values = False, keep_value_order = False, skip_missing_items = False):
     return pipe(
         test_isinstance(dict),
         struct(
-            dict(
-                approval_status = ckan_json_to_approval_status,
-                capacity = pipe(
-                    test_isinstance(basestring),
-                    test_in([u'private', u'public']),
-                    ),
-                created = ckan_json_to_iso8601_datetime_str,
-                description = pipe(
-                    test_isinstance(basestring),
-                    cleanup_text,
-                    ),
-                display_name = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    ),
-                id = ckan_json_to_id,
-                image_display_url = ckan_json_to_image_url,
-                image_url = ckan_json_to_image_url,
-                name = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    not_none,
-                    ),
-                revision_id = ckan_json_to_id,
-                state = ckan_json_to_state,
-                title = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    ),
-                type = ckan_json_to_group_type,
-                ),
+            make_ckan_json_to_embedded_group_fields(drop_none_values = drop_none_values,
+                keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
             drop_none_values = drop_none_values,
             keep_value_order = keep_value_order,
             skip_missing_items = skip_missing_items,
@@ -476,6 +809,43 @@ def make_ckan_json_to_embedded_group(drop_none_values = False, keep_value_order
         )
 
 
+def make_ckan_json_to_embedded_group_fields(drop_none_values = False, keep_value_order = False,
+        skip_missing_items = False):
+    """Return a new dict of the converters of each embedded group field."""
+    return dict(
+        approval_status = ckan_json_to_approval_status,
+        capacity = pipe(
+            test_isinstance(basestring),
+            test_in([u'private', u'public']),
+            ),
+        created = ckan_json_to_iso8601_datetime_str,
+        description = pipe(
+            test_isinstance(basestring),
+            cleanup_text,
+            ),
+        display_name = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            ),
+        id = ckan_json_to_id,
+        image_display_url = ckan_json_to_image_url,
+        image_url = ckan_json_to_image_url,
+        name = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            not_none,
+            ),
+        revision_id = ckan_json_to_id,
+        state = ckan_json_to_state,
+        title = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            ),
+        type = ckan_json_to_group_type,
+        )
+
+
+@cached_converter_factory
 def make_ckan_json_to_embedded_package(drop_none_values = False, keep_value_order = False, skip_missing_items = False):
     return pipe(
         test_isinstance(dict),
@@ -536,7 +906,7 @@ def make_ckan_json_to_embedded_package(drop_none_values = False, keep_value_orde
                     ),
                 url = pipe(
                     test_isinstance(basestring),
-                    make_input_to_url(add_prefix = u'http://', full = True),
+                    make_cached_input_to_url(add_prefix = u'http://', full = True),
                     ),
                 version = pipe(
                     test_isinstance(basestring),
@@ -550,6 +920,7 @@ def make_ckan_json_to_embedded_package(drop_none_values = False, keep_value_orde
         )
 
 
+@cached_converter_factory
 def make_ckan_json_to_embedded_user(drop_none_values = False, keep_value_order = False, skip_missing_items = False):
     return pipe(
         test_isinstance(dict),
@@ -613,594 +984,581 @@ def make_ckan_json_to_embedded_user(drop_none_values = False, keep_value_order =
         )
 
 
+@cached_converter_factory
 def make_ckan_json_to_group(drop_none_values = False, keep_value_order = False, skip_missing_items = False):
     return pipe(
         test_isinstance(dict),
-        remove_extras,
+        remove_extras_without_copy,
         struct(
-            dict(
-                approval_status = pipe(
-                    ckan_json_to_approval_status,
-                    not_none,
-                    ),
-                capacity = pipe(
-                    test_isinstance(basestring),
-                    test_in([u'private', u'public']),
-                    ),
-                created = ckan_json_to_iso8601_datetime_str,
-                description = pipe(
-                    test_isinstance(basestring),
-                    cleanup_text,
-                    ),
-                display_name = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    ),
-                extras = pipe(
-                    test_isinstance(list),
-                    uniform_sequence(
-                        pipe(
-                            test_isinstance(dict),
-                            struct(
-                                dict(
-                                    __extras = pipe(
-                                        test_isinstance(dict),
-                                        struct(
-                                            dict(
-                                                group_id = pipe(
-                                                    ckan_json_to_id,
-                                                    not_none,
-                                                    ),
-                                                revision_id = pipe(
-                                                    ckan_json_to_id,
-                                                    not_none,
-                                                    ),
-                                                ),
+            make_ckan_json_to_group_fields(drop_none_values = drop_none_values, keep_value_order = keep_value_order,
+                skip_missing_items = skip_missing_items),
+            drop_none_values = drop_none_values,
+            keep_value_order = keep_value_order,
+            skip_missing_items = skip_missing_items,
+            ),
+        )
+
+
+def make_ckan_json_to_group_fields(drop_none_values = False, keep_value_order = False, skip_missing_items = False):
+    """Return a new dict of the converters of each group field, used by the group converter."""
+    return dict(
+        approval_status = pipe(
+            ckan_json_to_approval_status,
+            not_none,
+            ),
+        capacity = pipe(
+            test_isinstance(basestring),
+            test_in([u'private', u'public']),
+            ),
+        created = ckan_json_to_iso8601_datetime_str,
+        description = pipe(
+            test_isinstance(basestring),
+            cleanup_text,
+            ),
+        display_name = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            ),
+        extras = pipe(
+            test_isinstance(list),
+            uniform_sequence(
+                pipe(
+                    test_isinstance(dict),
+                    struct(
+                        dict(
+                            __extras = pipe(
+                                test_isinstance(dict),
+                                struct(
+                                    dict(
+                                        group_id = pipe(
+                                            ckan_json_to_id,
+                                            not_none,
+                                            ),
+                                        revision_id = pipe(
+                                            ckan_json_to_id,
+                                            not_none,
                                             ),
-                                        ),
-                                    group_id = ckan_json_to_id,
-                                    id = ckan_json_to_id,
-                                    key = pipe(
-                                        test_isinstance(basestring),
-                                        cleanup_line,
-                                        not_none,
-                                        ),
-                                    revision_id = ckan_json_to_id,
-                                    state = ckan_json_to_state,
-                                    value = pipe(
-                                        test_isinstance(basestring),
-                                        cleanup_line,
                                         ),
                                     ),
                                 ),
-                            not_none,
-                            ),
-                        ),
-                    empty_to_none,
-                    ),
-                groups = pipe(
-                    test_isinstance(list),
-                    uniform_sequence(
-                        pipe(
-                            make_ckan_json_to_embedded_group(drop_none_values = drop_none_values,
-                                keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
-                            not_none,
+                            group_id = ckan_json_to_id,
+                            id = ckan_json_to_id,
+                            key = pipe(
+                                test_isinstance(basestring),
+                                cleanup_line,
+                                not_none,
+                                ),
+                            revision_id = ckan_json_to_id,
+                            state = ckan_json_to_state,
+                            value = pipe(
+                                test_isinstance(basestring),
+                                cleanup_line,
+                                ),
                             ),
                         ),
-                    empty_to_none,
-                    ),
-                id = pipe(
-                    ckan_json_to_id,
-                    not_none,
-                    ),
-                image_url = ckan_json_to_image_url,
-                is_organization = test_isinstance(bool),
-                name = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
                     not_none,
                     ),
-                num_followers = pipe(
-                    test_isinstance(int),
-                    test_greater_or_equal(0),
-                    ),
-                package_count = pipe(
-                    test_isinstance(int),
-                    test_greater_or_equal(0),
-                    ),
-                packages = pipe(
-                    test_isinstance(list),
-                    uniform_sequence(
-                        pipe(
-                            make_ckan_json_to_embedded_package(drop_none_values = drop_none_values,
-                                keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
-                            not_none,
-                            ),
-                        ),
-                    empty_to_none,
-                    ),
-                revision_id = pipe(
-                    ckan_json_to_id,
+                ),
+            empty_to_none,
+            ),
+        groups = pipe(
+            test_isinstance(list),
+            uniform_sequence(
+                pipe(
+                    make_ckan_json_to_embedded_group(drop_none_values = drop_none_values,
+                        keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
                     not_none,
                     ),
-                state = ckan_json_to_state,
-                tags = pipe(
-                    test_isinstance(list),
-                    uniform_sequence(
-                        pipe(
-                            make_ckan_json_to_tag(drop_none_values = drop_none_values,
-                                keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
-                            not_none,
-                            ),
-                        ),
-                    empty_to_none,
-                    ),
-                title = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
+                ),
+            empty_to_none,
+            ),
+        id = pipe(
+            ckan_json_to_id,
+            not_none,
+            ),
+        image_url = ckan_json_to_image_url,
+        is_organization = test_isinstance(bool),
+        name = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            not_none,
+            ),
+        num_followers = pipe(
+            test_isinstance(int),
+            test_greater_or_equal(0),
+            ),
+        package_count = pipe(
+            test_isinstance(int),
+            test_greater_or_equal(0),
+            ),
+        packages = pipe(
+            test_isinstance(list),
+            uniform_sequence(
+                pipe(
+                    make_ckan_json_to_embedded_package(drop_none_values = drop_none_values,
+                        keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
                     not_none,
                     ),
-                type = pipe(
-                    ckan_json_to_group_type,
+                ),
+            empty_to_none,
+            ),
+        revision_id = pipe(
+            ckan_json_to_id,
+            not_none,
+            ),
+        state = ckan_json_to_state,
+        tags = pipe(
+            test_isinstance(list),
+            uniform_sequence(
+                pipe(
+                    make_ckan_json_to_tag(drop_none_values = drop_none_values,
+                        keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
                     not_none,
                     ),
-                users = pipe(
-                    test_isinstance(list),
-                    uniform_sequence(
-                        pipe(
-                            make_ckan_json_to_embedded_user(drop_none_values = drop_none_values,
-                                keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
-                            not_none,
-                            ),
-                        ),
+                ),
+            empty_to_none,
+            ),
+        title = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            not_none,
+            ),
+        type = pipe(
+            ckan_json_to_group_type,
+            not_none,
+            ),
+        users = pipe(
+            test_isinstance(list),
+            uniform_sequence(
+                pipe(
+                    make_ckan_json_to_embedded_user(drop_none_values = drop_none_values,
+                        keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
                     not_none,
-                    empty_to_none,
                     ),
                 ),
-            drop_none_values = drop_none_values,
-            keep_value_order = keep_value_order,
-            skip_missing_items = skip_missing_items,
+            not_none,
+            empty_to_none,
             ),
         )
 
 
+@cached_converter_factory
 def make_ckan_json_to_organization(drop_none_values = False, keep_value_order = False, skip_missing_items = False):
     return pipe(
         test_isinstance(dict),
-        remove_extras,
+        remove_extras_without_copy,
         struct(
-            dict(
-                approval_status = pipe(
-                    ckan_json_to_approval_status,
+            make_ckan_json_to_organization_fields(drop_none_values = drop_none_values,
+                keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
+            drop_none_values = drop_none_values,
+            keep_value_order = keep_value_order,
+            skip_missing_items = skip_missing_items,
+            ),
+        )
+
+
+def make_ckan_json_to_organization_fields(drop_none_values = False, keep_value_order = False,
+        skip_missing_items = False):
+    """Return a new dict of the converters of each organization field, used by the organization converter."""
+    return dict(
+        approval_status = pipe(
+            ckan_json_to_approval_status,
+            not_none,
+            ),
+        created = pipe(
+            ckan_json_to_iso8601_date_str,
+            not_none,
+            ),
+        description = pipe(
+            test_isinstance(basestring),
+            cleanup_text,
+            ),
+        display_name = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            ),
+        extras = pipe(
+            test_isinstance(list),
+            uniform_sequence(
+                pipe(
+                    test_isinstance(dict),
+                    struct(
+                        dict(
+                            group_id = pipe(
+                                ckan_json_to_id,
+                                not_none,
+                                ),
+                            id = pipe(
+                                ckan_json_to_id,
+                                not_none,
+                                ),
+                            key = pipe(
+                                test_isinstance(basestring),
+                                cleanup_line,
+                                not_none,
+                                ),
+                            revision_id = pipe(
+                                ckan_json_to_id,
+                                not_none,
+                                ),
+                            state = pipe(
+                                ckan_json_to_state,
+                                not_none,
+                                ),
+                            value = pipe(
+                                test_isinstance(basestring),
+                                cleanup_line,
+                                ),
+                            ),
+                        ),
                     not_none,
                     ),
-                created = pipe(
-                    ckan_json_to_iso8601_date_str,
+                ),
+            not_none,
+            empty_to_none,
+            ),
+        groups = pipe(
+            test_isinstance(list),
+            uniform_sequence(
+                pipe(
+                    make_ckan_json_to_embedded_group(drop_none_values = drop_none_values,
+                        keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
                     not_none,
                     ),
-                description = pipe(
-                    test_isinstance(basestring),
-                    cleanup_text,
-                    ),
-                display_name = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    ),
-                extras = pipe(
-                    test_isinstance(list),
-                    uniform_sequence(
-                        pipe(
-                            test_isinstance(dict),
-                            struct(
-                                dict(
-                                    group_id = pipe(
-                                        ckan_json_to_id,
-                                        not_none,
-                                        ),
-                                    id = pipe(
-                                        ckan_json_to_id,
-                                        not_none,
-                                        ),
-                                    key = pipe(
-                                        test_isinstance(basestring),
-                                        cleanup_line,
-                                        not_none,
-                                        ),
-                                    revision_id = pipe(
-                                        ckan_json_to_id,
-                                        not_none,
-                                        ),
-                                    state = pipe(
-                                        ckan_json_to_state,
-                                        not_none,
-                                        ),
-                                    value = pipe(
-                                        test_isinstance(basestring),
-                                        cleanup_line,
-                                        ),
-                                    ),
-                                ),
-                            not_none,
-                            ),
-                        ),
-                    not_none,
-                    empty_to_none,
-                    ),
-                groups = pipe(
-                    test_isinstance(list),
-                    uniform_sequence(
-                        pipe(
-                            make_ckan_json_to_embedded_group(drop_none_values = drop_none_values,
-                                keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
-                            not_none,
-                            ),
-                        ),
-                    empty_to_none,
-                    ),
-                id = pipe(
-                    ckan_json_to_id,
-                    not_none,
-                    ),
-                image_url = ckan_json_to_image_url,
-                is_organization = pipe(
-                    test_isinstance(bool),
-                    not_none,
-                    ),
-                name = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    not_none,
-                    ),
-                num_followers = pipe(
-                    test_isinstance(int),
-                    test_greater_or_equal(0),
-                    not_none,
-                    ),
-                package_count = pipe(
-                    test_isinstance(int),
-                    test_greater_or_equal(0),
-                    not_none,
-                    ),
-                packages = pipe(
-                    test_isinstance(list),
-                    uniform_sequence(
-                        pipe(
-                            make_ckan_json_to_embedded_package(drop_none_values = drop_none_values,
-                                keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
-                            not_none,
-                            ),
-                        ),
-                    empty_to_none,
-                    ),
-                revision_id = pipe(
-                    ckan_json_to_id,
-                    not_none,
-                    ),
-                revision_timestamp = ckan_json_to_iso8601_datetime_str,
-                state = pipe(
-                    ckan_json_to_state,
-                    not_none,
-                    ),
-                tags = pipe(
-                    test_isinstance(list),
-                    uniform_sequence(
-                        pipe(
-                            make_ckan_json_to_tag(drop_none_values = drop_none_values,
-                                keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
-                            not_none,
-                            ),
-                        ),
+                ),
+            empty_to_none,
+            ),
+        id = pipe(
+            ckan_json_to_id,
+            not_none,
+            ),
+        image_url = ckan_json_to_image_url,
+        is_organization = pipe(
+            test_isinstance(bool),
+            not_none,
+            ),
+        name = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            not_none,
+            ),
+        num_followers = pipe(
+            test_isinstance(int),
+            test_greater_or_equal(0),
+            not_none,
+            ),
+        package_count = pipe(
+            test_isinstance(int),
+            test_greater_or_equal(0),
+            not_none,
+            ),
+        packages = pipe(
+            test_isinstance(list),
+            uniform_sequence(
+                pipe(
+                    make_ckan_json_to_embedded_package(drop_none_values = drop_none_values,
+                        keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
                     not_none,
-                    empty_to_none,
                     ),
-                title = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
+                ),
+            empty_to_none,
+            ),
+        revision_id = pipe(
+            ckan_json_to_id,
+            not_none,
+            ),
+        revision_timestamp = ckan_json_to_iso8601_datetime_str,
+        state = pipe(
+            ckan_json_to_state,
+            not_none,
+            ),
+        tags = pipe(
+            test_isinstance(list),
+            uniform_sequence(
+                pipe(
+                    make_ckan_json_to_tag(drop_none_values = drop_none_values,
+                        keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
                     not_none,
                     ),
-                type = pipe(
-                    test_isinstance(basestring),
-                    test_equals(u'organization'),
-                    ),
-                users = pipe(
-                    test_isinstance(list),
-                    uniform_sequence(
-                        pipe(
-                            make_ckan_json_to_embedded_user(drop_none_values = drop_none_values,
-                                keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
-                            not_none,
-                            ),
-                        ),
+                ),
+            not_none,
+            empty_to_none,
+            ),
+        title = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            not_none,
+            ),
+        type = pipe(
+            test_isinstance(basestring),
+            test_equals(u'organization'),
+            ),
+        users = pipe(
+            test_isinstance(list),
+            uniform_sequence(
+                pipe(
+                    make_ckan_json_to_embedded_user(drop_none_values = drop_none_values,
+                        keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
                     not_none,
-                    empty_to_none,
                     ),
                 ),
-            drop_none_values = drop_none_values,
-            keep_value_order = keep_value_order,
-            skip_missing_items = skip_missing_items,
+            not_none,
+            empty_to_none,
             ),
         )
 
 
+@cached_converter_factory
 def make_ckan_json_to_package(drop_none_values = False, keep_value_order = False, skip_missing_items = False):
     return pipe(
         test_isinstance(dict),
-        remove_extras,
+        remove_extras_without_copy,
         struct(
-            dict(
-                author = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    ),
-                author_email = pipe(
-                    test_isinstance(basestring),
-#                    input_to_email,
-                    cleanup_line,
-                    ),
-                capacity = pipe(
-                    test_isinstance(basestring),
-                    test_in([u'private', u'public']),
-                    ),
-                creator_user_id = ckan_json_to_id,  # Set by ckanext-harvest
-                extras = pipe(
-                    test_isinstance(list),
-                    uniform_sequence(
-                        pipe(
-                            test_isinstance(dict),
-                            struct(
-                                dict(
-                                    __extras = pipe(
-                                        test_isinstance(dict),
-                                        struct(
-                                            dict(
-                                                package_id = pipe(
-                                                    ckan_json_to_id,
-                                                    not_none,
-                                                    ),
-                                                revision_id = pipe(
-                                                    ckan_json_to_id,
-                                                    not_none,
-                                                    ),
-                                                ),
+            make_ckan_json_to_package_fields(drop_none_values = drop_none_values, keep_value_order = keep_value_order,
+                skip_missing_items = skip_missing_items),
+            drop_none_values = drop_none_values,
+            keep_value_order = keep_value_order,
+            skip_missing_items = skip_missing_items,
+            ),
+        )
+
+
+def make_ckan_json_to_package_fields(drop_none_values = False, keep_value_order = False, skip_missing_items = False):
+    """Return a new dict of the converters of each package field."""
+    return dict(
+        author = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            ),
+        author_email = pipe(
+            test_isinstance(basestring),
+#            input_to_email,
+            cleanup_line,
+            ),
+        capacity = pipe(
+            test_isinstance(basestring),
+            test_in([u'private', u'public']),
+            ),
+        creator_user_id = ckan_json_to_id,  # Set by ckanext-harvest
+        extras = pipe(
+            test_isinstance(list),
+            uniform_sequence(
+                pipe(
+                    test_isinstance(dict),
+                    struct(
+                        dict(
+                            __extras = pipe(
+                                test_isinstance(dict),
+                                struct(
+                                    dict(
+                                        package_id = pipe(
+                                            ckan_json_to_id,
+                                            not_none,
+                                            ),
+                                        revision_id = pipe(
+                                            ckan_json_to_id,
+                                            not_none,
                                             ),
-                                        ),
-                                    deleted = test_equals(True),
-                                    id = ckan_json_to_id,
-                                    key = pipe(
-                                        test_isinstance(basestring),
-                                        cleanup_line,
-                                        not_none,
-                                        ),
-                                    package_id = ckan_json_to_id,
-                                    revision_id = ckan_json_to_id,
-                                    revision_timestamp = ckan_json_to_iso8601_datetime_str,
-                                    state = ckan_json_to_state,
-                                    value = pipe(
-                                        test_isinstance(basestring),
-                                        cleanup_line,
                                         ),
                                     ),
                                 ),
-                            not_none,
-                            ),
-                        ),
-                    empty_to_none,
-                    ),
-                frequency = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    ),
-                groups = pipe(
-                    test_isinstance(list),
-                    uniform_sequence(
-                        pipe(
-                            make_ckan_json_to_embedded_group(drop_none_values = drop_none_values,
-                                keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
-                            not_none,
-                            ),
-                        ),
-                    empty_to_none,
-                    ),
-                id = pipe(
-                    ckan_json_to_id,
-                    not_none,
-                    ),
-                isopen = pipe(
-                    test_isinstance(bool),
-                    not_none,
-                    ),
-                license_id = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    ),
-                license_title = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    ),
-                license_url = pipe(
-                    test_isinstance(basestring),
-                    make_input_to_url(full = True),
-                    ),
-                maintainer = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    ),
-                maintainer_email = pipe(
-                    test_isinstance(basestring),
-#                    input_to_email,
-                    cleanup_line,
-                    ),
-                metadata_created = pipe(
-                    ckan_json_to_iso8601_date_str,
-                    not_none,
-                    ),
-                metadata_modified = pipe(
-                    ckan_json_to_iso8601_date_str,
-                    not_none,
-                    ),
-                name = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    not_none,
-                    ),
-                notes = pipe(
-                    test_isinstance(basestring),
-                    cleanup_text,
-                    ),
-                num_resources = pipe(
-                    test_isinstance(int),
-                    test_greater_or_equal(0),
-                    ),
-                num_tags = pipe(
-                    test_isinstance(int),
-                    test_greater_or_equal(0),
-                    ),
-                organization = make_ckan_json_to_package_organization(drop_none_values = drop_none_values,
-                    keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
-                owner_org = ckan_json_to_id,
-                private = test_isinstance(bool),
-                relationships_as_object = make_ckan_json_to_package_relationships(drop_none_values = drop_none_values,
-                    keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
-                relationships_as_subject = make_ckan_json_to_package_relationships(drop_none_values = drop_none_values,
-                    keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
-                resources = pipe(
-                    test_isinstance(list),
-                    uniform_sequence(
-                        pipe(
-                            make_ckan_json_to_resource(drop_none_values = drop_none_values,
-                                keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
-                            not_none,
-                            ),
-                        ),
-                    empty_to_none,
-                    ),
-                revision_id = pipe(
-                    ckan_json_to_id,
-                    not_none,
-                    ),
-                revision_timestamp = pipe(
-                    ckan_json_to_iso8601_datetime_str,
-                    not_none,
-                    ),
-                state = pipe(
-                    ckan_json_to_package_state,
-                    not_none,
-                    ),
-                supplier = make_ckan_json_to_package_organization(drop_none_values = drop_none_values,
-                    keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
-                supplier_id = ckan_json_to_id,
-                tags = pipe(
-                    test_isinstance(list),
-                    uniform_sequence(
-                        pipe(
-                            make_ckan_json_to_tag(drop_none_values = drop_none_values,
-                                keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
-                            not_none,
+                            deleted = test_equals(True),
+                            id = ckan_json_to_id,
+                            key = pipe(
+                                test_isinstance(basestring),
+                                cleanup_line,
+                                not_none,
+                                ),
+                            package_id = ckan_json_to_id,
+                            revision_id = ckan_json_to_id,
+                            revision_timestamp = ckan_json_to_iso8601_datetime_str,
+                            state = ckan_json_to_state,
+                            value = pipe(
+                                test_isinstance(basestring),
+                                cleanup_line,
+                                ),
                             ),
-                        ),
-                    empty_to_none,
-                    ),
-                temporal_coverage_from = pipe(
-                    test_isinstance(basestring),
-#                    test(year_or_month_or_day_re.match, error = N_(u'Invalid year or month or day')),
-                    cleanup_line,
-                    ),
-                temporal_coverage_to = pipe(
-                    test_isinstance(basestring),
-#                    test(year_or_month_or_day_re.match, error = N_(u'Invalid year or month or day')),
-                    cleanup_line,
-                    ),
-                territorial_coverage = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    ),
-                territorial_coverage_granularity = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,  # TODO
-                    ),
-                title = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
+                        ),
                     not_none,
                     ),
-                tracking_summary = make_ckan_json_to_tracking_summary(drop_none_values = drop_none_values,
-                    keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
-                type = pipe(
-                    test_isinstance(basestring),
-                    translate({u'None': None}),
-                    test_in([u'dataset', u'harvest']),
-                    default(u'dataset'),
+                ),
+            empty_to_none,
+            ),
+        frequency = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            ),
+        groups = pipe(
+            test_isinstance(list),
+            uniform_sequence(
+                pipe(
+                    make_ckan_json_to_embedded_group(drop_none_values = drop_none_values,
+                        keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
+                    not_none,
                     ),
-                url = pipe(
-                    test_isinstance(basestring),
-                    make_input_to_url(add_prefix = u'http://', full = True),
+                ),
+            empty_to_none,
+            ),
+        id = pipe(
+            ckan_json_to_id,
+            not_none,
+            ),
+        isopen = pipe(
+            test_isinstance(bool),
+            not_none,
+            ),
+        license_id = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            ),
+        license_title = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            ),
+        license_url = pipe(
+            test_isinstance(basestring),
+            make_cached_input_to_url(full = True),
+            ),
+        maintainer = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            ),
+        maintainer_email = pipe(
+            test_isinstance(basestring),
+#            input_to_email,
+            cleanup_line,
+            ),
+        metadata_created = pipe(
+            ckan_json_to_iso8601_date_str,
+            not_none,
+            ),
+        metadata_modified = pipe(
+            ckan_json_to_iso8601_date_str,
+            not_none,
+            ),
+        name = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            not_none,
+            ),
+        notes = pipe(
+            test_isinstance(basestring),
+            cleanup_text,
+            ),
+        num_resources = pipe(
+            test_isinstance(int),
+            test_greater_or_equal(0),
+            ),
+        num_tags = pipe(
+            test_isinstance(int),
+            test_greater_or_equal(0),
+            ),
+        organization = make_ckan_json_to_package_organization(drop_none_values = drop_none_values,
+            keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
+        owner_org = ckan_json_to_id,
+        private = test_isinstance(bool),
+        relationships_as_object = make_ckan_json_to_package_relationships(drop_none_values = drop_none_values,
+            keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
+        relationships_as_subject = make_ckan_json_to_package_relationships(drop_none_values = drop_none_values,
+            keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
+        resources = pipe(
+            test_isinstance(list),
+            uniform_sequence(
+                pipe(
+                    make_ckan_json_to_resource(drop_none_values = drop_none_values,
+                        keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
+                    not_none,
                     ),
-                version = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
+                ),
+            empty_to_none,
+            ),
+        revision_id = pipe(
+            ckan_json_to_id,
+            not_none,
+            ),
+        revision_timestamp = pipe(
+            ckan_json_to_iso8601_datetime_str,
+            not_none,
+            ),
+        state = pipe(
+            ckan_json_to_package_state,
+            not_none,
+            ),
+        supplier = make_ckan_json_to_package_organization(drop_none_values = drop_none_values,
+            keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
+        supplier_id = ckan_json_to_id,
+        tags = pipe(
+            test_isinstance(list),
+            uniform_sequence(
+                pipe(
+                    make_ckan_json_to_tag(drop_none_values = drop_none_values,
+                        keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
+                    not_none,
                     ),
                 ),
-            drop_none_values = drop_none_values,
-            keep_value_order = keep_value_order,
-            skip_missing_items = skip_missing_items,
+            empty_to_none,
+            ),
+        temporal_coverage_from = pipe(
+            test_isinstance(basestring),
+#            test(year_or_month_or_day_re.match, error = N_(u'Invalid year or month or day')),
+            cleanup_line,
+            ),
+        temporal_coverage_to = pipe(
+            test_isinstance(basestring),
+#            test(year_or_month_or_day_re.match, error = N_(u'Invalid year or month or day')),
+            cleanup_line,
+            ),
+        territorial_coverage = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            ),
+        territorial_coverage_granularity = pipe(
+            test_isinstance(basestring),
+            cleanup_line,  # TODO
+            ),
+        title = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            not_none,
+            ),
+        tracking_summary = make_ckan_json_to_tracking_summary(drop_none_values = drop_none_values,
+            keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
+        type = pipe(
+            test_isinstance(basestring),
+            translate({u'None': None}),
+            test_in([u'dataset', u'harvest']),
+            default(u'dataset'),
+            ),
+        url = pipe(
+            test_isinstance(basestring),
+            make_cached_input_to_url(add_prefix = u'http://', full = True),
+            ),
+        version = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
             ),
         )
 
 
+def make_ckan_json_to_package_subset(paths, drop_none_values = False, keep_value_order = False,
+        skip_missing_items = False):
+    """Return a package converter restricted to some fields. Other fields are dropped without being converted.
+
+    ``paths`` is an iterable of field names, or of dotted paths for the fields of embedded entities (for example
+    ``resources.url`` or ``organization.name``). Converters are cached by set of paths.
+    """
+    return make_subset_converter('package', normalize_subset_paths(paths), drop_none_values = drop_none_values,
+        keep_value_order = keep_value_order, skip_missing_items = skip_missing_items)
+
+
+@cached_converter_factory
 def make_ckan_json_to_package_organization(drop_none_values = False, keep_value_order = False,
         skip_missing_items = False):
     return pipe(
         test_isinstance(dict),
         struct(
-            dict(
-                approval_status = pipe(
-                    ckan_json_to_approval_status,
-                    not_none,
-                    ),
-                created = pipe(
-                    ckan_json_to_iso8601_date_str,
-                    not_none,
-                    ),
-                description = pipe(
-                    test_isinstance(basestring),
-                    cleanup_text,
-                    ),
-                id = pipe(
-                    ckan_json_to_id,
-                    not_none,
-                    ),
-                image_url = ckan_json_to_image_url,
-                is_organization = pipe(
-                    test_isinstance(bool),
-                    not_none,
-                    ),
-                name = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    not_none,
-                    ),
-                revision_id = pipe(
-                    ckan_json_to_id,
-                    not_none,
-                    ),
-                revision_timestamp = pipe(
-                    ckan_json_to_iso8601_datetime_str,
-                    not_none,
-                    ),
-                state = pipe(
-                    ckan_json_to_state,
-                    not_none,
-                    ),
-                title = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    not_none,
-                    ),
-                type = pipe(
-                    test_isinstance(basestring),
-                    test_equals(u'organization'),
-                    ),
-                ),
+            make_ckan_json_to_package_organization_fields(drop_none_values = drop_none_values,
+                keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
             drop_none_values = drop_none_values,
             keep_value_order = keep_value_order,
             skip_missing_items = skip_missing_items,
@@ -1208,6 +1566,61 @@ def make_ckan_json_to_package_organization(drop_none_values = False, keep_value_
         )
 
 
+def make_ckan_json_to_package_organization_fields(drop_none_values = False, keep_value_order = False,
+        skip_missing_items = False):
+    """Return a new dict of the converters of each package organization field."""
+    return dict(
+        approval_status = pipe(
+            ckan_json_to_approval_status,
+            not_none,
+            ),
+        created = pipe(
+            ckan_json_to_iso8601_date_str,
+            not_none,
+            ),
+        description = pipe(
+            test_isinstance(basestring),
+            cleanup_text,
+            ),
+        id = pipe(
+            ckan_json_to_id,
+            not_none,
+            ),
+        image_url = ckan_json_to_image_url,
+        is_organization = pipe(
+            test_isinstance(bool),
+            not_none,
+            ),
+        name = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            not_none,
+            ),
+        revision_id = pipe(
+            ckan_json_to_id,
+            not_none,
+            ),
+        revision_timestamp = pipe(
+            ckan_json_to_iso8601_datetime_str,
+            not_none,
+            ),
+        state = pipe(
+            ckan_json_to_state,
+            not_none,
+            ),
+        title = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            not_none,
+            ),
+        type = pipe(
+            test_isinstance(basestring),
+            test_equals(u'organization'),
+            ),
+        )
+
+
+@cached_converter_factory
 def make_ckan_json_to_package_relationships(drop_none_values = False, keep_value_order = False,
         skip_missing_items = False):
     return pipe(
@@ -1278,69 +1691,14 @@ def make_ckan_json_to_package_relationships(drop_none_values = False, keep_value
         )
 
 
+@cached_converter_factory
 def make_ckan_json_to_related(drop_none_values = False, keep_value_order = False, skip_missing_items = False):
     return pipe(
         test_isinstance(dict),
-        remove_extras,
+        remove_extras_without_copy,
         struct(
-            dict(
-                __extras = pipe(
-                    test_isinstance(dict),
-                    struct(
-                        dict(
-                            view_count = pipe(
-                                test_isinstance(int),
-                                test_greater_or_equal(0),
-                                ),
-                            ),
-                        ),
-                    ),
-                created = ckan_json_to_iso8601_datetime_str,
-                dataset_id = ckan_json_to_id,  # CKANExt-fedmsg specific
-                description = pipe(
-                    test_isinstance(basestring),
-                    cleanup_text,
-                    ),
-                featured = pipe(
-                    test_isinstance(int),
-                    anything_to_bool,
-                    not_none,
-                    ),
-                id = pipe(
-                    ckan_json_to_id,
-                    not_none,
-                    ),
-                image_url = ckan_json_to_image_url,
-                owner_id = ckan_json_to_id,
-                title = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    not_none,
-                    ),
-                type = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    test_in([
-                        u'api',
-                        u'application',
-                        u'idea',
-                        u'news_article',
-                        u'paper',
-                        u'post',
-                        u'smart_image',  # TODO: Obsolete, to remove.
-                        u'smart_viewer',  # TODO: Obsolete, to remove.
-                        u'visualization',
-                        ]),
-                    ),
-                url = pipe(
-                    test_isinstance(basestring),
-                    make_input_to_url(add_prefix = u'http://', full = True),
-                    ),
-                view_count = pipe(
-                    test_isinstance(int),
-                    test_greater_or_equal(0),
-                    ),
-                ),
+            make_ckan_json_to_related_fields(drop_none_values = drop_none_values, keep_value_order = keep_value_order,
+                skip_missing_items = skip_missing_items),
             drop_none_values = drop_none_values,
             keep_value_order = keep_value_order,
             skip_missing_items = skip_missing_items,
@@ -1348,118 +1706,75 @@ def make_ckan_json_to_related(drop_none_values = False, keep_value_order = False
         )
 
 
-def make_ckan_json_to_resource(drop_none_values = False, keep_value_order = False, skip_missing_items = False):
-    return pipe(
-        test_isinstance(dict),
-        struct(
-            dict(
-                cache_last_updated = ckan_json_to_iso8601_datetime_str,
-                cache_url = pipe(
-                    test_isinstance(basestring),
-                    make_input_to_url(full = True),
-                    ),
-                cache_url_updated = pipe(
-                    translate({
-                        u'NaN-NaN-NaNTNaN:NaN:NaN': None,
-                        u'None': None,
-                        }),
-                    ckan_json_to_iso8601_datetime_str,
-                    ),
-                created = pipe(
-                    ckan_json_to_iso8601_date_str,
-                    not_none,
-                    ),
-                description = pipe(
-                    test_isinstance(basestring),
-                    cleanup_text,
-                    ),
-                format = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    ),
-                hash = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    ),
-                id = pipe(
-                    ckan_json_to_id,
-                    not_none,
-                    ),
-                last_modified = ckan_json_to_iso8601_date_str,
-                mimetype = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    ),
-                mimetype_inner = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    ),
-                name = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    # Some resources have no name.
-                    ),
-                owner = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    ),
-                position = pipe(
-                    test_isinstance(int),
-                    test_greater_or_equal(0),
-                    ),
-                resource_group_id = ckan_json_to_id,
-                resource_type = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    test_in([u'api', 'documentation', 'file', 'file.upload', 'image', 'metadata', 'visualization']),
-                    ),
-                revision_id = pipe(
-                    ckan_json_to_id,
-                    not_none,
-                    ),
-                revision_timestamp = ckan_json_to_iso8601_datetime_str,
-                size = pipe(
-                    condition(
-                        test_isinstance(basestring),
-                        input_to_int,
+def make_ckan_json_to_related_fields(drop_none_values = False, keep_value_order = False, skip_missing_items = False):
+    """Return a new dict of the converters of each related field, used by the related converter."""
+    return dict(
+        __extras = pipe(
+            test_isinstance(dict),
+            struct(
+                dict(
+                    view_count = pipe(
                         test_isinstance(int),
-                        ),
-                    test_greater_or_equal(0),
-                    ),
-                state = ckan_json_to_state,
-                tracking_summary = make_ckan_json_to_tracking_summary(drop_none_values = drop_none_values,
-                    keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
-                URI = pipe(
-                    test_isinstance(basestring),
-                    make_input_to_url(add_prefix = u'http://', full = True),
-                    ),
-                url = pipe(
-                    test_isinstance(basestring),
-                    # make_input_to_url(add_prefix = u'http://', full = True),
-                    cleanup_line,
-                    ),
-                url_error = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    ),
-                url_type = pipe(
-                    test_isinstance(basestring),
-                    translate({u'None': None}),
-                    test_in([
-                        'upload',
-                        ]),
-                    ),
-                webstore_last_updated = ckan_json_to_iso8601_date_str,
-                webstore_url = pipe(
-                    # https://github.com/okfn/ckan/issues/931: Remove webstore_url from resources.
-                    test_isinstance(basestring),
-                    cleanup_line,  # May be ''.
-                    first_match(
-                        test_in([u'active']),
-                        make_input_to_url(full = True),
+                        test_greater_or_equal(0),
                         ),
                     ),
                 ),
+            ),
+        created = ckan_json_to_iso8601_datetime_str,
+        dataset_id = ckan_json_to_id,  # CKANExt-fedmsg specific
+        description = pipe(
+            test_isinstance(basestring),
+            cleanup_text,
+            ),
+        featured = pipe(
+            test_isinstance(int),
+            anything_to_bool,
+            not_none,
+            ),
+        id = pipe(
+            ckan_json_to_id,
+            not_none,
+            ),
+        image_url = ckan_json_to_image_url,
+        owner_id = ckan_json_to_id,
+        title = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            not_none,
+            ),
+        type = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            test_in([
+                u'api',
+                u'application',
+                u'idea',
+                u'news_article',
+                u'paper',
+                u'post',
+                u'smart_image',  # TODO: Obsolete, to remove.
+                u'smart_viewer',  # TODO: Obsolete, to remove.
+                u'visualization',
+                ]),
+            ),
+        url = pipe(
+            test_isinstance(basestring),
+            make_cached_input_to_url(add_prefix = u'http://', full = True),
+            ),
+        view_count = pipe(
+            test_isinstance(int),
+            test_greater_or_equal(0),
+            ),
+        )
+
+
+@cached_converter_factory
+def make_ckan_json_to_resource(drop_none_values = False, keep_value_order = False, skip_missing_items = False):
+    return pipe(
+        test_isinstance(dict),
+        struct(
+            make_ckan_json_to_resource_fields(drop_none_values = drop_none_values, keep_value_order = keep_value_order,
+                skip_missing_items = skip_missing_items),
             drop_none_values = drop_none_values,
             keep_value_order = keep_value_order,
             skip_missing_items = skip_missing_items,
@@ -1467,36 +1782,132 @@ def make_ckan_json_to_resource(drop_none_values = False, keep_value_order = Fals
         )
 
 
+def make_ckan_json_to_resource_fields(drop_none_values = False, keep_value_order = False, skip_missing_items = False):
+    """Return a new dict of the converters of each resource field."""
+    return dict(
+        cache_last_updated = ckan_json_to_iso8601_datetime_str,
+        cache_url = pipe(
+            test_isinstance(basestring),
+            make_cached_input_to_url(full = True),
+            ),
+        cache_url_updated = pipe(
+            translate({
+                u'NaN-NaN-NaNTNaN:NaN:NaN': None,
+                u'None': None,
+                }),
+            ckan_json_to_iso8601_datetime_str,
+            ),
+        created = pipe(
+            ckan_json_to_iso8601_date_str,
+            not_none,
+            ),
+        description = pipe(
+            test_isinstance(basestring),
+            cleanup_text,
+            ),
+        format = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            ),
+        hash = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            ),
+        id = pipe(
+            ckan_json_to_id,
+            not_none,
+            ),
+        last_modified = ckan_json_to_iso8601_date_str,
+        mimetype = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            ),
+        mimetype_inner = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            ),
+        name = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            # Some resources have no name.
+            ),
+        owner = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            ),
+        position = pipe(
+            test_isinstance(int),
+            test_greater_or_equal(0),
+            ),
+        resource_group_id = ckan_json_to_id,
+        resource_type = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            test_in([u'api', 'documentation', 'file', 'file.upload', 'image', 'metadata', 'visualization']),
+            ),
+        revision_id = pipe(
+            ckan_json_to_id,
+            not_none,
+            ),
+        revision_timestamp = ckan_json_to_iso8601_datetime_str,
+        size = pipe(
+            condition(
+                test_isinstance(basestring),
+                input_to_int,
+                test_isinstance(int),
+                ),
+            test_greater_or_equal(0),
+            ),
+        state = ckan_json_to_state,
+        tracking_summary = make_ckan_json_to_tracking_summary(drop_none_values = drop_none_values,
+            keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
+        URI = pipe(
+            test_isinstance(basestring),
+            make_cached_input_to_url(add_prefix = u'http://', full = True),
+            ),
+        url = pipe(
+            test_isinstance(basestring),
+            # make_input_to_url(add_prefix = u'http://', full = True),
+            cleanup_line,
+            ),
+        url_error = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            ),
+        url_type = pipe(
+            test_isinstance(basestring),
+            translate({u'None': None}),
+            test_in([
+                'upload',
+                ]),
+            ),
+        webstore_last_updated = ckan_json_to_iso8601_date_str,
+        webstore_url = pipe(
+            # https://github.com/okfn/ckan/issues/931: Remove webstore_url from resources.
+            test_isinstance(basestring),
+            cleanup_line,  # May be ''.
+            first_match(
+                test_in([u'active']),
+                make_cached_input_to_url(full = True),
+                ),
+            ),
+        )
+
+
+def make_ckan_json_to_resource_subset(paths, drop_none_values = False, keep_value_order = False,
+        skip_missing_items = False):
+    """Return a resource converter restricted to some fields. See ``make_ckan_json_to_package_subset``."""
+    return make_subset_converter('resource', normalize_subset_paths(paths), drop_none_values = drop_none_values,
+        keep_value_order = keep_value_order, skip_missing_items = skip_missing_items)
+
+
+@cached_converter_factory
 def make_ckan_json_to_tag(drop_none_values = False, keep_value_order = False, skip_missing_items = False):
     return pipe(
         test_isinstance(dict),
         struct(
-            dict(
-                display_name = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    ),
-                id = pipe(
-                    ckan_json_to_id,
-                    not_none,
-                    ),
-                name = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    ),
-                revision_timestamp = pipe(
-                    ckan_json_to_iso8601_datetime_str,
-                    not_none,
-                    ),
-                state = pipe(
-                    ckan_json_to_state,
-                    not_none,
-                    ),
-                vocabulary_id = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    ),
-                ),
+            make_ckan_json_to_tag_fields(drop_none_values = drop_none_values, keep_value_order = keep_value_order,
+                skip_missing_items = skip_missing_items),
             drop_none_values = drop_none_values,
             keep_value_order = keep_value_order,
             skip_missing_items = skip_missing_items,
@@ -1504,22 +1915,43 @@ def make_ckan_json_to_tag(drop_none_values = False, keep_value_order = False, sk
         )
 
 
+def make_ckan_json_to_tag_fields(drop_none_values = False, keep_value_order = False, skip_missing_items = False):
+    """Return a new dict of the converters of each tag field."""
+    return dict(
+        display_name = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            ),
+        id = pipe(
+            ckan_json_to_id,
+            not_none,
+            ),
+        name = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            ),
+        revision_timestamp = pipe(
+            ckan_json_to_iso8601_datetime_str,
+            not_none,
+            ),
+        state = pipe(
+            ckan_json_to_state,
+            not_none,
+            ),
+        vocabulary_id = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            ),
+        )
+
+
+@cached_converter_factory
 def make_ckan_json_to_tracking_summary(drop_none_values = False, keep_value_order = False, skip_missing_items = False):
     return pipe(
         test_isinstance(dict),
         struct(
-            dict(
-                recent = pipe(
-                    test_isinstance(int),
-                    test_greater_or_equal(0),
-                    not_none,
-                    ),
-                total = pipe(
-                    test_isinstance(int),
-                    test_greater_or_equal(0),
-                    not_none,
-                    ),
-                ),
+            make_ckan_json_to_tracking_summary_fields(drop_none_values = drop_none_values,
+                keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
             drop_none_values = drop_none_values,
             keep_value_order = keep_value_order,
             skip_missing_items = skip_missing_items,
@@ -1527,101 +1959,185 @@ def make_ckan_json_to_tracking_summary(drop_none_values = False, keep_value_orde
         )
 
 
+def make_ckan_json_to_tracking_summary_fields(drop_none_values = False, keep_value_order = False,
+        skip_missing_items = False):
+    """Return a new dict of the converters of each tracking summary field."""
+    return dict(
+        recent = pipe(
+            test_isinstance(int),
+            test_greater_or_equal(0),
+            not_none,
+            ),
+        total = pipe(
+            test_isinstance(int),
+            test_greater_or_equal(0),
+            not_none,
+            ),
+        )
+
+
+@cached_converter_factory
 def make_ckan_json_to_user(drop_none_values = False, keep_value_order = False, skip_missing_items = False):
     return pipe(
         test_isinstance(dict),
         struct(
-            dict(
-                about = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    ),
-                activity = pipe(
-                    test_isinstance(list),
-                    uniform_sequence(
-                        pipe(
-                            make_ckan_json_to_embedded_activity(drop_none_values = drop_none_values,
-                                keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
-                            not_none,
-                            ),
-                        ),
-                    empty_to_none,
-                    ),
-                activity_streams_email_notifications = pipe(
-                    test_isinstance(bool),
-                    not_none,
-                    ),
-                apikey = test_isinstance(basestring),
-                capacity = pipe(
-                    test_isinstance(basestring),
-                    test_in([u'admin', u'editor', u'member']),
-                    ),
-                created = pipe(
-                    ckan_json_to_iso8601_datetime_str,
-                    not_none,
-                    ),
-                datasets = pipe(
-                    test_isinstance(list),
-                    uniform_sequence(
-                        pipe(
-                            make_ckan_json_to_package(drop_none_values = drop_none_values,
-                                keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
-                            not_none,
-                            ),
-                        ),
-                    empty_to_none,
-                    ),
-                display_name = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    ),
-                email = pipe(
-                    test_isinstance(basestring),
-#                    input_to_email,
-                    cleanup_line,
-                    ),
-                email_hash = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    ),
-                fullname = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    ),
-                id = pipe(
-                    ckan_json_to_id,
-                    not_none,
-                    ),
-                name = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    not_none,
-                    ),
-                num_followers = pipe(
-                    test_isinstance(int),
-                    test_greater_or_equal(0),
-                    ),
-                number_administered_packages = pipe(
-                    test_isinstance(int),
-                    test_greater_or_equal(0),
+            make_ckan_json_to_user_fields(drop_none_values = drop_none_values, keep_value_order = keep_value_order,
+                skip_missing_items = skip_missing_items),
+            drop_none_values = drop_none_values,
+            keep_value_order = keep_value_order,
+            skip_missing_items = skip_missing_items,
+            ),
+        )
+
+
+def make_ckan_json_to_user_fields(drop_none_values = False, keep_value_order = False, skip_missing_items = False):
+    """Return a new dict of the converters of each user field, used by the user converter."""
+    return dict(
+        about = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            ),
+        activity = pipe(
+            test_isinstance(list),
+            uniform_sequence(
+                pipe(
+                    make_ckan_json_to_embedded_activity(drop_none_values = drop_none_values,
+                        keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
                     not_none,
                     ),
-                number_of_edits = pipe(
-                    test_isinstance(int),
-                    test_greater_or_equal(0),
+                ),
+            empty_to_none,
+            ),
+        activity_streams_email_notifications = pipe(
+            test_isinstance(bool),
+            not_none,
+            ),
+        apikey = test_isinstance(basestring),
+        capacity = pipe(
+            test_isinstance(basestring),
+            test_in([u'admin', u'editor', u'member']),
+            ),
+        created = pipe(
+            ckan_json_to_iso8601_datetime_str,
+            not_none,
+            ),
+        datasets = pipe(
+            test_isinstance(list),
+            uniform_sequence(
+                pipe(
+                    make_ckan_json_to_package(drop_none_values = drop_none_values,
+                        keep_value_order = keep_value_order, skip_missing_items = skip_missing_items),
                     not_none,
                     ),
-                openid = pipe(
-                    test_isinstance(basestring),
-                    cleanup_line,
-                    test_equals(u'TODO'),
-                    ),
-                reset_key = test_isinstance(basestring),
-                sysadmin = pipe(
-                    test_isinstance(bool),
+                ),
+            empty_to_none,
+            ),
+        display_name = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            ),
+        email = pipe(
+            test_isinstance(basestring),
+#            input_to_email,
+            cleanup_line,
+            ),
+        email_hash = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            ),
+        fullname = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            ),
+        id = pipe(
+            ckan_json_to_id,
+            not_none,
+            ),
+        name = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            not_none,
+            ),
+        num_followers = pipe(
+            test_isinstance(int),
+            test_greater_or_equal(0),
+            ),
+        number_administered_packages = pipe(
+            test_isinstance(int),
+            test_greater_or_equal(0),
+            not_none,
+            ),
+        number_of_edits = pipe(
+            test_isinstance(int),
+            test_greater_or_equal(0),
+            not_none,
+            ),
+        openid = pipe(
+            test_isinstance(basestring),
+            cleanup_line,
+            test_equals(u'TODO'),
+            ),
+        reset_key = test_isinstance(basestring),
+        sysadmin = pipe(
+            test_isinstance(bool),
+            not_none,
+            ),
+        )
+
+
+@cached_converter_factory
+def make_subset_converter(entity_name, paths, drop_none_values = False, keep_value_order = False,
+        skip_missing_items = False):
+    """Return a converter of an entity restricted to the fields given by a normalized tuple of paths."""
+    fields_factory = dict(
+        embedded_group = make_ckan_json_to_embedded_group_fields,
+        package = make_ckan_json_to_package_fields,
+        package_organization = make_ckan_json_to_package_organization_fields,
+        resource = make_ckan_json_to_resource_fields,
+        tag = make_ckan_json_to_tag_fields,
+        tracking_summary = make_ckan_json_to_tracking_summary_fields,
+        )[entity_name]
+    converter_by_name = fields_factory(drop_none_values = drop_none_values, keep_value_order = keep_value_order,
+        skip_missing_items = skip_missing_items)
+    sub_paths_by_name = {}
+    for path in paths:
+        name, sub_path = path.split(u'.', 1) if u'.' in path else (path, None)
+        if name not in converter_by_name:
+            raise ValueError(u'Unknown field "{}" of {}'.format(name, entity_name).encode('utf-8'))
+        sub_paths = sub_paths_by_name.setdefault(name, set())
+        if sub_paths is not None:
+            if sub_path is None:
+                sub_paths_by_name[name] = None  # The whole field is needed.
+            else:
+                sub_paths.add(sub_path)
+    subset_converter_by_name = {}
+    for name, sub_paths in sub_paths_by_name.iteritems():
+        if not sub_paths:
+            subset_converter_by_name[name] = converter_by_name[name]
+            continue
+        subset_entity = subset_entity_by_field_by_entity.get(entity_name, {}).get(name)
+        if subset_entity is None:
+            raise ValueError(u'Field "{}" of {} has no sub-field'.format(name, entity_name).encode('utf-8'))
+        sub_entity_name, is_list = subset_entity
+        sub_converter = make_subset_converter(sub_entity_name, tuple(sorted(sub_paths)),
+            drop_none_values = drop_none_values, keep_value_order = keep_value_order,
+            skip_missing_items = skip_missing_items)
+        subset_converter_by_name[name] = pipe(
+            test_isinstance(list),
+            uniform_sequence(
+                pipe(
+                    sub_converter,
                     not_none,
                     ),
                 ),
+            empty_to_none,
+            ) if is_list else sub_converter
+    return pipe(
+        test_isinstance(dict),
+        remove_extras_without_copy if entity_name == 'package' else noop,
+        struct(
+            subset_converter_by_name,
+            default = 'drop',
             drop_none_values = drop_none_values,
             keep_value_order = keep_value_order,
             skip_missing_items = skip_missing_items,
@@ -1629,7 +2145,18 @@ def make_ckan_json_to_user(drop_none_values = False, keep_value_order = False, s
         )
 
 
+def normalize_subset_paths(paths):
+    """Return the paths of a subset of fields as a sorted tuple of unique unicode strings."""
+    if isinstance(paths, basestring):
+        paths = [paths]
+    return tuple(sorted(set(
+        path.decode('utf-8') if isinstance(path, str) else path
+        for path in paths
+        )))
+
+
 def remove_extras(value, state = None):
+    """Return a copy of a package, without the items that duplicate one of its extras."""
     if value is None:
         return value, None
     clean_value = value.copy()  # A non-deep copy is sufficient.
@@ -1640,3 +2167,30 @@ def remove_extras(value, state = None):
         if key in value and value[key] == extra.get('value'):
             del clean_value[key]
     return clean_value, None
+
+
+def remove_extras_without_copy(value, state = None):
+    """Like ``remove_extras``, but return the given package itself when no item is removed.
+
+    To be used only when the result is not modified, for example when the next converter builds a new dict.
+    """
+    if value is None:
+        return value, None
+    clean_value = value  # Copied only when an item must be removed
+    for extra in (value.get('extras') or []):
+        key = extra.get('key')
+        if not isinstance(key, basestring):
+            continue
+        if key in value and value[key] == extra.get('value'):
+            if clean_value is value:
+                clean_value = value.copy()  # A non-deep copy is sufficient.
+            del clean_value[key]
+    return clean_value, None
+
+
+def resize_url_cache(max_entries):
+    """Change the maximum number of URLs kept by the cache shared by URL converters."""
+    url_by_input.resize(max_entries)
+
+
+import_shared_converter_call_by_converter.update(shared_converter_call_by_converter)
@@ -0,0 +1,316 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# CKAN-Toolbox -- Various modules that handle CKAN API and data
+# By: Emmanuel Raviart <emmanuel@raviart.com>
+#
+# Copyright (C) 2013 Etalab
+# http://github.com/etalab/ckan-toolbox
+#
+# This file is part of CKAN-Toolbox.
+#
+# CKAN-Toolbox is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# CKAN-Toolbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Compiled versions of the validators and converters for CKAN data
+
+The converter trees built by :mod:`ckantoolbox.ckanconv` (through its hash-consing shared builders) are walked and
+each struct is compiled into a single generated Python function, where every step (``pipe``, ``test_isinstance``,
+``test_in``, ``cleanup_line``...) is inlined. Converters that can't be inlined are called by the generated code.
+
+The generated function is only a fast path: as soon as a value doesn't pass a step (or contains an unexpected item), it
+gives up and the original converter is called on the original value. So a compiled converter always gives exactly the
+same outputs and errors as its original converter.
+"""
+
+
+import functools
+
+from biryani1 import baseconv
+from biryani1.baseconv import cleanup_line, empty_to_none, noop, not_none
+
+from . import ckanconv
+
+
+failed = object()  # Returned by fast functions, when the original converter must be called.
+
+step_kind_by_builder = {
+    # Builders whose converters are inlined as a step, when they are called with a single argument
+    baseconv.default: 'default',
+    baseconv.test_equals: 'equals',
+    baseconv.test_greater_or_equal: 'greater_or_equal',
+    baseconv.test_in: 'in',
+    baseconv.test_isinstance: 'isinstance',
+    baseconv.translate: 'translate',
+    }
+steps_by_converter = {
+    cleanup_line: (('cleanup_line',),),
+    empty_to_none: (('empty_to_none',),),
+    noop: (),
+    not_none: (('not_none',),),
+    }
+struct_options = frozenset(['drop_none_values', 'keep_value_order', 'skip_missing_items'])
+
+
+def add_constant(namespace, value):
+    """Add a value to the namespace of a generated function and return its name."""
+    constant_name = 'constant{}'.format(len(namespace))
+    namespace[constant_name] = value
+    return constant_name
+
+
+def compile_converter(name, converter):
+    """Generate a fast function applying the steps of a converter built by the ckanconv shared builders.
+
+    The generated function has signature ``(value, state)`` and returns the converted value or ``failed``.
+    """
+    namespace = dict(failed = failed)
+    lines = ['def fast_{}(value, state):'.format(name)]
+    emit_steps(lines, get_converter_steps(converter, {}), 'value', '    ', functools.partial(add_constant, namespace),
+        0)
+    lines.append('    return value')
+    return define_function(name, lines, namespace)
+
+
+def compile_struct(name, fields, drop_none_values = False, skip_missing_items = False):
+    """Generate a fast function converting a dict whose items are converted by the given steps.
+
+    ``fields`` is a list of ``(name, steps)`` couples. The generated function has signature ``(value, state)`` and
+    returns the converted value or ``failed``.
+    """
+    namespace = dict(failed = failed)
+    constant = functools.partial(add_constant, namespace)
+    lines = [
+        'def fast_{}(value, state):'.format(name),
+        '    if value is None:',
+        '        return None',
+        '    if not isinstance(value, dict):',
+        '        return failed',
+        '    known_keys = {}'.format(constant(frozenset(field_name for field_name, steps in fields))),
+        '    for key in value:',
+        '        if key not in known_keys:',
+        '            return failed',
+        '    converted = {}',
+        ]
+    for field_name, steps in fields:
+        indent = '    '
+        if skip_missing_items:
+            lines.append('{}if {!r} in value:'.format(indent, field_name))
+            indent += '    '
+        lines.append('{}v = value.get({!r})'.format(indent, field_name))
+        emit_steps(lines, steps, 'v', indent, constant, 0)
+        if drop_none_values:
+            lines.append('{}if v is not None:'.format(indent))
+            lines.append('{}    converted[{!r}] = v'.format(indent, field_name))
+        else:
+            lines.append('{}converted[{!r}] = v'.format(indent, field_name))
+    lines.append('    return converted')
+    return define_function(name, lines, namespace)
+
+
+def define_function(name, lines, namespace):
+    exec compile('\n'.join(lines) + '\n', '<compiled {}>'.format(name), 'exec') in namespace
+    return namespace['fast_{}'.format(name)]
+
+
+def emit_steps(lines, steps, variable, indent, constant, depth):
+    """Append to lines the Python code applying steps to variable."""
+    for step in steps:
+        kind = step[0]
+        if kind == 'cleanup_line':
+            lines.append('{}if {} is not None:'.format(indent, variable))
+            lines.append('{0}    {1} = {1}.strip() or None'.format(indent, variable))
+        elif kind == 'convert':
+            # Like in a biryani1 pipe, the converter is also called with None.
+            lines.append('{0}{1}, error = {2}({1}, state = state)'.format(indent, variable, constant(step[1])))
+            lines.append('{}if error is not None:'.format(indent))
+            lines.append('{}    return failed'.format(indent))
+        elif kind == 'default':
+            lines.append('{}if {} is None:'.format(indent, variable))
+            lines.append('{}    {} = {}'.format(indent, variable, constant(step[1])))
+        elif kind == 'empty_to_none':
+            lines.append('{}if not {}:'.format(indent, variable))
+            lines.append('{}    {} = None'.format(indent, variable))
+        elif kind == 'equals':
+            lines.append('{0}if {1} is not None and {1} != {2}:'.format(indent, variable, constant(step[1])))
+            lines.append('{}    return failed'.format(indent))
+        elif kind == 'greater_or_equal':
+            lines.append('{0}if {1} is not None and {1} < {2}:'.format(indent, variable, constant(step[1])))
+            lines.append('{}    return failed'.format(indent))
+        elif kind == 'in':
+            lines.append('{0}if {1} is not None and {1} not in {2}:'.format(indent, variable, constant(step[1])))
+            lines.append('{}    return failed'.format(indent))
+        elif kind == 'isinstance':
+            lines.append('{0}if {1} is not None and not isinstance({1}, {2}):'.format(indent, variable,
+                constant(step[1])))
+            lines.append('{}    return failed'.format(indent))
+        elif kind == 'items':
+            # Items of a list (already tested by a previous "isinstance" step).
+            item_variable = 'item{}'.format(depth)
+            items_variable = 'items{}'.format(depth)
+            lines.append('{}if {} is not None:'.format(indent, variable))
+            lines.append('{}    {} = []'.format(indent, items_variable))
+            lines.append('{}    for {} in {}:'.format(indent, item_variable, variable))
+            emit_steps(lines, step[1], item_variable, indent + '        ', constant, depth + 1)
+            lines.append('{}        {}.append({})'.format(indent, items_variable, item_variable))
+            lines.append('{}    {} = {}'.format(indent, variable, items_variable))
+        elif kind == 'not_none':
+            lines.append('{}if {} is None:'.format(indent, variable))
+            lines.append('{}    return failed'.format(indent))
+        elif kind == 'struct':
+            lines.append('{}if {} is not None:'.format(indent, variable))
+            lines.append('{0}    {1} = {2}({1}, state)'.format(indent, variable, constant(step[1])))
+            lines.append('{}    if {} is failed:'.format(indent, variable))
+            lines.append('{}        return failed'.format(indent))
+        elif kind == 'translate':
+            conversions = constant(step[1])
+            lines.append('{0}if {1} is not None and {1} in {2}:'.format(indent, variable, conversions))
+            lines.append('{0}    {1} = {2}[{1}]'.format(indent, variable, conversions))
+        else:
+            raise ValueError(u'Unknown step: {}'.format(kind))
+
+
+def get_converter_steps(converter, fast_struct_by_converter):
+    """Return the steps equivalent to a converter, by walking the calls of the ckanconv shared builders.
+
+    Converters that are not built by a shared builder (or whose arguments are not handled) give a "convert" step, that
+    calls them. ``fast_struct_by_converter`` holds the struct converters already compiled.
+    """
+    steps = steps_by_converter.get(converter)
+    if steps is not None:
+        return steps
+    call = ckanconv.shared_converter_call_by_converter.get(converter)
+    if call is None:
+        return (('convert', converter),)
+    builder, args, kwargs = call
+
+    if builder is baseconv.pipe and not kwargs:
+        steps = []
+        for item_converter in args:
+            item_call = ckanconv.shared_converter_call_by_converter.get(item_converter)
+            if item_call is not None and item_call[0] is baseconv.uniform_sequence and len(item_call[1]) == 1 \
+                    and not item_call[2] and steps[-1:] == [('isinstance', list)]:
+                steps.append(('items', get_converter_steps(item_call[1][0], fast_struct_by_converter)))
+            else:
+                steps.extend(get_converter_steps(item_converter, fast_struct_by_converter))
+        return tuple(steps)
+
+    if builder is baseconv.struct and len(args) == 1 and isinstance(args[0], dict) \
+            and struct_options.issuperset(kwargs) and not kwargs.get('keep_value_order'):
+        fast_struct = fast_struct_by_converter.get(converter)
+        if fast_struct is None:
+            fields = sorted(
+                (name, get_converter_steps(item_converter, fast_struct_by_converter))
+                for name, item_converter in args[0].iteritems()
+                )
+            fast_struct = fast_struct_by_converter[converter] = compile_struct(
+                'struct{}'.format(len(fast_struct_by_converter)), fields,
+                drop_none_values = kwargs.get('drop_none_values', False),
+                skip_missing_items = kwargs.get('skip_missing_items', False),
+                )
+        return (('struct', fast_struct),)
+
+    kind = step_kind_by_builder.get(builder)
+    if kind is not None and len(args) == 1 and not kwargs \
+            and not (builder is baseconv.translate and None in args[0]):
+        return ((kind, args[0]),)
+    return (('convert', converter),)
+
+
+def iter_compiled_converter_differences(entity_name, values, state = None, drop_none_values = False,
+        keep_value_order = False, skip_missing_items = False):
+    """Convert each value with both the original and the compiled converter of an entity and yield disagreements.
+
+    Yields ``(index, value, expected, got)`` tuples, where ``expected`` and ``got`` are ``(value, errors)`` couples.
+    """
+    converter = getattr(ckanconv, 'make_ckan_json_to_{}'.format(entity_name))(drop_none_values = drop_none_values,
+        keep_value_order = keep_value_order, skip_missing_items = skip_missing_items)
+    compiled_converter = globals()['make_compiled_ckan_json_to_{}'.format(entity_name)](
+        drop_none_values = drop_none_values, keep_value_order = keep_value_order,
+        skip_missing_items = skip_missing_items)
+    for index, value in enumerate(values):
+        expected = converter(value, state = state)
+        got = compiled_converter(value, state = state)
+        if got != expected:
+            yield index, value, expected, got
+
+
+def make_compiled_converter(name, converter):
+    """Return a converter giving the same results as converter, that tries a compiled fast path first."""
+    fast_function = compile_converter(name, converter)
+
+    def compiled_converter(value, state = None):
+        converted_value = fast_function(value, state)
+        if converted_value is failed:
+            return converter(value, state = state)
+        return converted_value, None
+    return compiled_converter
+
+
+@ckanconv.cached_converter_factory
+def make_compiled_ckan_json_to_group(drop_none_values = False, keep_value_order = False, skip_missing_items = False):
+    converter = ckanconv.make_ckan_json_to_group(drop_none_values = drop_none_values,
+        keep_value_order = keep_value_order, skip_missing_items = skip_missing_items)
+    if keep_value_order:
+        return converter
+    return make_compiled_converter('group', converter)
+
+
+@ckanconv.cached_converter_factory
+def make_compiled_ckan_json_to_organization(drop_none_values = False, keep_value_order = False,
+        skip_missing_items = False):
+    converter = ckanconv.make_ckan_json_to_organization(drop_none_values = drop_none_values,
+        keep_value_order = keep_value_order, skip_missing_items = skip_missing_items)
+    if keep_value_order:
+        return converter
+    return make_compiled_converter('organization', converter)
+
+
+@ckanconv.cached_converter_factory
+def make_compiled_ckan_json_to_package(drop_none_values = False, keep_value_order = False,
+        skip_missing_items = False):
+    converter = ckanconv.make_ckan_json_to_package(drop_none_values = drop_none_values,
+        keep_value_order = keep_value_order, skip_missing_items = skip_missing_items)
+    if keep_value_order:
+        return converter
+    return make_compiled_converter('package', converter)
+
+
+@ckanconv.cached_converter_factory
+def make_compiled_ckan_json_to_resource(drop_none_values = False, keep_value_order = False,
+        skip_missing_items = False):
+    converter = ckanconv.make_ckan_json_to_resource(drop_none_values = drop_none_values,
+        keep_value_order = keep_value_order, skip_missing_items = skip_missing_items)
+    if keep_value_order:
+        return converter
+    return make_compiled_converter('resource', converter)
+
+
+@ckanconv.cached_converter_factory
+def make_compiled_ckan_json_to_tag(drop_none_values = False, keep_value_order = False, skip_missing_items = False):
+    converter = ckanconv.make_ckan_json_to_tag(drop_none_values = drop_none_values,
+        keep_value_order = keep_value_order, skip_missing_items = skip_missing_items)
+    if keep_value_order:
+        return converter
+    return make_compiled_converter('tag', converter)
+
+
+@ckanconv.cached_converter_factory
+def make_compiled_ckan_json_to_user(drop_none_values = False, keep_value_order = False, skip_missing_items = False):
+    converter = ckanconv.make_ckan_json_to_user(drop_none_values = drop_none_values,
+        keep_value_order = keep_value_order, skip_missing_items = skip_missing_items)
+    if keep_value_order:
+        return converter
+    return make_compiled_converter('user', converter)
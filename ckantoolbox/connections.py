@@ -0,0 +1,140 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# CKAN-Toolbox -- Various modules that handle CKAN API and data
+# By: Emmanuel Raviart <emmanuel@raviart.com>
+#
+# Copyright (C) 2013 Etalab
+# http://github.com/etalab/ckan-toolbox
+#
+# This file is part of CKAN-Toolbox.
+#
+# CKAN-Toolbox is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# CKAN-Toolbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Pool of persistent HTTP connections"""
+
+
+import httplib
+import socket
+import StringIO
+import threading
+import urllib2
+import urlparse
+
+
+class HTTPConnectionPool(object):
+    """A thread-safe pool of persistent (keep-alive) HTTP & HTTPS connections, by host.
+
+    At most ``max_connections_per_host`` idle connections are kept for each host. When more requests are sent at the
+    same time, extra connections are opened and closed once their response has been read.
+    """
+    closed_connections = 0
+    created_connections = 0
+    requests = 0
+    reused_connections = 0
+
+    def __init__(self, max_connections_per_host = 4, timeout = None):
+        self.idle_connections_by_host = {}
+        self.lock = threading.Lock()
+        self.max_connections_per_host = max_connections_per_host
+        self.timeout = timeout
+
+    def acquire(self, scheme, host):
+        """Return an idle connection to host (or a new one) & a boolean telling whether the connection is reused."""
+        with self.lock:
+            self.requests += 1
+            idle_connections = self.idle_connections_by_host.get((scheme, host))
+            if idle_connections:
+                self.reused_connections += 1
+                return idle_connections.pop(), True
+            self.created_connections += 1
+        connection_class = httplib.HTTPSConnection if scheme == 'https' else httplib.HTTPConnection
+        if self.timeout is None:
+            return connection_class(host), False
+        return connection_class(host, timeout = self.timeout), False
+
+    def close(self):
+        """Close every idle connection."""
+        with self.lock:
+            for idle_connections in self.idle_connections_by_host.itervalues():
+                for connection in idle_connections:
+                    connection.close()
+                    self.closed_connections += 1
+            self.idle_connections_by_host.clear()
+
+    def info(self):
+        """Return the statistics of the pool."""
+        with self.lock:
+            return dict(
+                closed_connections = self.closed_connections,
+                created_connections = self.created_connections,
+                idle_connections = sum(
+                    len(idle_connections)
+                    for idle_connections in self.idle_connections_by_host.itervalues()
+                    ),
+                requests = self.requests,
+                reused_connections = self.reused_connections,
+                )
+
+    def release(self, scheme, host, connection):
+        """Give back a connection whose response has been fully read."""
+        with self.lock:
+            idle_connections = self.idle_connections_by_host.setdefault((scheme, host), [])
+            if len(idle_connections) < self.max_connections_per_host:
+                idle_connections.append(connection)
+                return
+            self.closed_connections += 1
+        connection.close()
+
+    def request(self, method, url, body = None, headers = None):
+        """Send a request and return a ``(status, response headers, response body)`` triple.
+
+        ``body`` can be a string or a file-like object (which is streamed). Redirections are not followed. An
+        ``urllib2.HTTPError`` is raised when the response status is an error.
+        """
+        if isinstance(url, unicode):
+            url = url.encode('utf-8')
+        split_url = urlparse.urlsplit(url)
+        scheme = split_url.scheme
+        host = split_url.netloc
+        path = split_url.path or '/'
+        if split_url.query:
+            path = '{}?{}'.format(path, split_url.query)
+        while True:
+            connection, reused = self.acquire(scheme, host)
+            try:
+                connection.request(method, path, body, headers or {})
+                response = connection.getresponse()
+                response_body = response.read()
+            except (httplib.HTTPException, socket.error):
+                connection.close()
+                with self.lock:
+                    self.closed_connections += 1
+                if reused and (body is None or isinstance(body, basestring)):
+                    # The server has probably closed the idle connection: Retry with another one.
+                    continue
+                raise
+            break
+        if response.will_close:
+            connection.close()
+            with self.lock:
+                self.closed_connections += 1
+        else:
+            self.release(scheme, host, connection)
+        if response.status >= 400:
+            raise urllib2.HTTPError(url, response.status, response.reason, response.msg,
+                StringIO.StringIO(response_body))
+        return response.status, response.msg, response_body
@@ -0,0 +1,270 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# CKAN-Toolbox -- Various modules that handle CKAN API and data
+# By: Emmanuel Raviart <emmanuel@raviart.com>
+#
+# Copyright (C) 2013 Etalab
+# http://github.com/etalab/ckan-toolbox
+#
+# This file is part of CKAN-Toolbox.
+#
+# CKAN-Toolbox is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# CKAN-Toolbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Concurrent crawler of the packages of a CKAN site"""
+
+
+import json
+import Queue
+import threading
+import time
+import urllib
+import urlparse
+
+from . import ckanconv, compiledconv, connections, filestores
+
+
+class CatalogCrawler(object):
+    """Fetch the packages of a CKAN site concurrently and validate them with a single shared package converter.
+
+    Packages are listed by pages of ``package_search`` results (which already contain the packages), or by
+    ``package_list`` followed by a ``package_show`` request for each package. Requests use a pool of keep-alive
+    connections and, when ``rate`` is given, are limited to ``rate`` requests per second.
+    """
+    def __init__(self, site_url, backoff = 1.0, compiled = False, concurrency = 4, drop_none_values = False,
+            headers = None, keep_value_order = False, max_retries = 3, page_size = 100, pool = None, rate = None,
+            skip_missing_items = False, timeout = None):
+        make_converter = compiledconv.make_compiled_ckan_json_to_package if compiled \
+            else ckanconv.make_ckan_json_to_package
+        self.backoff = backoff
+        self.concurrency = concurrency
+        self.converter = make_converter(drop_none_values = drop_none_values, keep_value_order = keep_value_order,
+            skip_missing_items = skip_missing_items)
+        self.headers = headers or {}
+        self.max_retries = max_retries
+        self.page_size = page_size
+        self.pool = pool if pool is not None else connections.HTTPConnectionPool(
+            max_connections_per_host = concurrency, timeout = timeout)
+        self.rate_limiter = RateLimiter(rate) if rate is not None else None
+        self.site_url = site_url
+        self.statistics_lock = threading.Lock()
+        self.clear_statistics()
+
+    def call_action(self, action, **params):
+        """Call an action of CKAN API (with retries for transient errors) and return its result."""
+        url = urlparse.urljoin(self.site_url, '/api/3/action/{}?{}'.format(action, urllib.urlencode(sorted(
+            (key, value.encode('utf-8') if isinstance(value, unicode) else value)
+            for key, value in params.iteritems()
+            ))))
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            start_time = time.time()
+            try:
+                status, response_headers, body = self.pool.request('GET', url, headers = self.headers)
+            except Exception as error:
+                self.record_request(time.time() - start_time, 0, error = True)
+                if attempt >= self.max_retries or not filestores.is_transient_error(error):
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+                attempt += 1
+                continue
+            self.record_request(time.time() - start_time, len(body))
+            response = json.loads(body)
+            if not response.get('success'):
+                raise ValueError(u'CKAN action {} failed: {}'.format(action, response.get('error')).encode('utf-8'))
+            return response['result']
+
+    def clear_statistics(self):
+        with self.statistics_lock:
+            self.statistics = dict(
+                bytes = 0,
+                errors = 0,
+                max_latency = 0.0,
+                packages = 0,
+                requests = 0,
+                start_time = time.time(),
+                total_latency = 0.0,
+                )
+
+    def info(self):
+        """Return throughput & latency statistics of the crawler."""
+        with self.statistics_lock:
+            statistics = self.statistics.copy()
+        elapsed_time = time.time() - statistics.pop('start_time')
+        statistics['elapsed_time'] = elapsed_time
+        statistics['mean_latency'] = statistics['total_latency'] / statistics['requests'] \
+            if statistics['requests'] else None
+        statistics['packages_per_second'] = statistics['packages'] / elapsed_time if elapsed_time > 0 else 0.0
+        statistics['requests_per_second'] = statistics['requests'] / elapsed_time if elapsed_time > 0 else 0.0
+        return statistics
+
+    def iter_package_names(self):
+        """Iterate over the names of every package of the site, using ``package_list``."""
+        offset = 0
+        while True:
+            names = self.call_action('package_list', limit = self.page_size, offset = offset)
+            for name in names:
+                yield name
+            if len(names) != self.page_size:
+                # Last page, or server ignoring limit & offset (and returning every name at once)
+                break
+            offset += len(names)
+
+    def iter_packages(self, names = None):
+        """Fetch & validate packages concurrently, yielding ``(package, errors)`` couples as soon as they are ready.
+
+        When ``names`` is None, every package of the site is crawled using ``package_search`` pages. Otherwise each
+        package of ``names`` (for example from ``iter_package_names()``) is fetched by ``package_show``. A package that
+        can't be fetched (or whose conversion raises an exception) is yielded as ``(None, error message)``.
+
+        At most ``2 * concurrency`` packages wait to be consumed: Fetching is paused until the caller catches up.
+        """
+        if names is None:
+            tasks = (
+                ('search', start)
+                for start in self.iter_search_starts()
+                )
+        else:
+            tasks = (
+                ('show', name)
+                for name in names
+                )
+        pending_tasks = Queue.Queue(maxsize = 2 * self.concurrency)
+        results = Queue.Queue(maxsize = 2 * self.concurrency)
+        stopped = threading.Event()  # Set when the caller stops iterating
+
+        def put_result(result):
+            while not stopped.is_set():
+                try:
+                    results.put(result, timeout = 0.1)  # Blocks while the caller is busy.
+                except Queue.Full:
+                    continue
+                break
+
+        def work():
+            try:
+                while True:
+                    task = pending_tasks.get()
+                    if task is None:
+                        break
+                    if stopped.is_set():
+                        continue
+                    kind, argument = task
+                    try:
+                        if kind == 'search':
+                            packages = self.call_action('package_search', rows = self.page_size,
+                                sort = 'name asc', start = argument)['results']
+                        else:
+                            packages = [self.call_action('package_show', id = argument)]
+                    except Exception as error:
+                        put_result((None, u'Fetch of {} {} failed: {}'.format(kind, argument, error)))
+                        continue
+                    for package in packages:
+                        try:
+                            result = self.converter(package)
+                        except Exception as error:
+                            result = (None, u'Conversion of package {} failed: {}'.format(
+                                package.get('name') if isinstance(package, dict) else package, error))
+                        with self.statistics_lock:
+                            self.statistics['packages'] += 1
+                        put_result(result)
+            except Exception as error:
+                put_result((None, u'Crawler worker failed: {}'.format(error)))
+            finally:
+                put_result(None)
+
+        def feed():
+            try:
+                for task in tasks:
+                    while not stopped.is_set():
+                        try:
+                            pending_tasks.put(task, timeout = 0.1)  # Blocks while workers are busy.
+                        except Queue.Full:
+                            continue
+                        break
+                    else:
+                        break
+            except Exception as error:
+                put_result((None, u'Listing of packages failed: {}'.format(error)))
+            finally:
+                for thread in threads:
+                    pending_tasks.put(None)
+
+        threads = []
+        for i in range(self.concurrency):
+            thread = threading.Thread(target = work)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        feeder = threading.Thread(target = feed)
+        feeder.daemon = True
+        feeder.start()
+        running_threads_count = len(threads)
+        try:
+            while running_threads_count > 0:
+                result = results.get()
+                if result is None:
+                    running_threads_count -= 1
+                    continue
+                yield result
+        finally:
+            stopped.set()
+
+    def iter_search_starts(self):
+        """Iterate over the start offsets of the ``package_search`` pages covering the whole catalog."""
+        count = self.call_action('package_search', rows = 0)['count']
+        for start in xrange(0, count, self.page_size):
+            yield start
+
+    def record_request(self, latency, size, error = False):
+        with self.statistics_lock:
+            statistics = self.statistics
+            statistics['bytes'] += size
+            if error:
+                statistics['errors'] += 1
+            statistics['max_latency'] = max(statistics['max_latency'], latency)
+            statistics['requests'] += 1
+            statistics['total_latency'] += latency
+
+
+class RateLimiter(object):
+    """Thread-safe limiter of the number of operations per second."""
+    def __init__(self, rate):
+        assert rate > 0, rate
+        self.interval = 1.0 / rate
+        self.lock = threading.Lock()
+        self.next_time = time.time()
+
+    def acquire(self):
+        """Wait until an operation is allowed."""
+        with self.lock:
+            now = time.time()
+            wait_time = self.next_time - now
+            self.next_time = max(self.next_time, now) + self.interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+
+def iter_packages(site_url, **options):
+    """Crawl every package of a CKAN site and yield ``(package, errors)`` couples. See ``CatalogCrawler``."""
+    crawler = CatalogCrawler(site_url, **options)
+    try:
+        for item in crawler.iter_packages():
+            yield item
+    finally:
+        crawler.pool.close()
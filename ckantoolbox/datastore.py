@@ -0,0 +1,543 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# CKAN-Toolbox -- Various modules that handle CKAN API and data
+# By: Emmanuel Raviart <emmanuel@raviart.com>
+#
+# Copyright (C) 2013 Etalab
+# http://github.com/etalab/ckan-toolbox
+#
+# This file is part of CKAN-Toolbox.
+#
+# CKAN-Toolbox is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# CKAN-Toolbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Columnar validation & loading of CKAN datastore records
+
+Records are checked & coerced column by column, using the types declared in the ``fields`` of a datastore request
+(see ``ckanconv.make_ckan_json_to_datastore``). Numeric, boolean & timestamp columns are stored in NumPy arrays when
+NumPy is installed, or in ``array`` module buffers otherwise.
+
+``load_records`` streams validated records to the CKAN datastore, in batches.
+"""
+
+
+import array
+import calendar
+import csv
+import datetime
+import itertools
+import json
+import Queue
+import threading
+import time
+import urlparse
+
+from biryani1 import states
+
+from . import ckanconv, connections, dumps, filestores
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+column_kind_by_field_type = dict(
+    bigint = 'int',
+    bool = 'bool',
+    boolean = 'bool',
+    char = 'text',
+    date = 'timestamp',
+    float = 'float',
+    float4 = 'float',
+    float8 = 'float',
+    int = 'int',
+    int2 = 'int',
+    int4 = 'int',
+    int8 = 'int',
+    integer = 'int',
+    numeric = 'float',
+    real = 'float',
+    smallint = 'int',
+    text = 'text',
+    timestamp = 'timestamp',
+    varchar = 'text',
+    )
+column_kind_by_field_type['double precision'] = 'float'
+false_strs = frozenset([u'0', u'f', u'false', u'n', u'no', u'off'])
+float_types = frozenset([float, int, long])
+int_types = frozenset([int, long])
+max_int = 2 ** 63 - 1  # Integers are stored as 64 bits integers.
+min_int = -2 ** 63
+none_type = type(None)
+text_types = frozenset([str, unicode])
+true_strs = frozenset([u'1', u'on', u't', u'true', u'y', u'yes'])
+
+
+def bool_column_to_array(values, use_numpy = False, state = None):
+    """Convert a column of booleans to an array. Return ``(array, nulls, error_by_index)``."""
+    types = set(type(value) for value in values)
+    if types <= set([bool]):
+        return new_array('bool', values, use_numpy = use_numpy), None, {}
+    error_by_index = {}
+    booleans = []
+    nulls = [False] * len(values)
+    for index, value in enumerate(values):
+        if value is None:
+            nulls[index] = True
+            value = False
+        elif isinstance(value, basestring):
+            lower_value = value.strip().lower()
+            if lower_value in true_strs:
+                value = True
+            elif lower_value in false_strs:
+                value = False
+            else:
+                error_by_index[index] = (state or states.default_state)._(u'Value must be a boolean')
+                nulls[index] = True
+                value = False
+        elif type(value) in int_types and value in (0, 1):
+            value = bool(value)
+        elif type(value) is not bool:
+            error_by_index[index] = (state or states.default_state)._(u'Value must be a boolean')
+            nulls[index] = True
+            value = False
+        booleans.append(value)
+    return new_array('bool', booleans, use_numpy = use_numpy), new_array('bool', nulls, use_numpy = use_numpy), \
+        error_by_index
+
+
+def column_to_json_values(kind, column, nulls):
+    """Convert a column coerced by a column converter back to a list of values that can be JSON-encoded.
+
+    ``kind`` is the kind of the column converter (``bool``, ``float``, ``int``, ``text``, ``timestamp`` or None).
+    Timestamps are converted to ISO 8601 strings & nulls to None.
+    """
+    values = column.tolist() if hasattr(column, 'tolist') else list(column)
+    if kind == 'bool':
+        values = [bool(value) for value in values]  # Buffers of the array module give integers.
+    elif kind == 'timestamp':
+        values = [
+            (value if isinstance(value, datetime.datetime) else datetime.datetime.utcfromtimestamp(value)).isoformat()
+            if value is not None else None
+            for value in values
+            ]
+    if nulls is not None:
+        values = [
+            None if is_null else value
+            for value, is_null in itertools.izip(values, nulls)
+            ]
+    return values
+
+
+def float_column_to_array(values, use_numpy = False, state = None):
+    """Convert a column of numbers to an array of floats. Return ``(array, nulls, error_by_index)``."""
+    types = set(type(value) for value in values)
+    if types <= float_types:
+        return new_array('float', values, use_numpy = use_numpy), None, {}
+    error_by_index = {}
+    floats = []
+    nulls = [False] * len(values)
+    for index, value in enumerate(values):
+        value_type = type(value)
+        if value_type in float_types:
+            pass
+        elif value is None:
+            nulls[index] = True
+            value = 0.0
+        elif value_type in text_types:
+            try:
+                value = float(value)
+            except ValueError:
+                error_by_index[index] = (state or states.default_state)._(u'Value must be a float number')
+                nulls[index] = True
+                value = 0.0
+        else:
+            error_by_index[index] = (state or states.default_state)._(u'Value must be a float number')
+            nulls[index] = True
+            value = 0.0
+        floats.append(value)
+    return new_array('float', floats, use_numpy = use_numpy), new_array('bool', nulls, use_numpy = use_numpy), \
+        error_by_index
+
+
+def int_column_to_array(values, use_numpy = False, state = None):
+    """Convert a column of integers to an array. Return ``(array, nulls, error_by_index)``."""
+    types = set(type(value) for value in values)
+    if types <= set([int]):
+        return new_array('int', values, use_numpy = use_numpy), None, {}
+    error_by_index = {}
+    integers = []
+    nulls = [False] * len(values)
+    for index, value in enumerate(values):
+        if value is None:
+            nulls[index] = True
+            integers.append(0)
+            continue
+        value_type = type(value)
+        if value_type is float and value.is_integer():
+            value = int(value)
+        elif value_type in text_types:
+            try:
+                value = int(value)
+            except ValueError:
+                pass
+        if type(value) not in int_types or not min_int <= value <= max_int:
+            error_by_index[index] = (state or states.default_state)._(u'Value must be an integer')
+            nulls[index] = True
+            value = 0
+        integers.append(value)
+    return new_array('int', integers, use_numpy = use_numpy), new_array('bool', nulls, use_numpy = use_numpy), \
+        error_by_index
+
+
+def iter_csv_records(source, encoding = 'utf-8'):
+    """Iterate over the rows of a CSV file (with a header line) as dicts. Empty cells are converted to None.
+
+    ``source`` is either a file path or a file-like object opened in binary mode.
+    """
+    if isinstance(source, basestring):
+        with open(source, 'rb') as csv_file:
+            for record in iter_csv_records(csv_file, encoding = encoding):
+                yield record
+        return
+    rows = csv.reader(source)
+    header = [
+        cell.decode(encoding)
+        for cell in next(rows, [])
+        ]
+    for row in rows:
+        yield dict(
+            (column_id, cell.decode(encoding) if cell else None)
+            for column_id, cell in itertools.izip(header, row)
+            )
+
+
+def iter_encoded_batches(records, fields = None, max_batch_bytes = 4 * 1024 * 1024, max_batch_records = 1000,
+        error_by_index = None, primary_key = None, state = None, use_numpy = None):
+    """Validate records by chunks of ``max_batch_records`` & group the valid ones into JSON-encoded batches.
+
+    Yield ``(indexes, encoded_records)`` couples, where ``indexes`` are the positions of the batch records in the
+    input iterable & ``encoded_records`` their JSON encodings (whose total length is at most ``max_batch_bytes``,
+    unless a single record is longer).
+
+    When ``fields`` (the list of ``dict(id = ..., type = ...)`` of a datastore request) is given, records are
+    validated column by column (see ``make_records_validator``) and the coerced values of their fields are encoded
+    (for example, the string ``"42"`` of an ``int`` field is encoded as a number). Other items are encoded as is.
+
+    The errors of invalid records (by position) are added to the ``error_by_index`` dict. Records lacking a field of
+    the ``primary_key`` (a list of field IDs) are invalid.
+    """
+    if error_by_index is None:
+        error_by_index = {}
+    if fields is not None:
+        column_kinds = [
+            (field['id'], column_kind_by_field_type.get(field['type'].lower()))
+            for field in fields
+            ]
+        validate_records = make_records_validator(fields, use_numpy = use_numpy)
+    batch_bytes = 0
+    encoded_records = []
+    indexes = []
+    records = iter(records)
+    start_index = 0
+    while True:
+        chunk = list(itertools.islice(records, max_batch_records))
+        if not chunk:
+            break
+        chunk_error_by_index = {}
+        json_values_by_field_id = None
+        if fields is not None:
+            columns, chunk_error_by_index = validate_records(chunk, state = state)
+            chunk_error_by_index = chunk_error_by_index or {}
+            json_values_by_field_id = dict(
+                (field_id, column_to_json_values(kind, *columns[field_id]))
+                for field_id, kind in column_kinds
+                )
+        for field_id in (primary_key or []):
+            for index, record in enumerate(chunk):
+                if record.get(field_id) is None:
+                    chunk_error_by_index.setdefault(index, {})[field_id] = (state or states.default_state)._(
+                        u'Missing value of primary key')
+        for index, record in enumerate(chunk):
+            if index in chunk_error_by_index:
+                error_by_index[start_index + index] = chunk_error_by_index[index]
+                continue
+            if json_values_by_field_id is not None:
+                coerced_record = record.copy()
+                for field_id, json_values in json_values_by_field_id.iteritems():
+                    if field_id in record:
+                        coerced_record[field_id] = json_values[index]
+                record = coerced_record
+            encoded_record = json.dumps(record, ensure_ascii = False, separators = (',', ':'))
+            if isinstance(encoded_record, unicode):
+                encoded_record = encoded_record.encode('utf-8')
+            if encoded_records and (len(encoded_records) >= max_batch_records
+                    or batch_bytes + len(encoded_record) + 1 > max_batch_bytes):
+                yield indexes, encoded_records
+                batch_bytes = 0
+                encoded_records = []
+                indexes = []
+            batch_bytes += len(encoded_record) + 1
+            encoded_records.append(encoded_record)
+            indexes.append(start_index + index)
+        start_index += len(chunk)
+    if encoded_records:
+        yield indexes, encoded_records
+
+
+def iter_source_records(source, encoding = 'utf-8'):
+    """Iterate over the records of a CSV file (when its path ends with ``.csv``) or of a JSON (lines) file."""
+    if isinstance(source, basestring) and source.lower().endswith('.csv'):
+        return iter_csv_records(source, encoding = encoding)
+    return dumps.iter_dump_items(source, encoding = encoding)
+
+
+def load_records(site_url, resource_id, fields, records, backoff = 1.0, concurrency = 4, headers = None,
+        max_batch_bytes = 4 * 1024 * 1024, max_batch_records = 1000, max_pending_batches = None, max_retries = 3,
+        method = u'insert', pool = None, primary_key = None, progress_callback = None, state = None,
+        use_numpy = None):
+    """Validate records and send them to the datastore of a CKAN resource, using ``datastore_upsert`` action.
+
+    ``records`` is an iterable of dicts (see ``iter_source_records``), whose values are coerced to the types of
+    ``fields`` before being sent. ``method`` is ``insert``, ``update`` or ``upsert``; the two latter require the
+    ``primary_key`` of the datastore table (a comma-separated string of field IDs).
+
+    Batches are sent by ``concurrency`` threads. At most ``max_pending_batches`` (default: twice ``concurrency``)
+    batches wait to be sent: Reading & validating records is paused until senders catch up. A batch failing with a
+    transient error is retried up to ``max_retries`` times, waiting ``backoff`` seconds, then twice as long, etc. When
+    given, ``progress_callback`` is called (from the sending threads) with the number of sent records & the
+    throughput in records per second.
+
+    Returns a dict of statistics, with the errors of invalid records (``invalid_records``, by position) & the
+    ``(indexes, error)`` couples of failed batches (``failed_batches``).
+    """
+    datastore, errors = ckanconv.make_ckan_json_to_datastore()(
+        dict(
+            fields = fields,
+            method = method,
+            primary_key = primary_key,
+            resource_id = resource_id,
+            ),
+        state = state)
+    if errors is not None:
+        raise ValueError(u'Invalid datastore request: {}'.format(errors).encode('utf-8'))
+    primary_key_ids = [
+        field_id.strip()
+        for field_id in datastore['primary_key'].split(u',')
+        if field_id.strip()
+        ] if datastore['method'] != u'insert' else None
+    owned_pool = pool is None
+    if owned_pool:
+        pool = connections.HTTPConnectionPool(max_connections_per_host = concurrency)
+    request_headers = {'Content-Type': 'application/json'}
+    request_headers.update(headers or {})
+    action_url = urlparse.urljoin(site_url, '/api/3/action/datastore_upsert')
+    payload_prefix = json.dumps(dict(method = datastore['method'], resource_id = datastore['resource_id']))[:-1] + \
+        ', "records": ['
+
+    statistics = dict(
+        batches = 0,
+        failed_batches = [],
+        invalid_records = {},
+        records = 0,
+        start_time = time.time(),
+        )
+    statistics_lock = threading.Lock()
+
+    def send(indexes, encoded_records):
+        payload = payload_prefix + ','.join(encoded_records) + ']}'
+        attempt = 0
+        while True:
+            try:
+                status, response_headers, response_body = pool.request('POST', action_url, body = payload,
+                    headers = request_headers)
+                response = json.loads(response_body)
+                if not response.get('success'):
+                    raise ValueError(u'Datastore upsert failed: {}'.format(response.get('error')).encode('utf-8'))
+            except Exception as error:
+                if attempt >= max_retries or not filestores.is_transient_error(error):
+                    return error
+                time.sleep(backoff * 2 ** attempt)
+                attempt += 1
+                continue
+            return None
+
+    def work():
+        while True:
+            batch = batches.get()
+            if batch is None:
+                break
+            indexes, encoded_records = batch
+            error = send(indexes, encoded_records)
+            with statistics_lock:
+                statistics['batches'] += 1
+                if error is None:
+                    statistics['records'] += len(indexes)
+                else:
+                    statistics['failed_batches'].append((indexes, error))
+                sent_records = statistics['records']
+            if progress_callback is not None:
+                elapsed_time = time.time() - statistics['start_time']
+                progress_callback(sent_records, sent_records / elapsed_time if elapsed_time > 0 else 0.0)
+
+    batches = Queue.Queue(maxsize = max_pending_batches or 2 * concurrency)
+    threads = []
+    for i in range(concurrency):
+        thread = threading.Thread(target = work)
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+    try:
+        for batch in iter_encoded_batches(records, error_by_index = statistics['invalid_records'],
+                fields = datastore['fields'], max_batch_bytes = max_batch_bytes,
+                max_batch_records = max_batch_records, primary_key = primary_key_ids, state = state,
+                use_numpy = use_numpy):
+            batches.put(batch)  # Blocks while too many batches are pending.
+    finally:
+        for thread in threads:
+            batches.put(None)
+        for thread in threads:
+            thread.join()
+        if owned_pool:
+            pool.close()
+
+    duration = time.time() - statistics.pop('start_time')
+    statistics['duration'] = duration
+    statistics['records_per_second'] = statistics['records'] / duration if duration > 0 else 0.0
+    return statistics
+
+
+def make_records_validator(fields, use_numpy = None):
+    """Return a function that validates a batch of datastore records (a list of dicts), column by column.
+
+    ``fields`` is the list of ``dict(id = ..., type = ...)`` of a datastore request. When ``use_numpy`` is None,
+    NumPy is used when it is installed.
+
+    The returned function gives a ``(columns, errors)`` couple, where ``columns`` is a dict giving for each field ID
+    a ``(values, nulls)`` couple (``nulls`` is None when the column has no null value) and ``errors`` is None or a
+    dict giving for each index of invalid record the errors of its fields. Invalid values are replaced with nulls.
+    Columns whose type is unknown are kept as lists of values, without validation.
+    """
+    if use_numpy is None:
+        use_numpy = numpy is not None
+    column_converters = [
+        (
+            field['id'],
+            dict(
+                bool = bool_column_to_array,
+                float = float_column_to_array,
+                int = int_column_to_array,
+                text = text_column_to_list,
+                timestamp = timestamp_column_to_array,
+                ).get(column_kind_by_field_type.get(field['type'].lower())),
+            )
+        for field in fields
+        ]
+
+    def validate_records(records, state = None):
+        columns = {}
+        error_by_index = {}
+        for field_id, column_converter in column_converters:
+            values = [
+                record.get(field_id)
+                for record in records
+                ]
+            if column_converter is None:
+                columns[field_id] = (values, None)
+                continue
+            column, nulls, column_error_by_index = column_converter(values, use_numpy = use_numpy, state = state)
+            columns[field_id] = (column, nulls)
+            for index, error in column_error_by_index.iteritems():
+                error_by_index.setdefault(index, {})[field_id] = error
+        return columns, error_by_index or None
+
+    return validate_records
+
+
+def new_array(kind, values, use_numpy = False):
+    """Return a NumPy array or an ``array`` module buffer of the given kind (bool, float, int or timestamp)."""
+    if use_numpy:
+        return numpy.array(values, dtype = dict(
+            bool = numpy.bool_,
+            float = numpy.float64,
+            int = numpy.int64,
+            timestamp = 'datetime64[s]',
+            )[kind])
+    return array.array(dict(bool = 'b', float = 'd', int = 'l', timestamp = 'd')[kind], values)
+
+
+def text_column_to_list(values, use_numpy = False, state = None):
+    """Check a column of strings. Return ``(list, nulls, error_by_index)``."""
+    types = set(type(value) for value in values)
+    if types <= text_types:
+        return values, None, {}
+    error_by_index = {}
+    nulls = [False] * len(values)
+    texts = []
+    for index, value in enumerate(values):
+        if value is None:
+            nulls[index] = True
+        elif type(value) in float_types:
+            value = unicode(value)
+        elif type(value) not in text_types:
+            error_by_index[index] = (state or states.default_state)._(u'Value must be a string')
+            nulls[index] = True
+            value = None
+        texts.append(value)
+    return texts, new_array('bool', nulls, use_numpy = use_numpy), error_by_index
+
+
+def timestamp_column_to_array(values, use_numpy = False, state = None):
+    """Convert a column of ISO 8601 strings to an array of timestamps. Return ``(array, nulls, error_by_index)``.
+
+    Without NumPy, timestamps are stored as seconds since epoch (UTC).
+    """
+    error_by_index = {}
+    nulls = None
+    timestamp_by_value = {}  # Timestamps of a column are often repeated.
+    timestamps = []
+    for index, value in enumerate(values):
+        timestamp = timestamp_by_value.get(value) if type(value) in text_types else None
+        if timestamp is None:
+            if value is None:
+                error = None
+            elif type(value) in text_types:
+                timestamp, error = ckanconv.ckan_iso8601_input_to_datetime(value.strip(), state = state)
+                if error is not None:
+                    timestamp = None  # The converter gives back the invalid string.
+            else:
+                error = (state or states.default_state)._(u'Value must be a date-time in ISO 8601 format')
+            if timestamp is None:
+                if error is not None:
+                    error_by_index[index] = error
+                if nulls is None:
+                    nulls = [False] * len(values)
+                nulls[index] = True
+                timestamps.append(0)
+                continue
+            timestamp = timestamp.replace(microsecond = 0) if use_numpy \
+                else calendar.timegm(timestamp.utctimetuple())
+            timestamp_by_value[value] = timestamp
+        timestamps.append(timestamp)
+    if nulls is not None and use_numpy:
+        # NumPy doesn't convert 0 to a datetime64.
+        timestamps = [
+            None if is_null else timestamp
+            for timestamp, is_null in zip(timestamps, nulls)
+            ]
+    return new_array('timestamp', timestamps, use_numpy = use_numpy), \
+        None if nulls is None else new_array('bool', nulls, use_numpy = use_numpy), error_by_index
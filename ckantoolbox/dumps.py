@@ -0,0 +1,240 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# CKAN-Toolbox -- Various modules that handle CKAN API and data
+# By: Emmanuel Raviart <emmanuel@raviart.com>
+#
+# Copyright (C) 2013 Etalab
+# http://github.com/etalab/ckan-toolbox
+#
+# This file is part of CKAN-Toolbox.
+#
+# CKAN-Toolbox is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# CKAN-Toolbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Toolbox to read dumps of CKAN data (JSON arrays or JSON lines) one item at a time"""
+
+
+import codecs
+import itertools
+import json
+import re
+
+from . import ckanconv, compiledconv
+
+
+json_structure_re = re.compile(ur'"(?:[^"\\]|\\.)*"|[\[\]{},"]', re.DOTALL)
+whitespace_re = re.compile(ur'\s*', re.UNICODE)
+
+
+def find_json_item_end(text):
+    """Return the index of the "," or "]" that ends the (maybe invalid) JSON array item at the start of text.
+
+    Return None when the end of the item is not in text.
+    """
+    depth = 0
+    for match in json_structure_re.finditer(text):
+        token = match.group()
+        if token in (u'[', u'{'):
+            depth += 1
+        elif token in (u']', u'}'):
+            if depth > 0:
+                depth -= 1
+            elif token == u']':
+                return match.start()
+        elif token == u',':
+            if depth == 0:
+                return match.start()
+        elif token == u'"':
+            # Unterminated string
+            return None
+    return None
+
+
+def iter_dump_items(source, chunk_size = 65536, encoding = 'utf-8'):
+    """Iterate over the items of a dump, without loading the whole dump in memory.
+
+    ``source`` is either a file path or a file-like object (opened in binary or text mode). The dump is either a JSON
+    array or a JSON lines file (one JSON item per line). Raise a ValueError at the first invalid item.
+    """
+    for item, error in iter_dump_items_with_errors(source, chunk_size = chunk_size, encoding = encoding):
+        if error is not None:
+            raise ValueError(error.encode('utf-8'))
+        yield item
+
+
+def iter_dump_items_with_errors(source, chunk_size = 65536, encoding = 'utf-8'):
+    """Iterate over the items of a dump, yielding an ``(item, error)`` couple for each of them.
+
+    Like ``iter_dump_items``, but an invalid item is yielded as ``(None, error message)`` and the items following it
+    are still read.
+    """
+    if isinstance(source, basestring):
+        with open(source, 'rb') as dump_file:
+            for item_error in iter_dump_items_with_errors(dump_file, chunk_size = chunk_size, encoding = encoding):
+                yield item_error
+        return
+
+    chunks = iter_text_chunks(source, chunk_size = chunk_size, encoding = encoding)
+    text = u''
+    for chunk in chunks:
+        text = (text + chunk).lstrip()
+        if text:
+            break
+    else:
+        # Empty dump
+        return
+    if text.startswith(u'['):
+        items_errors = iter_json_array_items(text[1:], chunks)
+    else:
+        items_errors = iter_json_lines_items(text, chunks)
+    for item_error in items_errors:
+        yield item_error
+
+
+def iter_json_array_items(text, chunks):
+    """Iterate over the ``(item, error)`` couples of a JSON array whose opening bracket has already been read.
+
+    An invalid item is yielded as ``(None, error message)`` and skipped up to the next "," or "]".
+    """
+    decoder = json.JSONDecoder()
+    eof = False
+    first = True
+    after_comma = False
+    incomplete = False  # True when the current item has already been found incomplete
+    while True:
+        index = whitespace_re.match(text).end()
+        if index == len(text):
+            if eof:
+                raise ValueError(u'Unterminated JSON array')
+            text, eof = read_chunks(text, chunks, len(text) + 1)
+            continue
+        if text[index] == u']':
+            if after_comma:
+                yield None, u'Unexpected "," before end of JSON array'
+            return
+        if not first:
+            if text[index] == u',':
+                text = text[index + 1:]
+                first = True
+                after_comma = True
+                continue
+            text = text[index:]
+            end = find_json_item_end(text)
+            if end is None and not eof:
+                text, eof = read_chunks(text, chunks, 2 * len(text))
+                continue
+            yield None, u'Expecting "," delimiter in JSON array, got {!r}'.format(text[:20])
+            if end is None:
+                return
+            text = text[end:]
+            continue
+        text = text[index:]
+        try:
+            item, end = decoder.raw_decode(text)
+        except ValueError as exception:
+            error = u'Invalid JSON item: {}'.format(exception)
+            item = None
+            # Item is usually incomplete: Look for the end of an invalid item only once more text has been read.
+            end = find_json_item_end(text) if incomplete or eof else None
+            incomplete = True
+            if end is None and eof:
+                yield item, error
+                return
+        else:
+            error = None
+            if end == len(text) and not eof:
+                # Item may be incomplete, when it is a number ending the buffer.
+                end = None
+        if end is None:
+            # Item is incomplete (or may be): Read at least as much text as already buffered, to keep decoding
+            # attempts linear with the size of the item.
+            text, eof = read_chunks(text, chunks, 2 * len(text))
+            continue
+        yield item, error
+        text = text[end:]
+        first = False
+        after_comma = False
+        incomplete = False
+
+
+def iter_json_lines_items(text, chunks):
+    """Iterate over the ``(item, error)`` couples of a JSON lines file."""
+    line_chunks = []
+    for chunk in itertools.chain([text], chunks):
+        if u'\n' not in chunk:
+            line_chunks.append(chunk)
+            continue
+        lines = chunk.split(u'\n')
+        line_chunks.append(lines[0])
+        lines[0] = u''.join(line_chunks)
+        line_chunks = [lines.pop()]
+        for line in lines:
+            line = line.strip()
+            if line:
+                yield json_line_to_item(line)
+    line = u''.join(line_chunks).strip()
+    if line:
+        yield json_line_to_item(line)
+
+
+def iter_text_chunks(source, chunk_size = 65536, encoding = 'utf-8'):
+    """Iterate over the chunks of unicode text read from a file-like object."""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        if isinstance(chunk, str):
+            chunk = decoder.decode(chunk)
+            if not chunk:
+                continue
+        yield chunk
+    chunk = decoder.decode('', final = True)
+    if chunk:
+        yield chunk
+
+
+def iter_validated_packages(source, chunk_size = 65536, compiled = False, drop_none_values = False,
+        encoding = 'utf-8', keep_value_order = False, skip_missing_items = False, state = None):
+    """Iterate over the packages of a dump and yield each of them converted, as a ``(package, errors)`` couple.
+
+    Only one package at a time is held in memory, whatever the size of the dump. An item of the dump that is not valid
+    JSON is yielded as ``(None, error message)``.
+    """
+    make_converter = compiledconv.make_compiled_ckan_json_to_package if compiled \
+        else ckanconv.make_ckan_json_to_package
+    converter = make_converter(drop_none_values = drop_none_values, keep_value_order = keep_value_order,
+        skip_missing_items = skip_missing_items)
+    for package, error in iter_dump_items_with_errors(source, chunk_size = chunk_size, encoding = encoding):
+        yield converter(package, state = state) if error is None else (None, error)
+
+
+def json_line_to_item(line):
+    """Convert a line of a JSON lines file to an ``(item, error)`` couple."""
+    try:
+        return json.loads(line), None
+    except ValueError as exception:
+        return None, u'Invalid JSON line: {}'.format(exception)
+
+
+def read_chunks(text, chunks, length):
+    """Append chunks to text until it is at least length characters long. Return a ``(text, eof)`` couple."""
+    while len(text) < length:
+        chunk = next(chunks, None)
+        if chunk is None:
+            return text, True
+        text += chunk
+    return text, False
@@ -28,19 +28,231 @@
 
 
 import datetime
-import itertools
+import httplib
 import json
 import mimetools
 import mimetypes
 import os
+import Queue
+import socket
+import StringIO
+import threading
+import time
 import urllib2
 import urlparse
 
 from biryani1 import strings
 
+from . import connections
+
+
+class FilePath(object):
+    """Path of a file to upload, opened only when the file is uploaded.
+
+    Paths must be given this way: A unicode string given as a file is its content (encoded to UTF-8), not its path.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.path)
+
+
+class FileStoreSession(object):
+    """Session uploading files to CKAN FileStores, reusing persistent connections to each host."""
+
+    def __init__(self, max_connections_per_host = 4, pool = None, timeout = None):
+        if pool is None:
+            pool = connections.HTTPConnectionPool(max_connections_per_host = max_connections_per_host,
+                timeout = timeout)
+        self.pool = pool
+
+    def close(self):
+        self.pool.close()
+
+    def info(self):
+        """Return the statistics of connections reuse."""
+        return self.pool.info()
+
+    def upload_file(self, site_url, filename, file_data, headers, size = None):
+        """Upload a file to the CKAN FileStore and return its metadata.
+
+        ``file_data`` is either the content of the file (bytes, or unicode text encoded to UTF-8), a ``FilePath`` or
+        a file-like object (opened in binary mode). The request body is streamed, so the file is never fully loaded in
+        memory. ``size`` is required for file-like objects that are neither real files nor seekable.
+        """
+        assert 'Authorization' in headers, headers
+
+        # See ckan/public/application.js:makeUploadKey for why the file_key is derived this way.
+        timestamp = datetime.datetime.now().isoformat().replace(':', '').split('.')[0]
+        normalized_name = os.path.basename(filename).replace(' ', '-')
+        file_key = u'{}/{}'.format(timestamp, normalized_name)
+        status, response_headers, response_text = self.pool.request('GET',
+            urlparse.urljoin(site_url, u'/api/storage/auth/form/{}'.format(file_key)), headers = headers)
+        file_upload_fields = json.loads(response_text)
+
+        form = MultiPartForm()
+        for field in file_upload_fields['fields']:
+            form.add_field(field['name'], unicode(field['value']).encode('utf-8'))
+        form.add_file('file', file_key.encode('utf-8'), file_data, size = size)
+        form_headers = headers.copy()
+        form_headers.update({
+            'Content-Length': form.content_length,
+            'Content-Type': form.content_type,
+            })
+        self.pool.request('POST', unicode(urlparse.urljoin(site_url, file_upload_fields['action'])).encode('utf-8'),
+            body = form.open(), headers = form_headers)
+
+        status, response_headers, response_text = self.pool.request('GET',
+            urlparse.urljoin(site_url, u'/api/storage/metadata/{}'.format(file_key)), headers = headers)
+        file_metadata = json.loads(response_text)
+        return file_metadata
+
+    def upload_files(self, site_url, files, headers, backoff = 1.0, concurrency = 4, max_retries = 3,
+            progress_callback = None):
+        """Upload many files concurrently to the CKAN FileStore.
+
+        ``files`` is an iterable of ``(filename, file_source)`` couples, where ``file_source`` is given as content
+        (bytes, or unicode text encoded to UTF-8), as a ``FilePath`` or as a file-like object. A file-like object
+        that is not seekable is read in memory before being uploaded, because its size is needed.
+
+        At most ``concurrency`` uploads run at the same time. An upload failing with a transient error (connection
+        error or HTTP 429 & 5xx statuses) is retried up to ``max_retries`` times, waiting ``backoff`` seconds, then
+        twice as long, etc. When given, ``progress_callback`` is called (from the uploading threads) with the number
+        of file bytes sent, the total number of file bytes (None when the size of a file can't be known in advance)
+        & the throughput in bytes per second.
+
+        Returns a list of ``(filename, file_metadata, error)`` triples, in the order of ``files``, where ``error`` is
+        the exception of the last failed attempt (or of a file that can't be read), or ``None``.
+        """
+        files = list(files)
+        results = [None] * len(files)
+        file_sizes = []
+        for filename, file_source in files:
+            try:
+                file_sizes.append(get_file_size(file_source))
+            except (AttributeError, EnvironmentError, ValueError):
+                # Missing file or non-seekable file-like object: The error (if any) is reported by its upload.
+                file_sizes.append(None)
+        progress = dict(
+            sent_bytes = 0,
+            start_time = time.time(),
+            total_bytes = None if None in file_sizes else sum(file_sizes),
+            )
+        progress_lock = threading.Lock()
+
+        def report_progress(size):
+            with progress_lock:
+                progress['sent_bytes'] += size
+                sent_bytes = progress['sent_bytes']
+            if progress_callback is not None:
+                elapsed_time = time.time() - progress['start_time']
+                progress_callback(sent_bytes, progress['total_bytes'],
+                    sent_bytes / elapsed_time if elapsed_time > 0 else 0.0)
+
+        def upload(filename, file_source):
+            if isinstance(file_source, FilePath):
+                with open(file_source.path, 'rb') as file_object:
+                    return upload(filename, file_object)
+            if isinstance(file_source, unicode):
+                file_source = file_source.encode('utf-8')
+            if isinstance(file_source, str):
+                file_source = StringIO.StringIO(file_source)
+            try:
+                position = file_source.tell()
+                size = get_file_size(file_source)
+            except (AttributeError, IOError, ValueError):
+                # Not seekable: Read the file in memory, to know its size & to be able to retry its upload.
+                file_source = StringIO.StringIO(file_source.read())
+                position = 0
+                size = len(file_source.getvalue())
+            attempt = 0
+            while True:
+                attempt_sent_bytes = [0]
+
+                def report_attempt_progress(size):
+                    attempt_sent_bytes[0] += size
+                    report_progress(size)
+
+                try:
+                    return self.upload_file(site_url, filename, ProgressFile(file_source, report_attempt_progress),
+                        headers, size = size), None
+                except Exception as error:
+                    report_progress(-attempt_sent_bytes[0])
+                    if attempt >= max_retries or not is_transient_error(error):
+                        return None, error
+                file_source.seek(position)
+                time.sleep(backoff * 2 ** attempt)
+                attempt += 1
+
+        def work():
+            while True:
+                item = indexed_files.get()
+                if item is None:
+                    break
+                index, (filename, file_source) = item
+                try:
+                    file_metadata, error = upload(filename, file_source)
+                except Exception as error:
+                    # For example, a missing file or a file-like object that can't be read
+                    file_metadata = None
+                results[index] = (filename, file_metadata, error)
+
+        indexed_files = Queue.Queue()
+        for item in enumerate(files):
+            indexed_files.put(item)
+        threads = []
+        for i in range(min(concurrency, len(files))):
+            indexed_files.put(None)
+            thread = threading.Thread(target = work)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        return results
+
+
+class MultiPartBody(object):
+    """File-like object streaming the body of a multipart form, to be sent by ``HTTPConnectionPool.request``."""
+
+    def __init__(self, form, chunk_size = 65536):
+        self.chunk = ''
+        self.chunks = form.iter_chunks(chunk_size = chunk_size)
+        self.length = form.content_length
+        self.offset = 0  # Position of the next byte to read in chunk
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size = -1):
+        if size is None or size < 0:
+            data = self.chunk[self.offset:] + ''.join(self.chunks)
+            self.chunk = ''
+            self.offset = 0
+            return data
+        parts = []
+        while size > 0:
+            if self.offset >= len(self.chunk):
+                chunk = next(self.chunks, None)
+                if chunk is None:
+                    break
+                self.chunk = chunk
+                self.offset = 0
+            part = self.chunk[self.offset:self.offset + size]
+            self.offset += len(part)
+            size -= len(part)
+            parts.append(part)
+        return ''.join(parts)
+
 
 class MultiPartForm(object):
-    """Accumulate the data to be used when posting a form."""
+    """Accumulate the data to be used when posting a form.
+
+    Files can be given as bytes, as paths or as file-like objects. They are only read when the body is generated, one
+    chunk at a time.
+    """
 
     def __init__(self):
         self.form_fields = []
@@ -49,87 +261,170 @@ class MultiPartForm(object):
 
     def __str__(self):
         """Return a string representing the form data, including attached files."""
-        # Build a list of lists, each containing "lines" of the request. Each part is separated by a boundary string.
-        # Once the list is built, return a string where each line is separated by '\r\n'.
-        parts = []
-        part_boundary = '--' + self.boundary
+        return ''.join(self.iter_chunks())
+
+    def add_field(self, name, value):
+        """Add a simple field to the form data."""
+        self.form_fields.append((str(name), strings.deep_encode(value)))
+
+    def add_file(self, fieldname, filename, file_source, mimetype = None, size = None):
+        """Add a file to be uploaded.
 
-        # Add the form fields.
-        parts.extend(
-            [
+        ``file_source`` is either the content of the file (bytes, or unicode text encoded to UTF-8), or a ``FilePath``,
+        or a file-like object opened in binary mode (which will be read from its current position). ``size`` is
+        required for file-like objects that are neither real files nor seekable.
+        """
+        if isinstance(file_source, unicode):
+            file_source = file_source.encode('utf-8')
+        if mimetype is None:
+            mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        if size is None:
+            size = get_file_size(file_source)
+        self.files.append((str(fieldname), strings.deep_encode(filename), str(mimetype), file_source, size))
+
+    def add_file_bytes(self, fieldname, filename, file_bytes, mimetype = None):
+        """Add a file to be uploaded."""
+        self.add_file(fieldname, filename, file_bytes, mimetype = mimetype)
+
+    @property
+    def content_length(self):
+        """Return the size of the body, computed from the size of each part, without generating it."""
+        return sum(
+            len(data) if isinstance(data, str) else data[1]
+            for data in self.iter_parts()
+            )
+
+    @property
+    def content_type(self):
+        return 'multipart/form-data; boundary=%s' % self.boundary
+
+    def iter_chunks(self, chunk_size = 65536):
+        """Generate the body of the form, as chunks of ``chunk_size`` bytes (except the last one)."""
+        pending = []
+        pending_size = 0
+        for data in self.iter_parts():
+            if isinstance(data, str):
+                blocks = [data]
+            else:
+                blocks = iter_file_blocks(data[0], chunk_size)
+            for block in blocks:
+                pending.append(block)
+                pending_size += len(block)
+                while pending_size >= chunk_size:
+                    pending_bytes = ''.join(pending)
+                    yield pending_bytes[:chunk_size]
+                    pending_bytes = pending_bytes[chunk_size:]
+                    pending = [pending_bytes]
+                    pending_size = len(pending_bytes)
+        if pending_size > 0:
+            yield ''.join(pending)
+
+    def iter_parts(self):
+        """Iterate over the parts of the body: bytes for boundaries & headers, (file source, size) couples for files."""
+        part_boundary = '--' + self.boundary
+        for name, value in self.form_fields:
+            yield '\r\n'.join([
                 part_boundary,
                 'Content-Disposition: form-data; name="%s"' % name,
                 '',
                 value,
-                ]
-            for name, value in self.form_fields
-            )
-
-        # Add the files to upload.
-        parts.extend(
-            [
+                '',
+                ])
+        for field_name, filename, content_type, file_source, size in self.files:
+            yield '\r\n'.join([
                 part_boundary,
                 'Content-Disposition: file; name="%s"; filename="%s"' % (field_name, filename),
                 'Content-Type: %s' % content_type,
                 '',
-                body,
-                ]
-            for field_name, filename, content_type, body in self.files
-            )
+                '',
+                ])
+            yield file_source, size
+            yield '\r\n'
+        yield '--' + self.boundary + '--\r\n'
 
-        # Flatten the list and add closing boundary marker,
-        # then return CR+LF separated data
-        flattened = list(itertools.chain(*parts))
-        flattened.append('--' + self.boundary + '--')
-        flattened.append('')
-        return '\r\n'.join(flattened)
+    def open(self, chunk_size = 65536):
+        """Return a file-like object streaming the body of the form."""
+        return MultiPartBody(self, chunk_size = chunk_size)
 
-    def add_field(self, name, value):
-        """Add a simple field to the form data."""
-        self.form_fields.append((str(name), strings.deep_encode(value)))
 
-    def add_file_bytes(self, fieldname, filename, file_bytes, mimetype = None):
-        """Add a file to be uploaded."""
-        if mimetype is None:
-            mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
-        self.files.append((str(fieldname), strings.deep_encode(filename), str(mimetype), file_bytes))
+class ProgressFile(object):
+    """File-like object wrapping a binary file and reporting the number of bytes of each read to a callback."""
 
-    @property
-    def content_type(self):
-        return 'multipart/form-data; boundary=%s' % self.boundary
+    def __init__(self, file_object, callback):
+        self.callback = callback
+        self.file_object = file_object
+
+    def read(self, size = -1):
+        data = self.file_object.read(size)
+        if data:
+            self.callback(len(data))
+        return data
+
+
+def get_file_size(file_source):
+    """Return the size of a file given as content (bytes or unicode), as a ``FilePath`` or as a file-like object.
+
+    The size of a file-like object is counted from its current position.
+    """
+    if isinstance(file_source, str):
+        return len(file_source)
+    if isinstance(file_source, unicode):
+        return len(file_source.encode('utf-8'))
+    if isinstance(file_source, FilePath):
+        return os.path.getsize(file_source.path)
+    position = file_source.tell()
+    try:
+        return os.fstat(file_source.fileno()).st_size - position
+    except (AttributeError, IOError, ValueError):
+        # Not a real file (for example a StringIO)
+        file_source.seek(0, os.SEEK_END)
+        size = file_source.tell() - position
+        file_source.seek(position)
+        return size
+
+
+def is_transient_error(error):
+    """Tell whether an upload that failed with the given exception is worth retrying."""
+    if isinstance(error, urllib2.HTTPError):
+        return error.code == 429 or error.code >= 500
+    return isinstance(error, (httplib.HTTPException, socket.error))
+
+
+def iter_file_blocks(file_source, block_size):
+    """Iterate over the bytes of a file given as bytes, as a ``FilePath`` or as a file-like object."""
+    if isinstance(file_source, str):
+        for index in xrange(0, len(file_source), block_size):
+            yield file_source[index:index + block_size]
+    elif isinstance(file_source, FilePath):
+        with open(file_source.path, 'rb') as file_object:
+            for block in iter_file_blocks(file_object, block_size):
+                yield block
+    else:
+        while True:
+            block = file_source.read(block_size)
+            if not block:
+                break
+            yield block
 
 
 def upload_file(site_url, filename, file_data, headers):
-    assert 'Authorization' in headers, headers
-
-    # See ckan/public/application.js:makeUploadKey for why the file_key is derived this way.
-    timestamp = datetime.datetime.now().isoformat().replace(':', '').split('.')[0]
-    normalized_name = os.path.basename(filename).replace(' ', '-')
-    file_key = u'{}/{}'.format(timestamp, normalized_name)
-    request = urllib2.Request(urlparse.urljoin(site_url, u'/api/storage/auth/form/{}'.format(file_key)),
-        headers = headers)
-    response = urllib2.urlopen(request)
-    file_upload_fields = json.loads(response.read())
-
-    form = MultiPartForm()
-    for field in file_upload_fields['fields']:
-        form.add_field(field['name'], unicode(field['value']).encode('utf-8'))
-    form.add_file_bytes('file', file_key.encode('utf-8'), file_data)
-    form_bytes = str(form)
-    form_headers = headers.copy()
-    form_headers.update({
-        'Content-Length': len(form_bytes),
-        'Content-Type': form.content_type,
-        })
-    request = urllib2.Request(unicode(urlparse.urljoin(site_url, file_upload_fields['action'])).encode('utf-8'),
-        headers = form_headers)
-    request.add_data(form_bytes)
-    response = urllib2.urlopen(request)
-    response_text = response.read()
-
-    request = urllib2.Request(urlparse.urljoin(site_url, u'/api/storage/metadata/{}'.format(file_key)),
-        headers = headers)
-    response = urllib2.urlopen(request)
-    response_text = response.read()
-    file_metadata = json.loads(response_text)
-    return file_metadata
+    """Upload a file to the CKAN FileStore and return its metadata.
+
+    The three requests needed share the same connection. To reuse connections between uploads, use a
+    :class:`FileStoreSession`.
+    """
+    session = FileStoreSession(max_connections_per_host = 1)
+    try:
+        return session.upload_file(site_url, filename, file_data, headers)
+    finally:
+        session.close()
+
+
+def upload_files(site_url, files, headers, backoff = 1.0, concurrency = 4, max_retries = 3, progress_callback = None):
+    """Upload many files concurrently to the CKAN FileStore. See :meth:`FileStoreSession.upload_files`."""
+    session = FileStoreSession(max_connections_per_host = concurrency)
+    try:
+        return session.upload_files(site_url, files, headers, backoff = backoff, concurrency = concurrency,
+            max_retries = max_retries, progress_callback = progress_callback)
+    finally:
+        session.close()
@@ -0,0 +1,154 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# CKAN-Toolbox -- Various modules that handle CKAN API and data
+# By: Emmanuel Raviart <emmanuel@raviart.com>
+#
+# Copyright (C) 2013 Etalab
+# http://github.com/etalab/ckan-toolbox
+#
+# This file is part of CKAN-Toolbox.
+#
+# CKAN-Toolbox is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# CKAN-Toolbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Incremental validation of CKAN packages, keyed on their revision"""
+
+
+import cPickle
+import json
+import sqlite3
+import threading
+
+from . import ckanconv, compiledconv
+
+
+class IncrementalPackageValidator(object):
+    """Validator of packages that skips the converter when a package revision has already been validated.
+
+    The last seen revision (``revision_id`` & ``metadata_modified``) of each package is stored, with its validated
+    value and errors (pickled), in a SQLite database. A package whose ``id`` or revision is missing is always validated.
+    """
+    hits = 0
+    misses = 0
+
+    def __init__(self, database_path, commit_every = 1000, compiled = False, drop_none_values = False,
+            keep_value_order = False, skip_missing_items = False):
+        make_converter = compiledconv.make_compiled_ckan_json_to_package if compiled \
+            else ckanconv.make_ckan_json_to_package
+        self.converter = make_converter(drop_none_values = drop_none_values, keep_value_order = keep_value_order,
+            skip_missing_items = skip_missing_items)
+        # Compiled & original converters give the same results, so "compiled" is not an option of stored results.
+        self.options = json.dumps(dict(
+            drop_none_values = drop_none_values,
+            keep_value_order = keep_value_order,
+            skip_missing_items = skip_missing_items,
+            ), sort_keys = True)
+        self.commit_every = commit_every
+        self.connection = sqlite3.connect(database_path, check_same_thread = False)
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS packages (
+                id TEXT PRIMARY KEY,
+                revision_id TEXT,
+                metadata_modified TEXT,
+                options TEXT NOT NULL,
+                result BLOB
+                )
+            ''')
+        self.connection.commit()
+        self.lock = threading.Lock()
+        self.uncommitted_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        with self.lock:
+            self.connection.commit()
+            self.connection.close()
+
+    def commit(self):
+        with self.lock:
+            self.connection.commit()
+            self.uncommitted_count = 0
+
+    def info(self):
+        """Return the statistics of the validator."""
+        with self.lock:
+            entries = self.connection.execute('SELECT count(*) FROM packages').fetchone()[0]
+            return dict(
+                entries = entries,
+                hits = self.hits,
+                misses = self.misses,
+                )
+
+    def invalidate(self, package_id):
+        """Forget the validated revision of a package."""
+        with self.lock:
+            self.connection.execute('DELETE FROM packages WHERE id = ?', (package_id,))
+            self.uncommitted_count += 1
+
+    def invalidate_all(self):
+        """Forget the validated revision of every package."""
+        with self.lock:
+            self.connection.execute('DELETE FROM packages')
+            self.connection.commit()
+            self.uncommitted_count = 0
+
+    def iter_validate(self, packages, state = None):
+        """Validate packages and yield a ``(package, errors)`` couple for each of them."""
+        for package in packages:
+            yield self.validate(package, state = state)
+
+    def validate(self, package, state = None):
+        """Validate a package (when its revision has changed since last validation) & return (package, errors)."""
+        package_id = package.get('id') if isinstance(package, dict) else None
+        revision_id = package.get('revision_id') if package_id is not None else None
+        metadata_modified = package.get('metadata_modified') if package_id is not None else None
+        if not isinstance(package_id, basestring) \
+                or not isinstance(revision_id, (basestring, type(None))) \
+                or not isinstance(metadata_modified, (basestring, type(None))) \
+                or (revision_id is None and metadata_modified is None):
+            with self.lock:
+                self.misses += 1
+            return self.converter(package, state = state)
+        revision = (revision_id, metadata_modified, self.options)
+
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT revision_id, metadata_modified, options, result FROM packages WHERE id = ?',
+                (package_id,),
+                ).fetchone()
+            if row is not None and tuple(row[:3]) == revision:
+                self.hits += 1
+                # Unpickling gives a new value, that the caller can modify.
+                return cPickle.loads(str(row[3]))
+            self.misses += 1
+
+        value, errors = self.converter(package, state = state)
+        with self.lock:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO packages (id, revision_id, metadata_modified, options, result) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (package_id,) + revision + (sqlite3.Binary(cPickle.dumps((value, errors), 2)),),
+                )
+            self.uncommitted_count += 1
+            if self.uncommitted_count >= self.commit_every:
+                self.connection.commit()
+                self.uncommitted_count = 0
+        return value, errors
@@ -0,0 +1,152 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# CKAN-Toolbox -- Various modules that handle CKAN API and data
+# By: Emmanuel Raviart <emmanuel@raviart.com>
+#
+# Copyright (C) 2013 Etalab
+# http://github.com/etalab/ckan-toolbox
+#
+# This file is part of CKAN-Toolbox.
+#
+# CKAN-Toolbox is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# CKAN-Toolbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Interning of the strings of low-cardinality fields
+
+Usage::
+
+    pool = ckanconv.enable_converters_interning()
+    converter = ckanconv.make_ckan_json_to_package()
+    ...
+    print pool.table()
+"""
+
+
+import json
+import threading
+
+
+default_field_names = frozenset([
+    'capacity',
+    'format',
+    'frequency',
+    'license_id',
+    'mimetype',
+    'mimetype_inner',
+    'resource_type',
+    'state',
+    'tag.display_name',
+    'tag.name',
+    'territorial_coverage_granularity',
+    'type',
+    ])
+
+
+class InternPool(object):
+    """Thread-safe tables of unique strings, one by field.
+
+    ``field_names`` contains names of fields of any entity (for example ``format``) or of a given entity (for example
+    ``tag.name``). Each table holds at most ``max_entries_per_field`` strings: once it is full, new strings are
+    returned without being interned.
+    """
+    def __init__(self, field_names = None, max_entries_per_field = 10000):
+        self.field_names = frozenset(field_names) if field_names is not None else default_field_names
+        self.lock = threading.Lock()
+        self.max_entries_per_field = max_entries_per_field
+        self.statistics_by_path = {}  # path: dict(hits, misses, rejections)
+        self.string_by_string_by_path = {}
+
+    def clear(self):
+        """Forget interned strings & reset statistics.
+
+        Tables are emptied in place, because they are held by the converters already instrumented.
+        """
+        with self.lock:
+            for statistics in self.statistics_by_path.itervalues():
+                for key in statistics:
+                    statistics[key] = 0
+            for string_by_string in self.string_by_string_by_path.itervalues():
+                string_by_string.clear()
+
+    def info(self):
+        """Return a dict giving for each field path its cardinality (interned strings) & hits, misses, rejections."""
+        with self.lock:
+            return dict(
+                (path, dict(
+                    cardinality = len(self.string_by_string_by_path[path]),
+                    **statistics
+                    ))
+                for path, statistics in self.statistics_by_path.iteritems()
+                )
+
+    def instrument_field(self, entity_name, name, converter):
+        """Wrap the converter of a struct item, to intern its string results, when the field must be interned.
+
+        Return the converter unchanged otherwise.
+        """
+        if name not in self.field_names and u'{}.{}'.format(entity_name, name) not in self.field_names:
+            return converter
+        path = u'{}.{}'.format(entity_name, name) if entity_name is not None else name
+        self.intern(path, None)  # Create the table of path.
+
+        def interning_converter(value, state = None):
+            value, error = converter(value, state = state)
+            if error is None:
+                value = self.intern(path, value)
+            return value, error
+        return interning_converter
+
+    def intern(self, path, value):
+        """Return the interned string equal to value, in the table of the given field path.
+
+        Value is returned unchanged when it is not a string or when the table is full.
+        """
+        string_by_string = self.string_by_string_by_path.get(path)
+        if string_by_string is None:
+            with self.lock:
+                string_by_string = self.string_by_string_by_path.setdefault(path, {})
+                self.statistics_by_path.setdefault(path, dict(hits = 0, misses = 0, rejections = 0))
+        if not isinstance(value, basestring):
+            return value
+        statistics = self.statistics_by_path[path]
+        interned_value = string_by_string.get(value)
+        if interned_value is not None:
+            statistics['hits'] += 1  # Not locked: statistics may be a little inaccurate.
+            return interned_value
+        with self.lock:
+            if len(string_by_string) < self.max_entries_per_field:
+                value = string_by_string.setdefault(value, value)
+                statistics['misses'] += 1
+            else:
+                statistics['rejections'] += 1
+        return value
+
+    def table(self):
+        """Return a text table of interned fields, sorted by decreasing number of interned values."""
+        paths_statistics = sorted(
+            self.info().iteritems(),
+            key = lambda (path, statistics): (-statistics['hits'] - statistics['misses'], path),
+            )
+        lines = [u'{:<50} {:>12} {:>12} {:>12}'.format(u'Path', u'Cardinality', u'Hits', u'Rejections')]
+        lines.extend(
+            u'{:<50} {:>12} {:>12} {:>12}'.format(path, statistics['cardinality'], statistics['hits'],
+                statistics['rejections'])
+            for path, statistics in paths_statistics
+            )
+        return u'\n'.join(lines)
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.info(), sort_keys = True, **kwargs)
@@ -0,0 +1,129 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# CKAN-Toolbox -- Various modules that handle CKAN API and data
+# By: Emmanuel Raviart <emmanuel@raviart.com>
+#
+# Copyright (C) 2013 Etalab
+# http://github.com/etalab/ckan-toolbox
+#
+# This file is part of CKAN-Toolbox.
+#
+# CKAN-Toolbox is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# CKAN-Toolbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Lazy validation of CKAN packages, field by field, when they are accessed"""
+
+
+import collections
+
+from biryani1 import states
+from biryani1.baseconv import test_isinstance
+
+from . import ckanconv
+
+
+class LazyPackage(collections.Mapping):
+    """Read-only view of a package, whose fields are validated when they are first accessed.
+
+    Each field is validated by the same converter as in ``ckanconv.make_ckan_json_to_package``. Validated values are
+    cached, and the errors found so far are collected in ``errors``. Call ``force()`` to validate the whole package.
+
+    Iterating over the keys (or getting the length) doesn't validate fields, except with ``drop_none_values``, where
+    every field must be validated to know whether it is dropped.
+    """
+    forced = False
+
+    def __init__(self, package, drop_none_values = False, keep_value_order = False, skip_missing_items = False,
+            state = None):
+        self.converter_by_name = make_package_converter_by_name(drop_none_values = drop_none_values,
+            keep_value_order = keep_value_order, skip_missing_items = skip_missing_items)
+        self.drop_none_values = drop_none_values
+        self.errors = {}
+        self.keep_value_order = keep_value_order
+        self.package = ckanconv.remove_extras_without_copy(package, state = state)[0]
+        self.skip_missing_items = skip_missing_items
+        self.state = state
+        self.value_by_name = {}
+
+    def __getitem__(self, name):
+        value_by_name = self.value_by_name
+        if name in value_by_name:
+            return value_by_name[name]
+        if self.forced:
+            raise KeyError(name)
+        converter = self.converter_by_name.get(name)
+        if converter is None:
+            if name in self.package:
+                self.errors[name] = (self.state or states.default_state)._(u'Unexpected item')
+            raise KeyError(name)
+        if self.skip_missing_items and name not in self.package:
+            raise KeyError(name)
+        value, error = converter(self.package.get(name), state = self.state)
+        if error is not None:
+            self.errors[name] = error
+        if value is None and self.drop_none_values:
+            raise KeyError(name)
+        value_by_name[name] = value
+        return value
+
+    def __iter__(self):
+        if self.forced:
+            for name in self.value_by_name:
+                yield name
+            return
+        for name in self.converter_by_name:
+            if self.skip_missing_items and name not in self.package:
+                continue
+            if self.drop_none_values and name not in self:
+                continue
+            yield name
+
+    def __len__(self):
+        return sum(1 for name in self)
+
+    def __repr__(self):
+        return '<{} {!r}>'.format(self.__class__.__name__, self.package.get('name') or self.package.get('id'))
+
+    def force(self):
+        """Validate the whole package & return a ``(package, errors)`` couple, like the package converter."""
+        if not self.forced:
+            value, errors = ckanconv.make_ckan_json_to_package(drop_none_values = self.drop_none_values,
+                keep_value_order = self.keep_value_order, skip_missing_items = self.skip_missing_items)(
+                self.package, state = self.state)
+            self.errors = errors or {}
+            self.forced = True
+            self.value_by_name = value if value is not None else {}
+        return self.value_by_name, self.errors or None
+
+
+def make_ckan_json_to_lazy_package(drop_none_values = False, keep_value_order = False, skip_missing_items = False):
+    """Return a converter of a package dict to a LazyPackage, whose fields are validated only when accessed."""
+    def ckan_json_to_lazy_package(value, state = None):
+        if value is None:
+            return value, None
+        value, error = test_isinstance(dict)(value, state = state)
+        if error is not None:
+            return value, error
+        return LazyPackage(value, drop_none_values = drop_none_values, keep_value_order = keep_value_order,
+            skip_missing_items = skip_missing_items, state = state), None
+    return ckan_json_to_lazy_package
+
+
+@ckanconv.cached_converter_factory
+def make_package_converter_by_name(drop_none_values = False, keep_value_order = False, skip_missing_items = False):
+    """Return the dict of the converters of each package field, shared by every LazyPackage (not to be modified)."""
+    return ckanconv.make_ckan_json_to_package_fields(drop_none_values = drop_none_values,
+        keep_value_order = keep_value_order, skip_missing_items = skip_missing_items)
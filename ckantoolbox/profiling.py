@@ -0,0 +1,124 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# CKAN-Toolbox -- Various modules that handle CKAN API and data
+# By: Emmanuel Raviart <emmanuel@raviart.com>
+#
+# Copyright (C) 2013 Etalab
+# http://github.com/etalab/ckan-toolbox
+#
+# This file is part of CKAN-Toolbox.
+#
+# CKAN-Toolbox is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# CKAN-Toolbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Per-field timing of converters
+
+Usage::
+
+    aggregator = ckanconv.enable_converters_profiling()
+    converter = ckanconv.make_ckan_json_to_package()
+    ...
+    print aggregator.table()
+"""
+
+
+import json
+import threading
+import timeit
+
+
+class FieldTimingAggregator(object):
+    """Thread-safe collector of the call count and cumulative time spent converting each field path.
+
+    Paths look like ``package.resources[].url``. The time of a field includes the time of its sub-fields.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.thread_data = threading.local()
+        self.timing_by_path = {}  # path: [call count, cumulative time]
+
+    def clear(self):
+        with self.lock:
+            self.timing_by_path.clear()
+
+    def get_path_stack(self):
+        stack = getattr(self.thread_data, 'stack', None)
+        if stack is None:
+            stack = self.thread_data.stack = []
+        return stack
+
+    def info(self):
+        """Return a dict giving for each path its call count & cumulative time, in seconds."""
+        with self.lock:
+            return dict(
+                (path, dict(count = count, time = cumulative_time))
+                for path, (count, cumulative_time) in self.timing_by_path.iteritems()
+                )
+
+    def instrument_field(self, name, converter):
+        """Wrap the converter of a struct item, to time it."""
+        def timed_converter(value, state = None):
+            stack = self.get_path_stack()
+            stack.append(u'{}[]'.format(name) if isinstance(value, list) else name)
+            start_time = timeit.default_timer()
+            try:
+                return converter(value, state = state)
+            finally:
+                self.record(u'.'.join(stack), timeit.default_timer() - start_time)
+                stack.pop()
+        return timed_converter
+
+    def instrument_root(self, name, converter):
+        """Wrap the converter of an entity, to time it when it is not embedded in another timed converter."""
+        def timed_converter(value, state = None):
+            stack = self.get_path_stack()
+            if stack:
+                return converter(value, state = state)
+            stack.append(name)
+            start_time = timeit.default_timer()
+            try:
+                return converter(value, state = state)
+            finally:
+                self.record(name, timeit.default_timer() - start_time)
+                stack.pop()
+        return timed_converter
+
+    def record(self, path, duration):
+        with self.lock:
+            timing = self.timing_by_path.get(path)
+            if timing is None:
+                self.timing_by_path[path] = [1, duration]
+            else:
+                timing[0] += 1
+                timing[1] += duration
+
+    def table(self):
+        """Return a text table of timings, sorted by decreasing cumulative time."""
+        timings = sorted(
+            self.info().iteritems(),
+            key = lambda (path, timing): (-timing['time'], path),
+            )
+        lines = [u'{:<60} {:>10} {:>12} {:>12}'.format(u'Path', u'Calls', u'Total (ms)', u'Mean (µs)')]
+        lines.extend(
+            u'{:<60} {:>10} {:>12.3f} {:>12.3f}'.format(path, timing['count'], timing['time'] * 1000,
+                timing['time'] * 1000000 / timing['count'])
+            for path, timing in timings
+            )
+        return u'\n'.join(lines)
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.info(), sort_keys = True, **kwargs)
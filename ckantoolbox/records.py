@@ -0,0 +1,149 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# CKAN-Toolbox -- Various modules that handle CKAN API and data
+# By: Emmanuel Raviart <emmanuel@raviart.com>
+#
+# Copyright (C) 2013 Etalab
+# http://github.com/etalab/ckan-toolbox
+#
+# This file is part of CKAN-Toolbox.
+#
+# CKAN-Toolbox is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# CKAN-Toolbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Compact record types for validated CKAN entities
+
+Records store their fields in ``__slots__`` instead of a per-instance dict, and share the strings of fields having
+few distinct values (``format``, ``license_id``, ``state``...). They are optional: converters still produce dicts,
+which can be converted with ``Package.from_dict(package)`` and back with ``package.to_dict()``.
+"""
+
+
+from . import ckanconv, interning
+
+
+interned_field_names = frozenset([
+    'approval_status',
+    'capacity',
+    'format',
+    'license_id',
+    'license_title',
+    'license_url',
+    'mimetype',
+    'mimetype_inner',
+    'resource_type',
+    'state',
+    'type',
+    'url_type',
+    ])
+# Bounded pool of interned unicode strings (builtin intern() only accepts byte strings), one table by field name
+intern_pool = interning.InternPool(field_names = interned_field_names)
+
+
+class Record(object):
+    """Base class of compact records. Subclasses are built by ``make_record_class``."""
+    __slots__ = ()
+    attribute_by_name = {}  # Slot name of each field (field names like "__extras" are not valid slot names)
+    name_by_attribute = {}
+    record_class_by_name = {}  # Class of the records of fields whose value is a list of entities
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.to_dict())
+
+    def __setstate__(self, state):
+        self.set_items(state)
+
+    @classmethod
+    def from_dict(cls, value):
+        """Convert a validated entity dict to a record. Return None when value is None."""
+        if value is None:
+            return None
+        record = cls.__new__(cls)
+        record.set_items(value)
+        return record
+
+    def set_items(self, value):
+        attribute_by_name = self.attribute_by_name
+        record_class_by_name = self.record_class_by_name
+        for name, item in value.iteritems():
+            attribute = attribute_by_name.get(name)
+            if attribute is None:
+                raise ValueError(u'Unknown field "{}" for {}'.format(name, self.__class__.__name__).encode('utf-8'))
+            if name in interned_field_names:
+                item = intern_pool.intern(name, item)
+            elif item is not None and name in record_class_by_name:
+                from_dict = record_class_by_name[name].from_dict
+                item = tuple(
+                    from_dict(sub_item)
+                    for sub_item in item
+                    )
+            setattr(self, attribute, item)
+
+    def to_dict(self):
+        """Convert the record back to a dict. Fields that were missing from the original dict are omitted."""
+        value = {}
+        record_class_by_name = self.record_class_by_name
+        for attribute in self.__slots__:
+            try:
+                item = getattr(self, attribute)
+            except AttributeError:
+                continue
+            name = self.name_by_attribute[attribute]
+            if item is not None and name in record_class_by_name:
+                item = [
+                    sub_item.to_dict() if sub_item is not None else None
+                    for sub_item in item
+                    ]
+            value[name] = item
+        return value
+
+
+def make_record_class(class_name, field_names, record_class_by_name = None):
+    """Generate a Record subclass with a slot for each field."""
+    attribute_by_name = dict(
+        (name, u'{}_'.format(name.lstrip('_')).encode('ascii') if name.startswith('__') else name.encode('ascii'))
+        for name in field_names
+        )
+    return type(class_name, (Record,), dict(
+        __slots__ = tuple(sorted(attribute_by_name.itervalues())),
+        attribute_by_name = attribute_by_name,
+        name_by_attribute = dict(
+            (attribute, name)
+            for name, attribute in attribute_by_name.iteritems()
+            ),
+        record_class_by_name = record_class_by_name or {},
+        ))
+
+
+Related = make_record_class('Related', ckanconv.make_ckan_json_to_related_fields())
+Resource = make_record_class('Resource', ckanconv.make_ckan_json_to_resource_fields())
+Tag = make_record_class('Tag', ckanconv.make_ckan_json_to_tag_fields())
+Group = make_record_class('Group', ckanconv.make_ckan_json_to_group_fields(), dict(tags = Tag))
+Organization = make_record_class('Organization', ckanconv.make_ckan_json_to_organization_fields(), dict(tags = Tag))
+Package = make_record_class('Package', ckanconv.make_ckan_json_to_package_fields(), dict(
+    resources = Resource,
+    tags = Tag,
+    ))
+User = make_record_class('User', ckanconv.make_ckan_json_to_user_fields(), dict(datasets = Package))
@@ -0,0 +1,255 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# CKAN-Toolbox -- Various modules that handle CKAN API and data
+# By: Emmanuel Raviart <emmanuel@raviart.com>
+#
+# Copyright (C) 2013 Etalab
+# http://github.com/etalab/ckan-toolbox
+#
+# This file is part of CKAN-Toolbox.
+#
+# CKAN-Toolbox is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# CKAN-Toolbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Delta synchronization of packages, groups & organizations from a CKAN site to another one
+
+The synchronizer keeps, for each kind of entity, a fingerprint index (entity name -> SHA-1 of its output dict) of
+what the target site contains. Each run compares the source entities with this index in a single pass and only
+sends the differences.
+"""
+
+
+import binascii
+import json
+import Queue
+import threading
+import time
+import urlparse
+
+from . import caches, ckanconv, connections, filestores
+
+
+output_converter_by_kind = dict(
+    group = ckanconv.ckan_input_group_to_output_group,
+    organization = ckanconv.ckan_input_organization_to_output_organization,
+    package = ckanconv.ckan_input_package_to_output_package,
+    )
+
+
+class CatalogSynchronizer(object):
+    """Push to a target CKAN site the entities of a source site that differ from the fingerprint index.
+
+    ``index`` is a dict giving, for each kind of entity (``group``, ``organization``, ``package``), a dict of
+    fingerprints by entity name. It is updated after each successful request, so that it can be saved (see
+    ``save_index``) & reused by the next run.
+    """
+    def __init__(self, target_url, backoff = 1.0, concurrency = 4, headers = None, index = None, max_retries = 3,
+            pool = None, timeout = None):
+        self.backoff = backoff
+        self.concurrency = concurrency
+        self.headers = {'Content-Type': 'application/json'}
+        self.headers.update(headers or {})
+        self.index = index if index is not None else {}
+        self.index_lock = threading.Lock()
+        self.max_retries = max_retries
+        self.pool = pool if pool is not None else connections.HTTPConnectionPool(
+            max_connections_per_host = concurrency, timeout = timeout)
+        self.target_url = target_url
+
+    def call_action(self, action, data):
+        """POST data to an action of the target CKAN API (with retries for transient errors) & return its result."""
+        url = urlparse.urljoin(self.target_url, '/api/3/action/{}'.format(action))
+        body = json.dumps(data)
+        attempt = 0
+        while True:
+            try:
+                status, response_headers, response_body = self.pool.request('POST', url, body = body,
+                    headers = self.headers)
+            except Exception as error:
+                if attempt >= self.max_retries or not filestores.is_transient_error(error):
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+                attempt += 1
+                continue
+            response = json.loads(response_body)
+            if not response.get('success'):
+                raise ValueError(u'CKAN action {} failed: {}'.format(action, response.get('error')).encode('utf-8'))
+            return response.get('result')
+
+    def close(self):
+        self.pool.close()
+
+    def index_target_entities(self, kind, entities):
+        """Replace the fingerprint index of a kind of entity with the fingerprints of the given target entities.
+
+        Entities are given as retrieved from the target CKAN API (they are converted like source entities).
+        """
+        convert = output_converter_by_kind[kind]
+        kind_index = {}
+        for entity in entities:
+            output_entity, errors = convert(entity)
+            if output_entity is not None and output_entity.get('name'):
+                try:
+                    kind_index[output_entity['name']] = fingerprint(output_entity)
+                except ValueError:
+                    # Not indexed: the entity will be sent again by the next sync.
+                    continue
+        with self.index_lock:
+            self.index[kind] = kind_index
+
+    def sync(self, kind, source_entities, delete = True):
+        """Create, update & delete target entities of the given kind, so that they match the source entities.
+
+        ``source_entities`` are given as retrieved from the source CKAN API. When one of them is None (for example
+        because it couldn't be fetched), no entity is deleted. Returns a dict of statistics, where ``skipped`` counts
+        the source entities that couldn't be converted & ``conversion_failures`` lists them as ``(name or ID, error)``
+        couples.
+        """
+        with self.index_lock:
+            kind_index = self.index.setdefault(kind, {})
+            target_names = set(kind_index)
+        statistics = dict(
+            conversion_failures = [],
+            created = 0,
+            deleted = 0,
+            failures = [],
+            skipped = 0,
+            start_time = time.time(),
+            unchanged = 0,
+            updated = 0,
+            )
+        statistics_lock = threading.Lock()
+
+        def work():
+            while True:
+                change = changes.get()
+                if change is None:
+                    break
+                operation, name, digest, output_entity = change
+                try:
+                    if operation == 'delete':
+                        self.call_action('{}_delete'.format(kind), dict(id = name))
+                    else:
+                        self.call_action('{}_{}'.format(kind, operation),
+                            output_entity if operation == 'create' else dict(output_entity, id = name))
+                except Exception as error:
+                    with statistics_lock:
+                        statistics['failures'].append((operation, name, error))
+                    continue
+                with self.index_lock:
+                    if operation == 'delete':
+                        kind_index.pop(name, None)
+                    else:
+                        kind_index[name] = digest
+                with statistics_lock:
+                    statistics[dict(create = 'created', delete = 'deleted', update = 'updated')[operation]] += 1
+
+        changes = Queue.Queue(maxsize = 2 * self.concurrency)
+        threads = []
+        for i in range(self.concurrency):
+            thread = threading.Thread(target = work)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        try:
+            for change in iter_changes(kind, source_entities, kind_index, statistics, target_names, delete = delete):
+                changes.put(change)  # Blocks while too many changes are pending.
+        finally:
+            for thread in threads:
+                changes.put(None)
+            for thread in threads:
+                thread.join()
+        statistics['duration'] = time.time() - statistics.pop('start_time')
+        return statistics
+
+
+def fingerprint(value):
+    """Return the fingerprint of a JSON value: the 20 bytes SHA-1 of its canonical JSON.
+
+    Raise a ValueError when value can't be converted to JSON.
+    """
+    digest = caches.hash_json(value)
+    if digest is None:
+        raise ValueError(u'Value {!r} can\'t be converted to JSON'.format(value).encode('utf-8'))
+    return binascii.unhexlify(digest)
+
+
+def iter_changes(kind, source_entities, kind_index, statistics, target_names, delete = True):
+    """Compare source entities with the fingerprint index in a single pass.
+
+    Yield ``(operation, name, fingerprint, output entity)`` tuples, where operation is ``create``, ``update`` or
+    ``delete``. Unchanged & skipped entities are counted in ``statistics``, and the reason why each entity is skipped
+    is appended to ``statistics['conversion_failures']``. ``target_names`` is consumed: the names remaining once
+    every source entity has been seen are deleted.
+    """
+    convert = output_converter_by_kind[kind]
+    for entity in source_entities:
+        if entity is None:
+            statistics['conversion_failures'].append((None, u'Missing entity'))
+            statistics['skipped'] += 1
+            continue
+        identifier = (entity.get('name') or entity.get('id')) if isinstance(entity, dict) else None
+        try:
+            output_entity, errors = convert(entity)
+            if output_entity is None:
+                raise ValueError(u'Conversion failed: {}'.format(errors).encode('utf-8'))
+            name = output_entity.get('name')
+            if name is None:
+                raise ValueError('Entity has no name')
+            digest = fingerprint(output_entity)
+        except Exception as error:
+            statistics['conversion_failures'].append((identifier, error))
+            statistics['skipped'] += 1
+            continue
+        if name in target_names:
+            target_names.discard(name)
+            if kind_index.get(name) == digest:
+                statistics['unchanged'] += 1
+                continue
+            yield 'update', name, digest, output_entity
+        else:
+            yield 'create', name, digest, output_entity
+    if delete and not statistics['skipped']:
+        for name in sorted(target_names):
+            yield 'delete', name, None, None
+
+
+def load_index(path):
+    """Load a fingerprint index saved by ``save_index``."""
+    with open(path) as index_file:
+        return dict(
+            (kind, dict(
+                (name, binascii.unhexlify(digest))
+                for name, digest in kind_index.iteritems()
+                ))
+            for kind, kind_index in json.load(index_file).iteritems()
+            )
+
+
+def save_index(index, path):
+    """Save a fingerprint index to a JSON file."""
+    with open(path, 'w') as index_file:
+        json.dump(
+            dict(
+                (kind, dict(
+                    (name, binascii.hexlify(digest))
+                    for name, digest in kind_index.iteritems()
+                    ))
+                for kind, kind_index in index.iteritems()
+                ),
+            index_file,
+            sort_keys = True,
+            )
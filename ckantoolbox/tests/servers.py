@@ -0,0 +1,96 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# CKAN-Toolbox -- Various modules that handle CKAN API and data
+# By: Emmanuel Raviart <emmanuel@raviart.com>
+#
+# Copyright (C) 2013 Etalab
+# http://github.com/etalab/ckan-toolbox
+#
+# This file is part of CKAN-Toolbox.
+#
+# CKAN-Toolbox is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# CKAN-Toolbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Local stub HTTP servers, used by tests instead of real CKAN sites"""
+
+
+import BaseHTTPServer
+import json
+import SocketServer
+import threading
+import urlparse
+
+
+class StubRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive connections, like CKAN behind a web server
+
+    def do_GET(self):
+        self.handle_request()
+
+    def do_POST(self):
+        self.handle_request()
+
+    def handle_request(self):
+        content_length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(content_length) if content_length else None
+        split_path = urlparse.urlsplit(self.path)
+        request = dict(
+            body = body,
+            headers = dict(self.headers.items()),
+            method = self.command,
+            path = split_path.path,
+            query = urlparse.parse_qs(split_path.query),
+            )
+        with self.server.lock:
+            self.server.requests.append(request)
+        status, response_body = self.server.respond(request)
+        if not isinstance(response_body, str):
+            response_body = json.dumps(response_body)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response_body)))
+        self.end_headers()
+        self.wfile.write(response_body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """A threaded HTTP server listening on a free local port, that answers requests with a function.
+
+    ``respond`` is called with a request dict (``body``, ``headers``, ``method``, ``path`` & ``query``) and returns a
+    ``(status, body)`` couple, where body is a string or a value to encode in JSON. Received requests are kept in
+    ``requests``. Use it as a context manager.
+    """
+    daemon_threads = True
+
+    def __init__(self, respond):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), StubRequestHandler)
+        self.lock = threading.Lock()
+        self.requests = []
+        self.respond = respond
+        self.url = 'http://127.0.0.1:{}/'.format(self.server_port)
+
+    def __enter__(self):
+        thread = threading.Thread(target = self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,62 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# CKAN-Toolbox -- Various modules that handle CKAN API and data
+# By: Emmanuel Raviart <emmanuel@raviart.com>
+#
+# Copyright (C) 2013 Etalab
+# http://github.com/etalab/ckan-toolbox
+#
+# This file is part of CKAN-Toolbox.
+#
+# CKAN-Toolbox is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# CKAN-Toolbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Tests of the conversion of batches of packages by a pool of processes"""
+
+
+import random
+
+from .. import batches, benchmarks, ckanconv
+
+
+def test_convert_packages_reads_input_by_windows():
+    generator = random.Random(0)
+    packages = [benchmarks.generate_package(generator) for index in range(40)]
+    read_indexes = []
+
+    def iter_packages():
+        for index, package in enumerate(packages):
+            read_indexes.append(index)
+            yield package
+
+    results = batches.convert_packages(iter_packages(), chunk_size = 2, processes = 2)
+    first_result = next(results)
+    assert len(read_indexes) == 4 * 2 * 2
+    results = [first_result] + list(results)
+    converter = ckanconv.make_ckan_json_to_package()
+    assert results == [
+        (index, package['id']) + converter(package)
+        for index, package in enumerate(packages)
+        ]
+
+
+def test_convert_packages_reports_exceptions_by_package():
+    packages = [dict(extras = 5, id = u'pathological'), benchmarks.generate_package(random.Random(0))]
+    results = sorted(batches.convert_packages(packages, chunk_size = 1, ordered = False, processes = 2))
+    assert [(index, package_id, package) for index, package_id, package, errors in results][0] == (0,
+        u'pathological', None)
+    assert results[0][3].startswith(u'Conversion of package pathological failed:')
+    assert results[1][2] is not None and results[1][3] is None
@@ -0,0 +1,96 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# CKAN-Toolbox -- Various modules that handle CKAN API and data
+# By: Emmanuel Raviart <emmanuel@raviart.com>
+#
+# Copyright (C) 2013 Etalab
+# http://github.com/etalab/ckan-toolbox
+#
+# This file is part of CKAN-Toolbox.
+#
+# CKAN-Toolbox is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# CKAN-Toolbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Tests of bounded caches & of the content cache of converters"""
+
+
+from biryani1 import baseconv, states
+
+from .. import caches
+
+
+def make_counting_converter(calls):
+    def counting_converter(value, state = None):
+        calls.append(value)
+        if isinstance(value, dict):
+            return dict(value, converted = True), None
+        return baseconv.test_isinstance(list)(value, state = state)
+    return counting_converter
+
+
+def test_content_cache_bypasses_values_that_are_not_plain_json():
+    calls = []
+    converter = caches.make_content_cached_converter(make_counting_converter, calls = calls)
+    assert converter([1, 2]) == ([1, 2], None)
+    assert converter((1, 2))[1] is not None
+    assert converter({1: u'x'}) == ({1: u'x', 'converted': True}, None)
+    assert converter({u'1': u'x'}) == ({u'1': u'x', 'converted': True}, None)
+    assert converter({u'1': u'x'}) == ({u'1': u'x', 'converted': True}, None)
+    assert len(calls) == 4  # Only the last call is a cache hit.
+
+
+def test_content_cache_bypasses_explicit_states():
+    calls = []
+    converter = caches.make_content_cached_converter(make_counting_converter, calls = calls)
+    converter([1])
+    converter([1], state = states.default_state)
+    assert len(calls) == 1
+    state = states.State()
+    converter([1], state = state)
+    converter([1], state = state)
+    assert len(calls) == 3
+
+
+def test_content_cache_returns_copies():
+    converter = caches.make_content_cached_converter(make_counting_converter, calls = [])
+    first_value, errors = converter({u'tags': [u'a']})
+    first_value['tags'].append(u'b')
+    second_value, errors = converter({u'tags': [u'a']})
+    assert second_value == {u'tags': [u'a'], 'converted': True}
+    assert second_value is not first_value
+
+
+def test_lru_cache_evicts_by_count():
+    cache = caches.LRUCache(max_entries = 2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1  # "b" becomes the least recently used entry.
+    cache.set('c', 3)
+    assert 'b' not in cache
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.info()['evictions'] == 1
+
+
+def test_lru_cache_evicts_by_size():
+    cache = caches.LRUCache(max_entries = 10, max_size = 10)
+    cache.set('a', 1, size = 4)
+    cache.set('b', 2, size = 4)
+    cache.set('c', 3, size = 4)
+    assert 'a' not in cache and len(cache) == 2 and cache.info()['size'] == 8
+    cache.set('b', 2, size = 8)  # Replacing an entry frees its size.
+    assert 'c' not in cache and cache.info()['size'] == 8
+    cache.set('d', 4, size = 11)  # Too big to be cached
+    assert 'd' not in cache and 'b' in cache
@@ -0,0 +1,87 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# CKAN-Toolbox -- Various modules that handle CKAN API and data
+# By: Emmanuel Raviart <emmanuel@raviart.com>
+#
+# Copyright (C) 2013 Etalab
+# http://github.com/etalab/ckan-toolbox
+#
+# This file is part of CKAN-Toolbox.
+#
+# CKAN-Toolbox is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# CKAN-Toolbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Tests of the in-memory catalog & its indexes"""
+
+
+from .. import catalog
+
+
+def make_package(package_id, metadata_modified, owner_org = u'org', tags = (), formats = ()):
+    return dict(
+        id = package_id,
+        metadata_modified = metadata_modified,
+        owner_org = owner_org,
+        resources = [
+            dict(format = format_, url = u'http://example.com/{}.{}'.format(package_id, format_.lower()))
+            for format_ in formats
+            ],
+        tags = [dict(name = tag) for tag in tags],
+        )
+
+
+def test_bulk_load_equals_incremental_adds():
+    packages = [
+        make_package(unicode(index), u'2013-0{}-01'.format(index % 9 + 1), owner_org = u'org{}'.format(index % 3),
+            tags = [u'tag{}'.format(index % 4)], formats = [u'CSV'] if index % 2 else [u'json'])
+        for index in range(30)
+        ]
+    bulk_catalog = catalog.Catalog(packages)
+    incremental_catalog = catalog.Catalog()
+    for package in packages:
+        incremental_catalog.add(package)
+    assert bulk_catalog.modified_index == incremental_catalog.modified_index
+    assert bulk_catalog.ids_by_key_by_index_name == incremental_catalog.ids_by_key_by_index_name
+    assert bulk_catalog.query_ids(modified_since = u'2013-05-01') == incremental_catalog.query_ids(
+        modified_since = u'2013-05-01')
+
+
+def test_package_modified_in_place_is_reindexed():
+    package = make_package(u'1', u'2013-01-01', tags = [u'old'], formats = [u'CSV'])
+    packages_catalog = catalog.Catalog([package])
+    package['metadata_modified'] = u'2013-06-01'
+    package['tags'] = [dict(name = u'new')]
+    packages_catalog.add(package)
+    assert packages_catalog.query_ids(modified_since = u'2012-01-01') == [u'1']
+    assert packages_catalog.query_ids(tag = u'old') == []
+    assert packages_catalog.query_ids(tag = u'new') == [u'1']
+    packages_catalog.remove(u'1')
+    assert packages_catalog.modified_index == []
+    assert packages_catalog.info()['keys'] == dict(format = 0, license_id = 0, owner_org = 0, tag = 0, url = 0)
+
+
+def test_query_intersects_indexes():
+    packages_catalog = catalog.Catalog([
+        make_package(u'1', u'2013-01-01', owner_org = u'a', tags = [u't1', u't2'], formats = [u'CSV']),
+        make_package(u'2', u'2013-03-01', owner_org = u'a', tags = [u't2'], formats = [u'json', u'csv']),
+        make_package(u'3', u'2013-02-01', owner_org = u'b', tags = [u't1'], formats = [u'csv']),
+        ])
+    assert sorted(packages_catalog.query_ids(owner_org = u'a')) == [u'1', u'2']
+    assert sorted(packages_catalog.query_ids(format = u'CSV', tag = u't1')) == [u'1', u'3']
+    assert packages_catalog.query_ids(modified_since = u'2013-02-01') == [u'3', u'2']
+    assert packages_catalog.query_ids(format = u'csv', modified_before = u'2013-03-01') == [u'1', u'3']
+    assert [package['id'] for package, resource in packages_catalog.resources_by_url(
+        u'http://example.com/3.csv')] == [u'3']
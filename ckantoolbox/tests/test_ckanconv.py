@@ -0,0 +1,50 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# CKAN-Toolbox -- Various modules that handle CKAN API and data
+# By: Emmanuel Raviart <emmanuel@raviart.com>
+#
+# Copyright (C) 2013 Etalab
+# http://github.com/etalab/ckan-toolbox
+#
+# This file is part of CKAN-Toolbox.
+#
+# CKAN-Toolbox is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# CKAN-Toolbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Tests of CKAN converters"""
+
+
+from .. import ckanconv
+
+
+def test_remove_extras_copies_package():
+    package = dict(extras = [dict(key = u'frequency', value = u'yearly')], frequency = u'yearly', name = u'budget')
+    clean_package = ckanconv.remove_extras(package)[0]
+    assert clean_package == dict(extras = package['extras'], name = u'budget')
+    assert package['frequency'] == u'yearly'
+
+    package = dict(extras = [dict(key = u'frequency', value = u'yearly')], name = u'budget')
+    clean_package = ckanconv.remove_extras(package)[0]
+    assert clean_package == package and clean_package is not package
+
+
+def test_remove_extras_without_copy_copies_package_only_when_an_item_is_removed():
+    package = dict(extras = [dict(key = u'frequency', value = u'yearly')], frequency = u'yearly', name = u'budget')
+    assert ckanconv.remove_extras_without_copy(package)[0] == ckanconv.remove_extras(package)[0]
+    assert package['frequency'] == u'yearly'
+
+    package = dict(extras = [dict(key = u'frequency', value = u'yearly')], name = u'budget')
+    assert ckanconv.remove_extras_without_copy(package)[0] is package
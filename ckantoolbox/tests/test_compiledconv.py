@@ -0,0 +1,138 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# CKAN-Toolbox -- Various modules that handle CKAN API and data
+# By: Emmanuel Raviart <emmanuel@raviart.com>
+#
+# Copyright (C) 2013 Etalab
+# http://github.com/etalab/ckan-toolbox
+#
+# This file is part of CKAN-Toolbox.
+#
+# CKAN-Toolbox is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# CKAN-Toolbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Differential tests of compiled converters against the original ckanconv converters"""
+
+
+import copy
+import random
+
+from .. import benchmarks, ckanconv, compiledconv
+
+
+entity_names = ('group', 'organization', 'package', 'resource', 'tag', 'user')
+options_variants = (
+    dict(),
+    dict(drop_none_values = True),
+    dict(skip_missing_items = True),
+    dict(drop_none_values = True, skip_missing_items = True),
+    dict(keep_value_order = True),
+    )
+replacement_values = (None, u'', u'  ', u' Some text ', u'bad', 12, -1, True, [], [None], {})
+
+
+def convert(converter, value):
+    """Convert a copy of value and return ``(value, errors)``, or the type of the raised exception."""
+    try:
+        return converter(copy.deepcopy(value))
+    except Exception as exception:
+        return type(exception)
+
+
+def generate_values_by_entity_name(seed = 0, count = 10):
+    generator = random.Random(seed)
+    packages = [
+        benchmarks.generate_package(generator, size = size)
+        for size in ('small', 'medium', 'large')
+        for index in range(count)
+        ]
+    values_by_entity_name = dict(
+        group = [benchmarks.generate_group(generator) for index in range(count)],
+        organization = [benchmarks.generate_organization(generator) for index in range(count)],
+        package = packages,
+        resource = [resource for package in packages for resource in package['resources']],
+        tag = [tag for package in packages for tag in package['tags']],
+        user = [benchmarks.generate_user(generator) for index in range(count)],
+        )
+    for entity_name, values in values_by_entity_name.iteritems():
+        values.extend(iter_invalid_values(values[:count]))
+    return values_by_entity_name
+
+
+def iter_invalid_values(values):
+    """Iterate over variants of values, where each item in turn is replaced, and with an unexpected item."""
+    for invalid_value in (None, 1, u'x', [], {}):
+        yield invalid_value
+    for value in values:
+        for key in sorted(value):
+            for replacement_value in replacement_values:
+                invalid_value = copy.deepcopy(value)
+                invalid_value[key] = replacement_value
+                yield invalid_value
+        invalid_value = copy.deepcopy(value)
+        invalid_value['unexpected_item'] = u'unexpected'
+        yield invalid_value
+
+
+def test_compiled_converters_give_same_results_and_errors():
+    for entity_name, values in sorted(generate_values_by_entity_name().iteritems()):
+        for options in options_variants:
+            converter = getattr(ckanconv, 'make_ckan_json_to_{}'.format(entity_name))(**options)
+            compiled_converter = getattr(compiledconv, 'make_compiled_ckan_json_to_{}'.format(entity_name))(**options)
+            for value in values:
+                expected = convert(converter, value)
+                got = convert(compiled_converter, value)
+                assert got == expected, (entity_name, options, value, expected, got)
+                if isinstance(expected, tuple) and expected[0] is not None:
+                    assert type(got[0]) is type(expected[0]), (entity_name, options, value, expected, got)
+
+
+def test_compiled_converters_use_fast_path_for_valid_values():
+    for entity_name, values in sorted(generate_values_by_entity_name(count = 5).iteritems()):
+        converter = getattr(ckanconv, 'make_ckan_json_to_{}'.format(entity_name))()
+        fast_function = compiledconv.compile_converter(entity_name, converter)
+        for value in values[:5]:
+            assert converter(value)[1] is None, (entity_name, value)
+            assert fast_function(value, None) == converter(value)[0], (entity_name, value)
+
+
+def test_steps_are_derived_from_converters_tree():
+    converter = ckanconv.make_ckan_json_to_tag()
+    steps = compiledconv.get_converter_steps(converter, {})
+    assert steps[0] == ('isinstance', dict)
+    assert steps[1][0] == 'struct'
+    name_steps = compiledconv.get_converter_steps(ckanconv.make_ckan_json_to_tag_fields()['name'], {})
+    assert name_steps == (('isinstance', basestring), ('cleanup_line',))
+
+
+def test_steps_are_still_inlined_after_clearing_converters_cache():
+    def count_convert_steps(steps):
+        return sum(
+            1 if step[0] == 'convert' else count_convert_steps(step[1]) if step[0] == 'items' else 0
+            for step in steps
+            )
+
+    def count_package_convert_steps():
+        return sum(
+            count_convert_steps(compiledconv.get_converter_steps(field_converter, {}))
+            for field_converter in ckanconv.make_ckan_json_to_package_fields().itervalues()
+            )
+
+    convert_steps_count = count_package_convert_steps()
+    ckanconv.clear_converters_cache()
+    assert count_package_convert_steps() == convert_steps_count
+    name_steps = compiledconv.get_converter_steps(ckanconv.make_ckan_json_to_tag_fields()['name'], {})
+    assert name_steps == (('isinstance', basestring), ('cleanup_line',))
@@ -0,0 +1,162 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# CKAN-Toolbox -- Various modules that handle CKAN API and data
+# By: Emmanuel Raviart <emmanuel@raviart.com>
+#
+# Copyright (C) 2013 Etalab
+# http://github.com/etalab/ckan-toolbox
+#
+# This file is part of CKAN-Toolbox.
+#
+# CKAN-Toolbox is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# CKAN-Toolbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Tests of the catalog crawler, against a stub CKAN API"""
+
+
+import random
+import threading
+import time
+
+from .. import benchmarks, crawler
+from .servers import StubServer
+
+
+def generate_packages(count = 57):
+    generator = random.Random(0)
+    packages = []
+    for index in range(count):
+        package = benchmarks.generate_package(generator, size = 'small')
+        package['name'] = u'package-{:03d}'.format(index)
+        packages.append(package)
+    return packages
+
+
+def iter_with_timeout(iterable, timeout = 30):
+    """Consume an iterable in another thread, failing instead of blocking forever."""
+    items = []
+    thread = threading.Thread(target = lambda: items.extend(iterable))
+    thread.daemon = True
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), 'Iteration is blocked'
+    return items
+
+
+def make_respond(packages, failing_requests = 0):
+    """Return a function answering the package_list, package_search & package_show actions of CKAN API."""
+    package_by_name = dict(
+        (package['name'], package)
+        for package in packages
+        )
+    requests_count = [0]
+    lock = threading.Lock()
+
+    def respond(request):
+        with lock:
+            requests_count[0] += 1
+            if requests_count[0] <= failing_requests:
+                return 503, dict(success = False)
+        query = dict(
+            (key, values[-1])
+            for key, values in request['query'].iteritems()
+            )
+        action = request['path'].rsplit('/', 1)[-1]
+        if action == 'package_list':
+            offset = int(query.get('offset', 0))
+            result = sorted(package_by_name)[offset:offset + int(query.get('limit', 1000))]
+        elif action == 'package_search':
+            start = int(query.get('start', 0))
+            result = dict(
+                count = len(packages),
+                results = packages[start:start + int(query.get('rows', 10))],
+                )
+        elif action == 'package_show':
+            result = package_by_name.get(query.get('id'))
+            if result is None:
+                return 404, dict(success = False, error = dict(message = u'Not found'))
+        else:
+            return 400, dict(success = False, error = dict(message = u'Unknown action'))
+        return 200, dict(success = True, result = result)
+    return respond
+
+
+def test_iter_packages_by_search():
+    packages = generate_packages()
+    with StubServer(make_respond(packages)) as server:
+        catalog_crawler = crawler.CatalogCrawler(server.url, concurrency = 3, page_size = 10)
+        results = iter_with_timeout(catalog_crawler.iter_packages())
+        catalog_crawler.pool.close()
+    assert [errors for package, errors in results] == [None] * len(packages)
+    assert sorted(package['name'] for package, errors in results) == sorted(
+        package['name'] for package in packages)
+    statistics = catalog_crawler.info()
+    assert statistics['packages'] == len(packages)
+    assert statistics['requests'] == 1 + 6  # Count, then 6 pages of 10 packages
+
+
+def test_iter_packages_by_names():
+    packages = generate_packages(count = 12)
+    with StubServer(make_respond(packages)) as server:
+        catalog_crawler = crawler.CatalogCrawler(server.url, page_size = 5)
+        names = list(catalog_crawler.iter_package_names()) + [u'missing-package']
+        results = iter_with_timeout(catalog_crawler.iter_packages(names = names))
+        catalog_crawler.pool.close()
+    assert len(names) == len(packages) + 1
+    assert sorted(package['name'] for package, errors in results if package is not None) == sorted(
+        package['name'] for package in packages)
+    failures = [errors for package, errors in results if package is None]
+    assert len(failures) == 1 and u'missing-package' in failures[0], failures
+
+
+def test_iter_packages_retries_transient_errors():
+    packages = generate_packages(count = 5)
+    with StubServer(make_respond(packages, failing_requests = 2)) as server:
+        results = iter_with_timeout(crawler.iter_packages(server.url, backoff = 0.01, concurrency = 1))
+    assert len(results) == len(packages)
+    assert all(errors is None for package, errors in results)
+
+
+def test_iter_packages_reports_converter_exceptions():
+    packages = generate_packages(count = 20)
+
+    def converter(package, state = None):
+        if package['name'] == u'package-007':
+            raise RuntimeError('Boom')
+        return package, None
+
+    with StubServer(make_respond(packages)) as server:
+        catalog_crawler = crawler.CatalogCrawler(server.url, concurrency = 2, page_size = 3)
+        catalog_crawler.converter = converter
+        results = iter_with_timeout(catalog_crawler.iter_packages())
+        catalog_crawler.pool.close()
+    assert len(results) == len(packages)
+    failures = [errors for package, errors in results if package is None]
+    assert len(failures) == 1 and u'Boom' in failures[0], failures
+
+
+def test_iter_packages_stops_with_caller():
+    packages = generate_packages()
+    with StubServer(make_respond(packages)) as server:
+        catalog_crawler = crawler.CatalogCrawler(server.url, concurrency = 2, page_size = 5)
+        packages_iterator = catalog_crawler.iter_packages()
+        first_results = [next(packages_iterator) for index in range(3)]
+        packages_iterator.close()
+        time.sleep(0.5)
+        catalog_crawler.pool.close()
+    assert len(first_results) == 3
+    # Fetching stops soon after the caller stops iterating, because the queue of results is bounded.
+    assert catalog_crawler.info()['packages'] < len(packages)
@@ -0,0 +1,193 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# CKAN-Toolbox -- Various modules that handle CKAN API and data
+# By: Emmanuel Raviart <emmanuel@raviart.com>
+#
+# Copyright (C) 2013 Etalab
+# http://github.com/etalab/ckan-toolbox
+#
+# This file is part of CKAN-Toolbox.
+#
+# CKAN-Toolbox is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# CKAN-Toolbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Tests of datastore records validation & loading, against a stub CKAN datastore API"""
+
+
+import json
+import unittest
+
+from .. import datastore
+from .servers import StubServer
+
+
+fields = [
+    dict(id = u'id', type = u'int'),
+    dict(id = u'name', type = u'text'),
+    dict(id = u'price', type = u'float'),
+    dict(id = u'available', type = u'bool'),
+    dict(id = u'updated', type = u'timestamp'),
+    ]
+csv_records = [
+    dict(id = u'1', name = u'Un', price = u'1.5', available = u'true', updated = u'2013-05-01T12:30:00'),
+    dict(id = u'2', name = u'Deux', price = None, available = u'no', updated = None),
+    dict(id = u'three', name = u'Trois', price = u'3', available = u'yes', updated = u'2013-05-03'),
+    dict(id = u'4', name = u'Quatre', price = u'4', available = None, updated = u'2013-05-04T00:00:00'),
+    ]
+expected_columns = dict(
+    available = [True, False, True, None],
+    id = [1, 2, None, 4],
+    name = [u'Un', u'Deux', u'Trois', u'Quatre'],
+    price = [1.5, None, 3.0, 4.0],
+    updated = [u'2013-05-01T12:30:00', None, u'2013-05-03T00:00:00', u'2013-05-04T00:00:00'],
+    )
+expected_records = [
+    dict(id = 1, name = u'Un', price = 1.5, available = True, updated = u'2013-05-01T12:30:00'),
+    dict(id = 2, name = u'Deux', price = None, available = False, updated = None),
+    dict(id = 4, name = u'Quatre', price = 4.0, available = None, updated = u'2013-05-04T00:00:00'),
+    ]
+
+
+def coerce_columns(use_numpy):
+    columns, error_by_index = datastore.make_records_validator(fields, use_numpy = use_numpy)(csv_records)
+    assert error_by_index == {2: {u'id': u'Value must be an integer'}}
+    return dict(
+        (field['id'], datastore.column_to_json_values(datastore.column_kind_by_field_type[field['type']],
+            *columns[field['id']]))
+        for field in fields
+        )
+
+
+def coerce_invalid_timestamps(use_numpy):
+    columns, error_by_index = datastore.make_records_validator([dict(id = u't', type = u'timestamp')],
+        use_numpy = use_numpy)([dict(t = u'2013-05-01'), dict(t = u'not a date'), dict(t = None),
+        dict(t = u'not a date')])
+    assert sorted(error_by_index) == [1, 3]
+    assert sorted(error_by_index[1]) == [u't']
+    return datastore.column_to_json_values('timestamp', *columns[u't'])
+
+
+def respond_success(request):
+    return 200, dict(success = True)
+
+
+def sent_records(server):
+    return [
+        record
+        for request in server.requests
+        for record in json.loads(request['body'])['records']
+        ]
+
+
+def test_column_converters_with_numpy():
+    if datastore.numpy is None:
+        raise unittest.SkipTest('NumPy is not installed')
+    assert coerce_columns(use_numpy = True) == expected_columns
+
+
+def test_column_converters_without_numpy():
+    assert coerce_columns(use_numpy = False) == expected_columns
+
+
+def test_invalid_timestamps_are_reported_with_numpy():
+    if datastore.numpy is None:
+        raise unittest.SkipTest('NumPy is not installed')
+    assert coerce_invalid_timestamps(use_numpy = True) == [u'2013-05-01T00:00:00', None, None, None]
+
+
+def test_invalid_timestamps_are_reported_without_numpy():
+    assert coerce_invalid_timestamps(use_numpy = False) == [u'2013-05-01T00:00:00', None, None, None]
+
+
+def test_iter_encoded_batches_encodes_coerced_values():
+    error_by_index = {}
+    batches = list(datastore.iter_encoded_batches(csv_records, error_by_index = error_by_index, fields = fields,
+        use_numpy = False))
+    assert [index for indexes, encoded_records in batches for index in indexes] == [0, 1, 3]
+    records = [
+        json.loads(encoded_record)
+        for indexes, encoded_records in batches
+        for encoded_record in encoded_records
+        ]
+    assert records == expected_records
+    assert sorted(error_by_index) == [2]
+    assert sorted(error_by_index[2]) == [u'id']
+
+
+def test_iter_encoded_batches_keeps_missing_items_missing():
+    batches = datastore.iter_encoded_batches([dict(id = 1, extra = u'x')], fields = fields)
+    records = [
+        json.loads(encoded_record)
+        for indexes, encoded_records in batches
+        for encoded_record in encoded_records
+        ]
+    assert records == [dict(id = 1, extra = u'x')]
+
+
+def test_iter_encoded_batches_splits_batches():
+    records = [dict(id = index, name = u'x' * 10) for index in range(25)]
+    batches = list(datastore.iter_encoded_batches(records, fields = fields, max_batch_records = 10))
+    assert [len(indexes) for indexes, encoded_records in batches] == [10, 10, 5]
+    batches = list(datastore.iter_encoded_batches(records, fields = fields, max_batch_bytes = 100))
+    assert all(sum(len(encoded_record) + 1 for encoded_record in encoded_records) <= 100
+        for indexes, encoded_records in batches)
+    assert sum(len(indexes) for indexes, encoded_records in batches) == 25
+
+
+def test_load_records_inserts_without_primary_key():
+    with StubServer(respond_success) as server:
+        statistics = datastore.load_records(server.url, u'resource-id', fields, csv_records, concurrency = 2,
+            max_batch_records = 2, use_numpy = False)
+    assert statistics['records'] == 3
+    assert sorted(statistics['invalid_records']) == [2]
+    assert statistics['failed_batches'] == []
+    assert all(request['path'] == '/api/3/action/datastore_upsert' for request in server.requests)
+    payloads = [json.loads(request['body']) for request in server.requests]
+    assert all(payload['method'] == u'insert' and payload['resource_id'] == u'resource-id' for payload in payloads)
+    assert sorted(sent_records(server), key = lambda record: record['id']) == expected_records
+
+
+def test_load_records_requires_primary_key_to_upsert():
+    try:
+        datastore.load_records('http://127.0.0.1:1/', u'resource-id', fields, [], method = u'upsert')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('Upsert without primary key should be rejected')
+
+
+def test_load_records_retries_transient_errors():
+    attempts = []
+
+    def respond(request):
+        attempts.append(request)
+        if len(attempts) == 1:
+            return 503, dict(success = False)
+        return 200, dict(success = True)
+
+    with StubServer(respond) as server:
+        statistics = datastore.load_records(server.url, u'resource-id', fields, csv_records[:2], backoff = 0.01,
+            concurrency = 1, method = u'upsert', primary_key = u'id')
+    assert statistics['records'] == 2
+    assert statistics['failed_batches'] == []
+    assert len(server.requests) == 2
+
+
+def test_load_records_reports_failed_batches():
+    with StubServer(lambda request: (200, dict(success = False, error = dict(message = u'Invalid')))) as server:
+        statistics = datastore.load_records(server.url, u'resource-id', fields, csv_records, max_batch_records = 1)
+    assert statistics['records'] == 0
+    assert sorted(index for indexes, error in statistics['failed_batches'] for index in indexes) == [0, 1, 3]
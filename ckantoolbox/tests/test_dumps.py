@@ -0,0 +1,79 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# CKAN-Toolbox -- Various modules that handle CKAN API and data
+# By: Emmanuel Raviart <emmanuel@raviart.com>
+#
+# Copyright (C) 2013 Etalab
+# http://github.com/etalab/ckan-toolbox
+#
+# This file is part of CKAN-Toolbox.
+#
+# CKAN-Toolbox is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# CKAN-Toolbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Tests of the streaming reader of CKAN dumps"""
+
+
+import json
+from StringIO import StringIO
+
+from .. import dumps
+
+
+def read_dump(text, chunk_size = 3):
+    return list(dumps.iter_dump_items_with_errors(StringIO(text), chunk_size = chunk_size))
+
+
+def test_array_items_are_read_across_chunks():
+    items = [dict(name = u'données', tags = [u'a', u'b']), 12345, u'text, with "quotes" ] }', None, [], {}]
+    for chunk_size in (1, 3, 7, 65536):
+        assert read_dump(json.dumps(items, indent = 2), chunk_size = chunk_size) == [
+            (item, None)
+            for item in items
+            ]
+    assert list(dumps.iter_dump_items(StringIO(json.dumps(items)), chunk_size = 5)) == items
+    assert read_dump(u'[ ]') == []
+    assert read_dump(u'') == []
+
+
+def test_array_trailing_comma_is_rejected():
+    items_errors = read_dump(u'[{"a": 1},]')
+    assert items_errors[0] == (dict(a = 1), None)
+    assert len(items_errors) == 2 and items_errors[1][0] is None and items_errors[1][1] is not None
+    try:
+        list(dumps.iter_dump_items(StringIO(u'[{"a": 1},]')))
+    except ValueError:
+        pass
+    else:
+        assert False, 'A trailing comma must be rejected'
+
+
+def test_invalid_array_items_do_not_stop_reading():
+    for chunk_size in (1, 4, 65536):
+        items_errors = read_dump(u'[{"a": 1}, {"b": nope, "c": [1, "]"]}, 2 3, , {"d": 4}]', chunk_size = chunk_size)
+        assert [item for item, error in items_errors] == [dict(a = 1), None, 2, None, None, dict(d = 4)]
+        assert [error is None for item, error in items_errors] == [True, False, True, False, False, True]
+    items_errors = read_dump(u'[1, {"a": "unterminated')
+    assert items_errors[0] == (1, None)
+    assert items_errors[1][0] is None and items_errors[1][1] is not None
+
+
+def test_json_lines_errors_are_reported_by_line():
+    assert read_dump(u'{"a": 1}\n{"b": \n\n[2]\n') == [
+        (dict(a = 1), None),
+        (None, u'Invalid JSON line: No JSON object could be decoded'),
+        ([2], None),
+        ]
@@ -0,0 +1,167 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# CKAN-Toolbox -- Various modules that handle CKAN API and data
+# By: Emmanuel Raviart <emmanuel@raviart.com>
+#
+# Copyright (C) 2013 Etalab
+# http://github.com/etalab/ckan-toolbox
+#
+# This file is part of CKAN-Toolbox.
+#
+# CKAN-Toolbox is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# CKAN-Toolbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Tests of FileStore uploads, against a stub CKAN FileStore API"""
+
+
+import os
+import shutil
+import StringIO
+import tempfile
+import threading
+
+from .. import filestores
+from .servers import StubServer
+
+
+headers = {'Authorization': 'api-key'}
+
+
+class NonSeekableFile(object):
+    def __init__(self, data):
+        self.file_object = StringIO.StringIO(data)
+
+    def read(self, size = -1):
+        return self.file_object.read(size)
+
+
+def make_respond(failing_posts = 0):
+    """Return a function answering FileStore requests. The first ``failing_posts`` uploads fail with HTTP 503."""
+    posts = []
+    lock = threading.Lock()
+
+    def respond(request):
+        if request['path'].startswith('/api/storage/auth/form/'):
+            return 200, dict(
+                action = '/storage/upload_handle',
+                fields = [dict(name = 'key', value = request['path'][len('/api/storage/auth/form/'):])],
+                )
+        if request['path'] == '/storage/upload_handle':
+            with lock:
+                posts.append(request)
+                if len(posts) <= failing_posts:
+                    return 503, dict(success = False)
+            return 200, ''
+        if request['path'].startswith('/api/storage/metadata/'):
+            return 200, dict(_label = request['path'][len('/api/storage/metadata/'):])
+        return 404, dict(success = False)
+    return respond
+
+
+def uploaded_bodies(server):
+    return [
+        request['body']
+        for request in server.requests
+        if request['path'] == '/storage/upload_handle'
+        ]
+
+
+def test_upload_files_reports_errors_per_file():
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, u'data.csv')
+        with open(path, 'wb') as data_file:
+            data_file.write('path content')
+        files = [
+            ('bytes.txt', 'bytes content'),
+            ('data.csv', filestores.FilePath(path)),
+            ('missing.csv', filestores.FilePath(os.path.join(directory, u'missing.csv'))),
+            ('seekable.txt', StringIO.StringIO('seekable content')),
+            ('stream.txt', NonSeekableFile('stream content')),
+            ('text.txt', u'text content é'),
+            ]
+        progress = []
+        with StubServer(make_respond()) as server:
+            session = filestores.FileStoreSession()
+            results = session.upload_files(server.url, files, headers, concurrency = 3,
+                progress_callback = lambda sent_bytes, total_bytes, throughput: progress.append(total_bytes))
+            session.close()
+    finally:
+        shutil.rmtree(directory)
+    assert [filename for filename, file_metadata, error in results] == [filename for filename, source in files]
+    for filename, file_metadata, error in results:
+        if filename == 'missing.csv':
+            assert file_metadata is None
+            assert isinstance(error, EnvironmentError), error
+        else:
+            assert error is None, (filename, error)
+            assert file_metadata['_label'].endswith(filename), file_metadata
+    bodies = uploaded_bodies(server)
+    assert len(bodies) == 5
+    for content in ('bytes content', 'path content', 'seekable content', 'stream content', 'text content \xc3\xa9'):
+        assert any(content in body for body in bodies), content
+    # The size of a missing or non-seekable file is unknown in advance.
+    assert progress and all(total_bytes is None for total_bytes in progress)
+
+
+def test_upload_files_retries_transient_errors():
+    files = [
+        ('seekable.txt', StringIO.StringIO('seekable content')),
+        ('stream.txt', NonSeekableFile('stream content')),
+        ]
+    progress = []
+    with StubServer(make_respond(failing_posts = 2)) as server:
+        session = filestores.FileStoreSession()
+        results = session.upload_files(server.url, files, headers, backoff = 0.01, concurrency = 1,
+            progress_callback = lambda sent_bytes, total_bytes, throughput: progress.append((sent_bytes, total_bytes)))
+        session.close()
+    assert [error for filename, file_metadata, error in results] == [None, None]
+    bodies = uploaded_bodies(server)
+    # Files are uploaded one after the other: The first one fails twice.
+    assert sum(1 for body in bodies if 'seekable content' in body) == 3
+    assert sum(1 for body in bodies if 'stream content' in body) == 1
+    assert progress[-1] == (len('seekable content') + len('stream content'), None)
+
+
+def test_upload_files_gives_up_after_max_retries():
+    with StubServer(make_respond(failing_posts = 10)) as server:
+        session = filestores.FileStoreSession()
+        results = session.upload_files(server.url, [('data.txt', 'content')], headers, backoff = 0.01,
+            max_retries = 2)
+        session.close()
+    filename, file_metadata, error = results[0]
+    assert file_metadata is None
+    assert getattr(error, 'code', None) == 503, error
+    assert len(uploaded_bodies(server)) == 3
+
+
+def test_multipart_body_reads_give_the_whole_form():
+    form = filestores.MultiPartForm()
+    form.add_field('key', 'value')
+    form.add_file('file', 'data.bin', ''.join(chr(index % 256) for index in xrange(100000)))
+    for size in (1, 1000, 8192, 65536, 200000):
+        body = form.open(chunk_size = 4096)
+        blocks = []
+        while True:
+            block = body.read(size)
+            if not block:
+                break
+            assert len(block) <= size
+            blocks.append(block)
+        assert ''.join(blocks) == str(form)
+        assert len(body) == len(str(form))
+    body = form.open(chunk_size = 4096)
+    assert body.read(10) + body.read() == str(form)
@@ -0,0 +1,69 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# CKAN-Toolbox -- Various modules that handle CKAN API and data
+# By: Emmanuel Raviart <emmanuel@raviart.com>
+#
+# Copyright (C) 2013 Etalab
+# http://github.com/etalab/ckan-toolbox
+#
+# This file is part of CKAN-Toolbox.
+#
+# CKAN-Toolbox is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# CKAN-Toolbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Tests of the interning of low-cardinality field strings"""
+
+
+from .. import interning, records
+
+
+def noop(value, state = None):
+    return value, None
+
+
+def test_clear_keeps_instrumented_converters_working():
+    pool = interning.InternPool(field_names = ['format'])
+    converter = pool.instrument_field('resource', 'format', noop)
+    first_value = u''.join([u'C', u'SV'])
+    assert converter(first_value)[0] is first_value
+    second_value = u''.join([u'CS', u'V'])
+    assert converter(second_value)[0] is first_value
+    assert pool.info() == {u'resource.format': dict(cardinality = 1, hits = 1, misses = 1, rejections = 0)}
+
+    pool.clear()
+    assert pool.info() == {u'resource.format': dict(cardinality = 0, hits = 0, misses = 0, rejections = 0)}
+    assert converter(second_value)[0] is second_value
+    assert converter(first_value)[0] is second_value
+    assert pool.info() == {u'resource.format': dict(cardinality = 1, hits = 1, misses = 1, rejections = 0)}
+
+
+def test_field_tables_are_bounded():
+    pool = interning.InternPool(field_names = ['tag.name'], max_entries_per_field = 2)
+    converter = pool.instrument_field('tag', 'name', noop)
+    assert pool.instrument_field('tag', 'display_name', noop) is noop
+    for value in (u'a', u'b', u'c', u'a'):
+        converter(value)
+    assert pool.info() == {u'tag.name': dict(cardinality = 2, hits = 1, misses = 2, rejections = 1)}
+
+
+def test_records_intern_strings_in_bounded_pool():
+    first_record = records.Resource.from_dict(dict(format = u''.join([u'C', u'SV']), name = u'Data'))
+    second_record = records.Resource.from_dict(dict(format = u''.join([u'CS', u'V']), name = u'Data'))
+    assert second_record.format is first_record.format
+    assert records.intern_pool.max_entries_per_field is not None
+    assert 'sysadmin' not in records.interned_field_names
+    assert records.User.from_dict(dict(name = u'john', sysadmin = True)).to_dict() == dict(name = u'john',
+        sysadmin = True)
@@ -0,0 +1,65 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# CKAN-Toolbox -- Various modules that handle CKAN API and data
+# By: Emmanuel Raviart <emmanuel@raviart.com>
+#
+# Copyright (C) 2013 Etalab
+# http://github.com/etalab/ckan-toolbox
+#
+# This file is part of CKAN-Toolbox.
+#
+# CKAN-Toolbox is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# CKAN-Toolbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Tests of lazily validated packages"""
+
+
+import random
+
+from .. import benchmarks, ckanconv, lazy
+
+
+def generate_package():
+    return benchmarks.generate_package(random.Random(0))
+
+
+def test_lazy_package_gives_same_values_as_converter():
+    for options in (dict(), dict(drop_none_values = True), dict(skip_missing_items = True)):
+        package = generate_package()
+        del package['notes']
+        expected_value, expected_errors = ckanconv.make_ckan_json_to_package(**options)(package)
+        lazy_package = lazy.make_ckan_json_to_lazy_package(**options)(package)[0]
+        assert sorted(lazy_package) == sorted(expected_value), options
+        assert dict(lazy_package) == expected_value, options
+        assert lazy_package.force() == (expected_value, expected_errors), options
+
+
+def test_lazy_packages_share_field_converters():
+    package = generate_package()
+    first_package = lazy.LazyPackage(package)
+    second_package = lazy.LazyPackage(package)
+    assert first_package.converter_by_name is second_package.converter_by_name
+    assert lazy.LazyPackage(package, drop_none_values = True).converter_by_name \
+        is not first_package.converter_by_name
+
+
+def test_iteration_does_not_validate_fields():
+    package = generate_package()
+    lazy_package = lazy.LazyPackage(package)
+    assert len(lazy_package) == len(list(lazy_package)) > 0
+    assert lazy_package.value_by_name == {}
+    lazy_package['name']
+    assert lazy_package.value_by_name.keys() == ['name']
@@ -0,0 +1,55 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# CKAN-Toolbox -- Various modules that handle CKAN API and data
+# By: Emmanuel Raviart <emmanuel@raviart.com>
+#
+# Copyright (C) 2013 Etalab
+# http://github.com/etalab/ckan-toolbox
+#
+# This file is part of CKAN-Toolbox.
+#
+# CKAN-Toolbox is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# CKAN-Toolbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Tests of the delta synchronization of CKAN entities"""
+
+
+import datetime
+
+from .. import sync
+
+
+def test_fingerprint_rejects_non_json_values():
+    assert len(sync.fingerprint(dict(name = u'group'))) == 20
+    try:
+        sync.fingerprint(dict(name = u'group', title = datetime.datetime(2013, 1, 1)))
+    except ValueError:
+        pass
+    else:
+        assert False, 'A value that is not JSON must be rejected'
+
+
+def test_unconvertible_entities_are_reported():
+    statistics = dict(conversion_failures = [], skipped = 0, unchanged = 0)
+    changes = list(sync.iter_changes('group', [
+        dict(name = u'valid', title = u'Valid'),
+        None,
+        dict(id = u'1234', title = u'No name'),
+        dict(name = u'not-json', title = datetime.datetime(2013, 1, 1)),
+        ], {}, statistics, set([u'deleted'])))
+    assert [(operation, name) for operation, name, digest, output_entity in changes] == [(u'create', u'valid')]
+    assert statistics['skipped'] == 3
+    assert [identifier for identifier, error in statistics['conversion_failures']] == [None, u'1234', u'not-json']
@@ -0,0 +1,80 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+# CKAN-Toolbox -- Various modules that handle CKAN API and data
+# By: Emmanuel Raviart <emmanuel@raviart.com>
+#
+# Copyright (C) 2013 Etalab
+# http://github.com/etalab/ckan-toolbox
+#
+# This file is part of CKAN-Toolbox.
+#
+# CKAN-Toolbox is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# CKAN-Toolbox is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Equivalence tests of namify & tag_namify with their original character by character implementation"""
+
+
+import sys
+
+from .. import texthelpers
+
+
+def iter_code_points():
+    """Iterate over every code point of the BMP, and over a sample of the other planes when Python supports them."""
+    for code_point in xrange(0x10000):
+        yield code_point
+    if sys.maxunicode > 0xFFFF:
+        for code_point in xrange(0x10000, sys.maxunicode + 1, 0x3F):
+            yield code_point
+
+
+def original_namify(text):
+    return u''.join(texthelpers.namify_char(unicode_char) for unicode_char in text)
+
+
+def original_tag_namify(text):
+    return u''.join(texthelpers.tag_namify_char(unicode_char) for unicode_char in text)
+
+
+def test_namify_equals_original_for_every_code_point():
+    texthelpers.namified_by_text.clear()
+    for code_point in iter_code_points():
+        unicode_char = unichr(code_point)
+        assert texthelpers.namify(unicode_char) == original_namify(unicode_char), hex(code_point)
+
+
+def test_tag_namify_equals_original_for_every_code_point():
+    texthelpers.tag_namified_by_text.clear()
+    for code_point in iter_code_points():
+        unicode_char = unichr(code_point)
+        assert texthelpers.tag_namify(unicode_char) == original_tag_namify(unicode_char), hex(code_point)
+
+
+def test_namify_equals_original_for_texts():
+    texts = [
+        u'',
+        u'Données publiques',
+        u'Œuvres d\'art & cœur',
+        u'Budget 2013 -- Région Île-de-France',
+        u' Tabs\tand\nnewlines ',
+        u''.join(unichr(code_point) for code_point in xrange(0x20, 0x3000, 7)),
+        ]
+    for text in texts:
+        for cached in (False, True):
+            # Second call gives the cached result.
+            assert texthelpers.namify(text) == original_namify(text), (text, cached)
+            assert texthelpers.tag_namify(text) == original_tag_namify(text), (text, cached)
+            assert texthelpers.namify(text.encode('utf-8')) == original_namify(text), (text, cached)
@@ -31,8 +31,32 @@ import re
 
 from biryani1 import strings
 
+from . import caches
 
+
+namified_by_text = caches.LRUCache(max_entries = 65536)
 tag_char_re = re.compile(ur'[- \w]', re.UNICODE)
+tag_namified_by_text = caches.LRUCache(max_entries = 65536)
+
+
+class CharTranslationTable(dict):
+    """Translation table (for ``unicode.translate``) mapping each code point to the result of a function
+
+    The table is filled lazily: The first time a code point of the BMP is looked up, the whole block of 256 code points
+    it belongs to is computed.
+    """
+    def __init__(self, translate_char):
+        super(CharTranslationTable, self).__init__()
+        self.translate_char = translate_char
+
+    def __missing__(self, code_point):
+        if code_point > 0xFFFF:
+            translation = self[code_point] = unicode(self.translate_char(unichr(code_point)))
+            return translation
+        block_start = code_point & ~0xFF
+        for block_code_point in xrange(block_start, block_start + 0x100):
+            self[block_code_point] = unicode(self.translate_char(unichr(block_code_point)))
+        return self[code_point]
 
 
 def namify(text, encoding = 'utf-8'):
@@ -42,7 +66,11 @@ def namify(text, encoding = 'utf-8'):
     if isinstance(text, str):
         text = text.decode(encoding)
     assert isinstance(text, unicode), str((text,))
-    simplified = u''.join(namify_char(unicode_char) for unicode_char in text)
+    simplified = namified_by_text.get(text)
+    if simplified is not None:
+        return simplified
+    simplified = text.translate(namify_table)
+    namified_by_text.set(text, simplified)
     # CKAN accepts names with duplicate "-" or "_" and/or ending with "-" or "_".
     #while u'--' in simplified:
     #    simplified = simplified.replace(u'--', u'-')
@@ -76,7 +104,11 @@ def tag_namify(text, encoding = 'utf-8'):
     if isinstance(text, str):
         text = text.decode(encoding)
     assert isinstance(text, unicode), str((text,))
-    simplified = u''.join(tag_namify_char(unicode_char) for unicode_char in text)
+    simplified = tag_namified_by_text.get(text)
+    if simplified is not None:
+        return simplified
+    simplified = text.translate(tag_namify_table)
+    tag_namified_by_text.set(text, simplified)
     # CKAN accepts tag names with duplicate "-" or "_" and/or ending with "-" or "_".
     #while u'--' in simplified:
     #    simplified = simplified.replace(u'--', u'-')
@@ -92,3 +124,7 @@ def tag_namify_char(unicode_char):
     if tag_char_re.match(unicode_char) is None:
         unicode_char = u'-'
     return unicode_char
+
+
+namify_table = CharTranslationTable(namify_char)
+tag_namify_table = CharTranslationTable(tag_namify_char)